@@ -0,0 +1,74 @@
+# batch_workflow.py
+import argparse
+import os
+import yaml
+import Metashape
+from src.job_queue import GpuSlots, JobQueue
+from step_workflow import get_config_from_file
+
+"""
+Esecuzione di più rilievi (cartelle di immagini + configurazione) da un unico manifest:
+i job sono messi in una coda locale con un limite di job contemporanei per GPU e lo stato di ognuno è salvato in un file JSON.
+"""
+
+"""
+Jobs from the batch manifest (YAML/JSON), relative paths are resolved against the manifest folder:
+    config: default_config.yaml       # optional, default for every job
+    jobs:
+      - name: flight_01               # optional, default: input folder name
+        input: images/flight_01
+        output: results/flight_01
+        config: flight_01.json        # optional
+        project: results/flight_01/flight_01.psx   # optional, default: output folder
+"""
+def read_batch_manifest(filename: str) -> list:
+    try:
+        with open(filename, 'r') as f:
+            manifest = yaml.safe_load(f)   # JSON is valid YAML
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Errore: il file {filename} non è stato trovato.")
+    except yaml.YAMLError:
+        raise PermissionError(f"Errore: il file {filename} non è un file valido.")
+    if not isinstance(manifest, dict) or not manifest.get('jobs'):
+        raise ValueError(f"Errore: il file {filename} non contiene jobs.")
+
+    base = os.path.dirname(os.path.abspath(filename))
+    resolve = lambda path: os.path.normpath(os.path.join(base, path))
+    jobs = []
+    for entry in manifest['jobs']:
+        config = entry.get('config', manifest.get('config'))
+        if not entry.get('input') or not entry.get('output') or not config:
+            raise ValueError(f"Errore: ogni job richiede input, output e config: {entry}")
+        job = {
+            'name': entry.get('name', os.path.basename(os.path.normpath(entry['input']))),
+            'input': resolve(entry['input']),
+            'output': resolve(entry['output']),
+            'workflow': get_config_from_file(resolve(config))
+        }
+        if entry.get('project'):
+            job['project'] = resolve(entry['project'])
+        jobs.append(job)
+    names = [job['name'] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Errore: i nomi dei job devono essere univoci.")
+    return jobs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Esegue il workflow di più rilievi da un manifest, con una coda di job per GPU.')
+    parser.add_argument('-b', '--batch', required=True, help='Path batch manifest YAML/JSON')
+    parser.add_argument('--jobs-per-gpu', type=int, default=1, help='Jobs sharing the same GPU at the same time (default 1)')
+    parser.add_argument('--status', default=None, help='Path job status file (default: batch_status.json next to the manifest)')
+    parser.add_argument('-m', '--monitoring', help="Enable monitoring", action='store_true')
+    parser.add_argument('-r', '--resume', help="Skip the jobs already done and resume the others (see step_workflow.py --resume)", action='store_true')
+    args = parser.parse_args()
+
+    jobs = read_batch_manifest(args.batch)
+    status_path = args.status or os.path.join(os.path.dirname(os.path.abspath(args.batch)), 'batch_status.json')
+    gpu_slots = GpuSlots(len(Metashape.app.enumGPUDevices()), jobs_per_gpu=args.jobs_per_gpu)
+    print(f"== == == {len(jobs)} jobs, {gpu_slots.capacity} at a time == == ==")
+
+    status = JobQueue(jobs, gpu_slots, status_path, monitoring=args.monitoring, resume=args.resume).run()
+    failed = [name for name, job in status.items() if job['status'] != 'done']
+    print(f"Batch finished: {len(status) - len(failed)} done, {len(failed)} failed. Status saved to {status_path}.")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,142 @@
+# partition_workflow.py
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+import Metashape
+from src.settings import Settings
+from src.progress_printer import ProgressPrinter
+from src.chunk_partition import partition_images
+from src.job_queue import GpuSlots, job_config, run_step_workflow
+from step_workflow import get_config_from_file, find_photo_files
+
+"""
+Workflow partizionato per rilievi molto grandi: le immagini sono divise in chunk spaziali sovrapposti (posizione GPS),
+la pipeline di ogni chunk (step_workflow.py) gira in un processo separato con la propria maschera GPU,
+infine i chunk sono allineati e uniti in un unico progetto da cui si esportano i risultati.
+"""
+
+image_types = [".jpg", ".jpeg", ".tif", ".tiff", ".png", ".bmp", ".dng"]
+
+"""
+GPS position (longitude, latitude) of every image, from the EXIF reference loaded by Metashape
+"""
+def read_positions(image_files: list) -> dict:
+    doc = Metashape.Document()
+    chunk = doc.addChunk()
+    with ProgressPrinter("readPositions") as printer:
+        chunk.addPhotos(filenames=image_files, progress=printer)
+    by_path = {os.path.normpath(path): path for path in image_files}
+    positions = {path: None for path in image_files}
+    for camera in chunk.cameras:
+        location = camera.reference.location
+        path = by_path.get(os.path.normpath(camera.photo.path))
+        if path is not None and location is not None:
+            positions[path] = (location.x, location.y)
+    return positions
+
+"""
+Workflow of a single chunk: everything but the exports, which run once on the merged project
+"""
+def partition_workflow(workflow: dict) -> dict:
+    config = {}
+    for step, params in workflow.items():
+        if step == 'exportResults':
+            continue
+        if isinstance(params, dict):
+            params = {name: value for name, value in params.items() if not name.startswith('export')}
+        config[step] = params
+    return config
+
+"""
+Run the pipeline of a chunk in its own process, on a free GPU taken from gpu_slots
+"""
+def run_partition(index: int, images: list, output_folder: str, workflow: dict, gpu_slots: GpuSlots,
+                  monitoring: bool = False, resume: bool = False) -> str:
+    part_folder = os.path.join(output_folder, f'chunk_{index}')
+    images_folder = os.path.join(part_folder, 'images')
+    os.makedirs(images_folder, exist_ok=True)
+    for path in images:
+        link = os.path.join(images_folder, os.path.basename(path))
+        if not os.path.lexists(link):
+            os.symlink(os.path.abspath(path), link)
+
+    with gpu_slots.slot() as (gpu, gpu_mask):
+        print(f"-- chunk_{index}: {len(images)} images, GPU {gpu}")
+        config = job_config(partition_workflow(workflow), gpu_mask, part_folder, part_folder)
+        returncode = run_step_workflow(images_folder, config, part_folder, os.path.join(part_folder, 'workflow.log'), monitoring, resume)
+    if returncode != 0:
+        raise RuntimeError(f"Error: chunk_{index} failed, see {part_folder}/workflow.log")
+    print(f"-- chunk_{index} completed")
+    return os.path.join(part_folder, f'chunk_{index}.psx')
+
+"""
+Append the chunk projects to a new project, align them on the shared (overlapping) cameras and merge them
+"""
+def merge_partitions(project_paths: list, merged_path: str) -> None:
+    doc = Metashape.Document()
+    doc.save(path=merged_path)
+    for path in project_paths:
+        part = Metashape.Document()
+        part.open(path, read_only=True)
+        doc.append(part)
+    keys = [chunk.key for chunk in doc.chunks]
+    with ProgressPrinter("alignChunks") as printer:
+        doc.alignChunks(chunks=keys, reference=keys[0], method=2, progress=printer)    # camera based
+    with ProgressPrinter("mergeChunks") as printer:
+        doc.mergeChunks(chunks=keys, merge_markers=True, merge_assets=True, progress=printer)
+    merged = doc.chunks[-1]
+    for chunk in list(doc.chunks):
+        if chunk != merged:
+            doc.remove(chunk)
+    doc.save()
+    print("-- Merged project", merged_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Esegue il workflow su chunk spaziali sovrapposti in processi separati e unisce i risultati.')
+    parser.add_argument('-i', '--input', required=True, help='Path project photos')
+    parser.add_argument('-c', '--config', required=True, help='Path configuration file JSON/YAML')
+    parser.add_argument('-o', '--output', required=True, help='Saving path of chunk projects, merged project and exports')
+    parser.add_argument('--max-images', type=int, default=1000, help='Max number of images per chunk, overlap excluded (default 1000)')
+    parser.add_argument('--overlap', type=float, default=0.1, help='Overlap between chunks, fraction of the chunk size (default 0.1)')
+    parser.add_argument('--jobs-per-gpu', type=int, default=1, help='Chunks sharing the same GPU at the same time (default 1)')
+    parser.add_argument('-m', '--monitoring', help="Enable monitoring", action='store_true')
+    parser.add_argument('-r', '--resume', help="Resume the chunk pipelines (see step_workflow.py --resume)", action='store_true')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input):
+        raise FileNotFoundError(f"{args.input} does not exit")
+    image_files = find_photo_files(args.input, image_types)
+    if len(image_files) < 2:
+        raise ValueError("Not enough images to process in the path.")
+    os.makedirs(args.output, exist_ok=True)
+    output_folder = os.path.abspath(args.output)
+
+    workflow = get_config_from_file(args.config)
+    Settings(workflow.get('settings'))     # license and version check
+    num_gpus = len(Metashape.app.enumGPUDevices())
+
+    chunks = partition_images(read_positions(image_files), max_images=args.max_images, overlap=args.overlap)
+    gpu_slots = GpuSlots(num_gpus, jobs_per_gpu=args.jobs_per_gpu)
+    print(f"== == == {len(chunks)} chunks, {gpu_slots.capacity} workers == == ==")
+
+    with ThreadPoolExecutor(max_workers=gpu_slots.capacity) as executor:
+        futures = [executor.submit(run_partition, index, images, output_folder, workflow, gpu_slots,
+                                   args.monitoring, args.resume)
+                   for index, images in enumerate(chunks)]
+        project_paths = [future.result() for future in futures]
+
+    merged_folder = os.path.join(output_folder, 'merged')
+    os.makedirs(merged_folder, exist_ok=True)
+    merged_path = os.path.join(merged_folder, 'merged.psx')
+    if len(project_paths) == 1:
+        merged_path = project_paths[0]
+    else:
+        merge_partitions(project_paths, merged_path)
+
+    # exports of the deliverables from the merged project
+    if 'exportResults' in workflow:
+        export_workflow = {'settings': workflow.get('settings'), 'exportResults': workflow['exportResults']}
+        config = job_config(export_workflow, None, merged_folder, merged_path)
+        if run_step_workflow(args.input, config, merged_folder, os.path.join(merged_folder, 'workflow.log')) != 0:
+            raise RuntimeError(f"Error: exports failed, see {merged_folder}/workflow.log")
+    print('Processing finished, results saved to ' + merged_folder + '.')
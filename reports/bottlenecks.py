@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reports.report import Report, segments
+from src.memory_guard import DOWNSCALES
+from src.run_planner import PLAN_DEFAULTS, plan_steps
+
+"""
+This library tells why the steps of a run are slow. Every sample of the monitor log is
+labeled with the resource that limits the workflow at that time: GPU, CPU (many cores busy),
+CPU single-thread (one or two cores at 100 %, the others waiting), memory, I/O wait (the CPU
+time spent waiting for disks and network, iowait of the monitor) or idle. Logs without the
+iowait column (previous versions) never get the I/O wait label. The labels are summarized per step and per
+sub-interval of the step, and turned into a ranked list of tuning opportunities of the run
+(cpu_enable, gpu_mask, downscale) with a rough estimate of the seconds they would save.
+"""
+
+# labels, in the order they are checked on a sample: memory pressure first, it slows everything else
+LABELS = ['memory', 'GPU', 'CPU', 'CPU single-thread', 'I/O wait', 'idle']
+
+# thresholds of the labels
+MEMORY_BUSY = 90        # RAM usage %
+GPU_BUSY = 50           # usage % of the busiest GPU
+CPU_BUSY = 60           # CPU usage % of the node
+CORE_BUSY = 90          # usage % of the busiest core, for single-thread
+SINGLE_THREAD_CORES = 0.1   # at most this share of the cores above 50 % (at least 2)
+IOWAIT_BUSY = 20        # % of the CPU time waiting for I/O
+GPU_IDLE = 10           # usage % of a GPU left unused by a GPU-bound step
+
+# share of the work of a GPU-bound step the CPU takes when enabled as an extra device
+# (rough: the cores of a node are a fraction of the throughput of its GPUs, they also feed them)
+CPU_DEVICE_SHARE = 0.1
+
+def sample_durations(csv):
+    # seconds from every sample to the next one (0 for the last): the sampling of SystemMonitor is adaptive,
+    # a sample counts for the time until the next one
+    return csv['Time'].diff().shift(-1).fillna(0).to_numpy()
+
+def classify(report):
+    # Bottleneck label of every sample of the report (Series indexed as report.csv)
+    assert report.csv is not None, "Error: the bottlenecks need the samples, not available with chunksize."
+    csv, cores = report.csv, report.cores
+    gpus = csv[[f'gproc-{i}' for i in range(report.GPU['number'])]].to_numpy()
+    gpu = gpus.max(axis=1) if gpus.shape[1] else np.zeros(len(csv))
+    busy_cores = (cores > 50).sum(axis=1)
+    # NaN where the system does not report iowait, never above the threshold
+    iowait = csv['CPU iowait %'].to_numpy() if 'CPU iowait %' in csv else np.zeros(len(csv))
+
+    conditions = [
+        csv['RAM usage %'].to_numpy() >= MEMORY_BUSY,
+        gpu >= GPU_BUSY,
+        csv['CPU usage %'].to_numpy() >= CPU_BUSY,
+        (cores.max(axis=1) >= CORE_BUSY) & (busy_cores <= max(2, SINGLE_THREAD_CORES * cores.shape[1])),
+        iowait >= IOWAIT_BUSY
+    ]
+    return pd.Series(np.select(conditions, LABELS[:-1], default='idle'), index=csv.index, name='Bottleneck')
+
+def intervals(report, labels=None):
+    # Sub-intervals of the steps with the same label: Step, Start, End (s from the first sample), Duration (s), Bottleneck
+    labels = classify(report) if labels is None else labels
+    csv = report.csv
+    # a new interval at every change of step run or of label
+    changes = (csv['Control'].ne(csv['Control'].shift()) | labels.ne(labels.shift())).cumsum()
+    starts, _ = segments(changes.to_numpy())
+    durations = np.add.reduceat(sample_durations(csv), starts) if len(starts) else np.zeros(0)
+    time = csv['Time'].to_numpy() - csv['Time'].iloc[0]
+    return pd.DataFrame({
+        'Step': csv['Modulo'].to_numpy()[starts],
+        'Start': time[starts],
+        'End': time[starts] + durations,
+        'Duration (seconds)': durations,
+        'Bottleneck': labels.to_numpy()[starts]
+    })
+
+def bottlenecks(report, labels=None):
+    # Seconds of every step under each label, the dominant label and its share of the step
+    labels = classify(report) if labels is None else labels
+    frame = pd.DataFrame({'Step': report.csv['Modulo'], 'Bottleneck': labels, 'Seconds': sample_durations(report.csv)})
+    seconds = frame.pivot_table(index='Step', columns='Bottleneck', values='Seconds', aggfunc='sum', fill_value=0, sort=False)
+    seconds = seconds.reindex(columns=LABELS, fill_value=0)
+    total = seconds.sum(axis=1)
+    # a step of a single sample has no duration, its label is that of the sample
+    counts = pd.crosstab(frame['Step'], frame['Bottleneck']).reindex(index=seconds.index, columns=LABELS, fill_value=0)
+    seconds['Bottleneck'] = seconds[LABELS].idxmax(axis=1).where(total > 0, counts.idxmax(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        seconds['Share'] = (seconds[LABELS].max(axis=1) / total).fillna(1.0)
+    seconds['Duration (seconds)'] = total
+    return seconds
+
+def workflow_settings(workflow):
+    # cpu_enable and gpu_mask of the run, with the defaults of src/settings.py
+    settings = dict({'cpu_enable': False, 'gpu_mask': None}, **((workflow or {}).get('settings') or {}))
+    return settings['cpu_enable'], settings['gpu_mask']
+
+def opportunities(report, workflow=None, labels=None):
+    # Tuning opportunities of the run, the largest estimated saving first: Step, Setting, Change, Saved (seconds), Reason.
+    # workflow: the 'workflow' config of the run (run_info.json), None for the defaults.
+    labels = classify(report) if labels is None else labels
+    csv = report.csv
+    durations = sample_durations(csv)
+    cpu_enable, gpu_mask = workflow_settings(workflow)
+    gpu_count = report.GPU['number']
+    enabled = gpu_count if not gpu_mask else min(gpu_count, str(gpu_mask).count('1'))
+    steps = plan_steps(workflow) if workflow else PLAN_DEFAULTS
+
+    rows = []
+    for step, rows_of_step in csv.groupby('Modulo', sort=False).groups.items():
+        step_labels = labels[rows_of_step].to_numpy()
+        seconds = durations[csv.index.get_indexer(rows_of_step)]
+        gpu_bound = step_labels == 'GPU'
+        gpu_time = seconds[gpu_bound].sum()
+
+        if gpu_time > 0 and not cpu_enable and csv.loc[rows_of_step[gpu_bound], 'CPU usage %'].mean() < CPU_BUSY:
+            rows.append((step, 'cpu_enable', 'false -> true', gpu_time * CPU_DEVICE_SHARE,
+                         f"GPU-bound for {gpu_time:.0f} s with the CPU mostly idle"))
+
+        if gpu_time > 0 and gpu_count > 1:
+            usage = csv.loc[rows_of_step[gpu_bound], [f'gproc-{i}' for i in range(gpu_count)]].mean()
+            busy = int((usage >= GPU_IDLE).sum())
+            if busy < gpu_count:
+                change = f"{gpu_mask or '1' * gpu_count} -> {'1' * gpu_count}" if enabled < gpu_count else f"all enabled, {busy} of {gpu_count} busy"
+                rows.append((step, 'gpu_mask', change, gpu_time * (1 - busy / gpu_count),
+                             f"GPU-bound for {gpu_time:.0f} s on {busy} of {gpu_count} GPUs"))
+
+        if 'downscale' in steps.get(step, {}):
+            downscale = steps[step]['downscale']
+            higher = [value for value in DOWNSCALES if value > downscale]
+            # the work follows the pixels: a downscale twice as high processes a quarter of them
+            bound_time = seconds[np.isin(step_labels, ['memory', 'GPU', 'CPU', 'CPU single-thread'])].sum()
+            if higher and bound_time > 0:
+                rows.append((step, 'downscale', f"{downscale} -> {higher[0]}", bound_time * (1 - (downscale / higher[0]) ** 2),
+                             f"compute-bound for {bound_time:.0f} s, lower quality"))
+
+    result = pd.DataFrame(rows, columns=['Step', 'Setting', 'Change', 'Saved (seconds)', 'Reason'])
+    return result.sort_values('Saved (seconds)', ascending=False, ignore_index=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Label the bottleneck of every step of a run and rank the tuning opportunities.')
+    parser.add_argument('folder', help='Run folder (monitor log and, optionally, run_info.json)')
+    parser.add_argument('--output', default=None, help='Excel file of the analysis (default bottlenecks.xlsx in the folder)')
+    parser.add_argument('--cache', default=None, help='Folder keeping the parsed monitor logs, read again only when they change')
+    args = parser.parse_args()
+
+    workflow = None
+    if os.path.exists(os.path.join(args.folder, 'run_info.json')):
+        with open(os.path.join(args.folder, 'run_info.json'), 'r') as f:
+            workflow = json.load(f).get('workflow')
+    report = Report(args.folder, cache=args.cache)
+    if 'CPU iowait %' not in report.csv:
+        print("Note: the monitor log has no iowait column, no sample is labeled I/O wait.")
+    labels = classify(report)
+    steps, ranked = bottlenecks(report, labels), opportunities(report, workflow, labels)
+    for step, row in steps.iterrows():
+        print(f"{step}: {row['Bottleneck']} {row['Share']:.0%} of {row['Duration (seconds)']:.0f} s")
+    for _, row in ranked.iterrows():
+        print(f"  {row['Saved (seconds)']:.0f} s  {row['Step']} {row['Setting']} {row['Change']} ({row['Reason']})")
+    with pd.ExcelWriter(args.output or os.path.join(args.folder, 'bottlenecks.xlsx')) as writer:
+        steps.to_excel(writer, sheet_name='steps')
+        intervals(report, labels).to_excel(writer, sheet_name='intervals', index=False)
+        ranked.to_excel(writer, sheet_name='opportunities', index=False)
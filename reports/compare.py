@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reports.report import Report
+from src.step_tracer import read_trace, summarize_trace
+
+"""
+This library compares the performance of several runs of the workflow.
+Every run folder (the project folder, with the monitor log and the 'run_info.json'
+written by step_workflow.py) is summarized once per step into a RunStore, a JSON file
+indexed by run that reads a folder again only when its log changed.
+Runs are aligned by step name: the last run is compared with the median of the runs
+before it and the steps slower or heavier beyond a threshold are flagged as regressions,
+next to the config values and Metashape version that changed.
+"""
+
+# monitor logs of a run folder, in the order Report looks for them
+LOGS = ['system.csv', 'monitor.csv', 'system.bin', 'monitor.bin']
+# per-step values of a run (Report.steps)
+METRICS = ['Duration (seconds)', 'CPU usage %', 'GPU Core %', 'RAM peak', 'GPU RAM peak']
+# mean compute time of a step in the trace of the run (src/step_tracer.py), next to the duration of the monitor log
+COMPUTE = 'Compute (seconds)'
+# values whose growth is a regression, with the smallest growth worth flagging (seconds, GB):
+# a 2 s step taking 3 s is noise, not a regression
+REGRESSIONS = {'Duration (seconds)': 10, 'RAM peak': 0.5, 'GPU RAM peak': 0.5}
+
+def find_log(folder):
+    for name in LOGS:
+        if os.path.exists(os.path.join(folder, name)):
+            return os.path.join(folder, name)
+    raise FileNotFoundError(f"Error: no monitor log ({', '.join(LOGS)}) in {folder}.")
+
+def flatten(config, prefix=''):
+    # nested config to {'PointCloudProcessor.buildDepthMaps.downscale': 1}
+    values = {}
+    for key, value in (config or {}).items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + str(key) + '.'))
+        else:
+            values[prefix + str(key)] = value
+    return values
+
+def summarize_run(folder, chunksize=100000):
+    # Summary of a run folder: run_info.json and the per-step values of its log, streamed in chunks
+    # (the memory does not grow with the length of the run). The compute time of the trace, when present,
+    # is kept next to the duration measured between the first and the last sample of the step: only the spans
+    # of this run count, the trace file is appended by every run of the project.
+    log = find_log(folder)
+    info = {}
+    if os.path.exists(os.path.join(folder, 'run_info.json')):
+        with open(os.path.join(folder, 'run_info.json'), 'r') as f:
+            info = json.load(f)
+    report = Report(folder, chunksize=chunksize)
+    steps = report.steps
+    steps[COMPUTE] = np.nan
+    if os.path.exists(os.path.join(folder, 'trace.jsonl')):
+        for name, entry in summarize_trace(read_trace(os.path.join(folder, 'trace.jsonl')), since=info.get('time')).items():
+            if name in steps.index:
+                steps.loc[name, COMPUTE] = entry['compute'] / entry['count']
+    return {
+        'folder': os.path.abspath(folder),
+        'log': os.path.basename(log),
+        'mtime': os.path.getmtime(log),
+        'size': os.path.getsize(log),
+        'time': info.get('time', float(report.start)),
+        'metashape': info.get('metashape'),
+        'images': info.get('images'),
+        'megapixels': info.get('megapixels'),
+        'config': flatten(info.get('workflow')),
+        # NaN (e.g. no GPU) as null in the JSON file
+        'steps': {step: {metric: None if pd.isna(value) else float(value) for metric, value in values.items()}
+                  for step, values in steps.iterrows()}
+    }
+
+class RunStore:
+    def __init__(self, path=None):
+        # `path`: JSON file keeping the summaries of the runs, None to keep them in memory only
+        self.path = path
+        self.runs = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.runs = json.load(f)['runs']
+
+    def add(self, folder, chunksize=100000):
+        # Summary of a run folder, computed again only when its log changed since it was stored
+        name = os.path.normpath(folder)
+        log = find_log(folder)
+        stored = self.runs.get(name)
+        if stored is None or stored['log'] != os.path.basename(log) or stored['mtime'] != os.path.getmtime(log) or stored['size'] != os.path.getsize(log):
+            self.runs[name] = summarize_run(folder, chunksize)
+        return self.runs[name]
+
+    def save(self):
+        # write on a temporary file and rename, as the run manifest
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'runs': self.runs}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def ordered(self, last=None):
+        # names of the runs by start time, only the most recent `last` ones when given
+        names = sorted(self.runs, key=lambda name: self.runs[name]['time'])
+        return names[-last:] if last else names
+
+    def frame(self, last=None):
+        # Per-step values of the runs, indexed by (run, step). The duration of a step is the compute time of the
+        # trace only when every run of the step has it, the duration of the monitor log otherwise (a run without
+        # trace): the runs of a step are always compared on the same quantity.
+        rows = {(run, step): values for run in self.ordered(last) for step, values in self.runs[run]['steps'].items()}
+        frame = pd.DataFrame.from_dict(rows, orient='index', columns=METRICS + [COMPUTE]).astype(float)
+        frame.index = pd.MultiIndex.from_tuples(frame.index, names=['Run', 'Step'])
+        traced = frame[COMPUTE].notna().groupby(level='Step').transform('all')
+        frame['Duration (seconds)'] = frame[COMPUTE].where(traced, frame['Duration (seconds)'])
+        return frame[METRICS]
+
+    def trend(self, metric='Duration (seconds)', last=None):
+        # One value of every step (rows) across the runs (columns, oldest first)
+        return self.frame(last)[metric].unstack('Run')[self.ordered(last)]
+
+    def compare(self, last=None, threshold=0.1):
+        # Per-step values of the most recent run next to the median of the runs before it (within the last `last`),
+        # with their deltas: relative (%) for duration and peaks, percentage points for the mean usage.
+        # 'Regression' lists the values that grew more than `threshold` (fraction of the baseline).
+        runs = self.ordered(last)
+        if len(runs) < 2:
+            raise ValueError("Error: at least two runs are needed for a comparison.")
+        frame = self.frame(last)
+        current = frame.xs(runs[-1], level='Run')
+        baseline = frame.drop(runs[-1], level='Run').groupby(level='Step').median()
+        steps = current.index.union(baseline.index)
+        current, baseline = current.reindex(steps), baseline.reindex(steps)
+
+        result = pd.DataFrame(index=steps)
+        flagged = {}
+        for metric in METRICS:
+            result[metric] = current[metric]
+            result[metric + ' baseline'] = baseline[metric]
+            if metric in REGRESSIONS:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    result[metric + ' delta %'] = (current[metric] / baseline[metric] - 1) * 100
+                growth = current[metric] - baseline[metric]
+                flagged[metric] = (growth > threshold * baseline[metric]) & (growth > REGRESSIONS[metric])
+            else:
+                result[metric + ' delta'] = current[metric] - baseline[metric]
+        result['Regression'] = [', '.join(metric for metric in flagged if flagged[metric][step]) for step in steps]
+        result.index.name = 'Step'
+        return result
+
+    def changes(self, run, other):
+        # Metashape version, run size and config values that differ between two runs: {key: (value in other, value in run)}
+        a, b = self.runs[other], self.runs[run]
+        values_a = dict(a['config'], metashape=a['metashape'], images=a['images'], megapixels=a['megapixels'])
+        values_b = dict(b['config'], metashape=b['metashape'], images=b['images'], megapixels=b['megapixels'])
+        return {key: (values_a.get(key), values_b.get(key)) for key in sorted(set(values_a) | set(values_b))
+                if values_a.get(key) != values_b.get(key)}
+
+    def export(self, path, last=None, threshold=0.1):
+        # Comparison, durations across the runs and changes from the previous run, one sheet each
+        runs = self.ordered(last)
+        changes = self.changes(runs[-1], runs[-2])
+        with pd.ExcelWriter(path) as writer:
+            self.compare(last, threshold).to_excel(writer, sheet_name='compare')
+            self.trend('Duration (seconds)', last).to_excel(writer, sheet_name='duration')
+            self.trend('RAM peak', last).to_excel(writer, sheet_name='ram')
+            pd.DataFrame([(key, old, new) for key, (old, new) in changes.items()],
+                         columns=['Key', runs[-2], runs[-1]]).to_excel(writer, sheet_name='changes', index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the steps of several runs of the workflow and flag the regressions of the most recent one.')
+    parser.add_argument('folders', nargs='*', help='Run folders (monitor log and run_info.json), added to the store')
+    parser.add_argument('--store', default='runs.json', help='JSON file of the summarized runs (default runs.json)')
+    parser.add_argument('--last', type=int, help='Compare only the most recent N runs of the store')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Growth flagged as regression, fraction of the baseline (default 0.1)')
+    parser.add_argument('--output', default='compare.xlsx', help='Excel file of the comparison (default compare.xlsx)')
+    args = parser.parse_args()
+
+    store = RunStore(args.store)
+    for folder in args.folders:
+        store.add(folder)
+    store.save()
+
+    runs = store.ordered(args.last)
+    result = store.compare(args.last, args.threshold)
+    print(f"Run {runs[-1]} compared with the median of {len(runs) - 1} runs before it")
+    for key, (old, new) in store.changes(runs[-1], runs[-2]).items():
+        print(f"  changed {key}: {old} -> {new}")
+    for step, row in result[result['Regression'] != ''].iterrows():
+        print(f"  REGRESSION {step}: {row['Regression']} (duration {row['Duration (seconds)']:.0f} s, "
+              f"{row['Duration (seconds) delta %']:+.0f}%; RAM peak {row['RAM peak']:.1f} GB, {row['RAM peak delta %']:+.0f}%)")
+    store.export(args.output, args.last, args.threshold)
@@ -1,66 +1,590 @@
+import argparse
+import hashlib
+import html
+import io
+import itertools
 import json
+import os
+import re
+import sys
+import time
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.monitor_store import read_header, read_monitor, read_progress, phases, PROCESS_COLUMNS as STORE_PROCESS_COLUMNS, IO_COLUMNS as STORE_IO_COLUMNS
+from src.progress_rate import step_throughput, format_eta
+
+# (column of the binary file, column of the DataFrame)
+PROCESS_COLUMNS = [(name, label) for name, _, label in STORE_PROCESS_COLUMNS]
+IO_COLUMNS = [(name, label) for name, _, label in STORE_IO_COLUMNS]
+# one GPU of the GPU column of 'system.csv': {'temp': '34°C', 'cpu_usage': '0%', 'mem_used': '0'}
+GPU_PATTERN = re.compile(r"\{'temp': '([^']*?)°C', 'cpu_usage': '([^']*?)%', 'mem_used': '([^']*)'\}")
+
+def parse_lists(column):
+    # Column of lists of numbers of 'system.csv' ("[0.0, 2.8, ...]" per row) to a single rows x values
+    # float array, parsed in one pass by the C parser of pandas instead of a json.loads per row.
+    rows = column.astype(str).tolist()
+    if len(rows) == 0 or rows[0].strip() in ('', '[]'):
+        return np.zeros((len(rows), 0))
+    text = '\n'.join(rows).replace('[', '').replace(']', '')
+    try:
+        values = pd.read_csv(io.StringIO(text), header=None, skip_blank_lines=False, dtype=float).values
+    except pd.errors.ParserError:
+        values = None   # a row longer than the first one
+    if values is None or values.shape[0] != len(rows) or np.isnan(values).any():
+        raise ValueError(f"Error: {column.name} has rows with a different number of values.")
+    return values
+
+def parse_gpus(column, count):
+    # GPU column of 'system.csv' to rows x GPUs float arrays (temperature °C, usage %, memory used MB),
+    # with a single regular expression over the whole column.
+    found = GPU_PATTERN.findall('\n'.join(column.astype(str).tolist()))
+    if len(found) != len(column) * count:
+        raise ValueError(f"Error: {len(found)} GPU values found in the GPU column, {len(column) * count} expected.")
+    values = np.array(found, dtype=float).reshape(len(column), count, 3)
+    return values[:, :, 0], values[:, :, 1], values[:, :, 2]
+
+def merge_values(total, chunk, count, rows):
+    # Values (CPU, GPU, IO dictionaries) of a chunk of `rows` samples merged into those of the `count` samples
+    # read before it: MAX extremes with the max, MIN with the min, MEAN_ weighted by the samples,
+    # the other values (number of cores and GPUs, totals) are the same in every chunk.
+    for key, value in chunk.items():
+        if key not in total:
+            total[key] = value
+        elif key.startswith('MEAN_'):
+            total[key] = (total[key] * count + value * rows) / (count + rows)
+        elif 'MAX' in key:
+            total[key] = np.fmax(total[key], value)
+        elif 'MIN' in key:
+            total[key] = np.fmin(total[key], value)
+    return total
+
+def bin_usage(csv, curves, bin_size, sums):
+    # Sum and count of the CPU and GPU usage of the samples of every step in the bins of its throughput curve
+    # (src/progress_rate.py step_throughput), added to sums {step: [CPU sum, CPU count, GPU sum, GPU count] per bin}.
+    times = csv['Time'].values.astype(float)
+    # samples of the step, also when it ran together with others ('buildModel+buildDem')
+    names = csv['Modulo'].str.split('+')
+    for step, (starts, _) in curves.items():
+        usage = sums.setdefault(step, np.zeros((4, len(starts))))
+        if len(starts) == 0:
+            continue
+        bins = np.searchsorted(starts, times, side='right') - 1
+        inside = names.apply(lambda labels: step in labels).values & (bins >= 0)
+        inside &= times < starts[np.maximum(bins, 0)] + bin_size
+        for row, column in enumerate(['CPU usage %', 'GPU Core %']):
+            values = csv[column].values[inside].astype(float)
+            valid = ~np.isnan(values)
+            usage[2 * row] += np.bincount(bins[inside][valid], weights=values[valid], minlength=len(starts))
+            usage[2 * row + 1] += np.bincount(bins[inside][valid], minlength=len(starts))
 
 """
 This library processes the 'system.csv' file coming from
 the resource consumption monitoring script. 
 It produces plots and files with readable informations.
 The main class, Report, expects a folder as input during instantiation,
-where it searches for 'system.csv' and places the output artifacts
+where it searches for 'system.csv' (or 'monitor.csv', or the binary 'system.bin'/'monitor.bin'
+written by SystemMonitor) and places the output artifacts
 """
 
+def split_steps(values, how):
+    # Values per 'Modulo' label to values per step: a label of steps run together ('buildModel+buildDem')
+    # counts for each of them; `how` combines the values of the labels of a step ('sum', 'min', 'max')
+    steps = pd.Series(values.index.str.split('+'), index=values.index).explode()
+    return values.loc[steps.index].groupby(steps.values).agg(how)
+
+def segments(control):
+    # Run-length encoding of the steps: positions of the first row of every run of equal 'Control' values
+    # and of the first row of the next run (the last row for the last run).
+    control = np.asarray(control)
+    if len(control) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    starts = np.concatenate([[0], np.flatnonzero(control[1:] != control[:-1]) + 1])
+    ends = np.append(starts[1:], len(control) - 1)
+    return starts, ends
+
+def decimate(values, buckets):
+    # Series reduced for display to the min and max of every bucket of consecutive samples, at their positions:
+    # at most 2 * buckets points whatever the length, peaks and dips are kept. Returns (positions, values).
+    values = np.asarray(values, dtype=float)
+    if len(values) <= 2 * buckets:
+        return np.arange(len(values)), values
+    size = -(-len(values) // buckets)     # samples per bucket
+    rows = np.full(-(-len(values) // size) * size, np.nan)
+    rows[:len(values)] = values
+    rows = rows.reshape(-1, size)
+    missing = np.isnan(rows)
+    offsets = np.arange(len(rows)) * size
+    lows = np.where(missing, np.inf, rows).argmin(axis=1) + offsets
+    highs = np.where(missing, -np.inf, rows).argmax(axis=1) + offsets
+    positions = np.unique(np.concatenate([lows, highs]))    # a bucket of NaN only keeps a NaN point, a gap
+    positions = positions[positions < len(values)]
+    return positions, values[positions]
+
+def plot_decimated(ax, series, buckets, **kwargs):
+    # Line of a series at the positions of its rows, decimated to `buckets` (the width in pixels of the axes)
+    positions, values = decimate(series.values, buckets)
+    return ax.plot(positions, values, **kwargs)[0]
+
+def buckets(fig):
+    # pixels of the figure width: the plotted points do not depend on the length of the log
+    return int(fig.get_figwidth() * fig.dpi)
+
+def read_text(path, start=0):
+    # Rows of a 'system.csv' log from byte `start` (0 or the end of a row) to the last complete row,
+    # and the byte where they end: a row still being written is left for the next read.
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    csv = pd.read_csv(io.BytesIO((header if start else b'') + data[:end]), sep=";")
+    return csv, start + end
+
+def text_chunks(path, chunksize, start=0):
+    # Chunks of `chunksize` complete rows of a text log from byte `start` (0 or the end of a row),
+    # with the byte where each one ends: a row still being written is left for the next read.
+    with open(path, 'rb') as f:
+        header = f.readline()
+        position = max(start, f.tell())
+        f.seek(position)
+        while True:
+            lines = list(itertools.islice(f, chunksize))
+            partial = bool(lines) and not lines[-1].endswith(b'\n')
+            if partial:
+                lines.pop()
+            if not lines:
+                return
+            position += sum(map(len, lines))
+            yield pd.read_csv(io.BytesIO(header + b''.join(lines)), sep=";"), position
+            if partial:
+                return
+
+def tail_hash(path, size, tail=65536):
+    # Hash of the last `tail` bytes before `size`: with the size and mtime, the fingerprint of the log in the cache
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - tail))
+        return hashlib.sha256(f.read(size - max(0, size - tail))).hexdigest()
+
+# attributes of the Report kept in the cache of the log: frames and arrays as numpy arrays, the rest as JSON
+CACHED_FRAMES = ['csv', 'norm']
+CACHED_VALUES = ['CPU', 'GPU', 'GPUS', 'IO', 'DISKS', 'NICS', 'RAM_GROUND', 'GPU_header', 'size']
+CACHE_VERSION = 2
+
+def frame_arrays(name, frame, arrays):
+    # Columns of `frame` as arrays '<name>/<i>' of a .npz file, text as unicode arrays (missing values masked),
+    # and the names and dtypes to build it again
+    columns = []
+    for i, (label, column) in enumerate(frame.items()):
+        key = f'{name}/{i}'
+        if column.dtype.kind in 'biuf':
+            arrays[key] = column.to_numpy()
+        else:
+            arrays[key] = column.fillna('').to_numpy(dtype=str)
+            if column.isna().any():
+                arrays[key + '/missing'] = column.isna().to_numpy()
+        columns.append([label, str(column.dtype)])
+    return columns
+
+def array_frame(name, columns, arrays):
+    frame = {}
+    for i, (label, dtype) in enumerate(columns):
+        column = pd.Series(arrays[f'{name}/{i}']).astype(dtype)
+        if f'{name}/{i}/missing' in arrays:
+            column = column.mask(arrays[f'{name}/{i}/missing'])
+        frame[label] = column
+    return pd.DataFrame(frame)
+
+# follow mode: seconds of samples of the dashboard window, GPU usage % below which a GPU
+# is flagged as under-used while a step that Metashape runs on the GPUs is running
+RECENT = 300
+LOW_GPU = 20
+GPU_STEPS = ['matchPhotos', 'buildDepthMaps', 'buildModel', 'buildTexture', 'buildTiledModel']
+
+# columns of the samples averaged by the scores
+SCORE_COLUMNS = ['CPU usage %', 'Cores N.', 'RAM', 'GPU Core %', 'GPU RAM']
+# columns of the samples whose max is kept per step (GB)
+PEAK_COLUMNS = ['RAM', 'GPU RAM']
+
 class Report:
-    def __init__(self, data_path='.', CPU_THRESHOLD=0, RAM_BASE=0):
+    def __init__(self, data_path='.', CPU_THRESHOLD=0, RAM_BASE=0, chunksize=None, cache=None):
         # `CPU_THRESHOLD` and `RAM_BASE` are float cutoff values used 
         # to exclude the baseline system consumption from the calculations.
+        # `chunksize`: when given, the log is streamed `chunksize` rows at a time and only
+        # per-step aggregates are kept, so the memory does not grow with the samples:
+        # scores, attribution, throughput and export() are the same, the plots are not available.
+        # A log still being written can then be followed (follow()), reading only the rows appended to it.
+        # `cache`: folder where the parsed and preprocessed log is kept (a .npz file per log, no pickled objects),
+        # loaded instead of the log while it does not change and extended with the new rows only when the log grows;
+        # None (default) to parse the log every time. The data folder is never written.
 
         # Save the data path and thresholds into the object's attributes.
         self.data_path = data_path
         self.CPU_THRESHOLD = CPU_THRESHOLD
         self.RAM_BASE = RAM_BASE
+        self.chunksize = chunksize
+        self.cache = cache
         
-        # Create a pandas DataFrame with the data from 'system.csv'.
-        self.csv = pd.read_csv(data_path+'/system.csv', sep=";")
-
-        # Initialize dictionaries to store CPU and GPU informations after processing.
+        # Create a pandas DataFrame with the data from 'system.csv',
+        # or from the binary columnar file, whose columns are already numeric.
+        # text log: 'system.csv', or 'monitor.csv' of SystemMonitor with a .csv path
+        texts = [data_path+'/'+name for name in ['system.csv', 'monitor.csv'] if os.path.exists(data_path+'/'+name)]
+        self.columnar = not texts
+        if texts:
+            self.source = texts[0]
+        else:
+            self.source = self.data_path+'/system.bin'
+            if not os.path.exists(self.source):
+                self.source = self.data_path+'/monitor.bin'
+        if chunksize:
+            self.stream()
+            return
+        if cache and self.load_cache():
+            return
+        if self.columnar:
+            self.load_columnar()
+        else:
+            self.csv, self.size = read_text(self.source)
+
+        # Initialize dictionaries to store CPU, GPU and I/O informations after processing.
         self.CPU = {}
         self.GPU = {}
+        self.IO = {}
 
         # Preprocess and normalize data as part of the initialization process.
         self.preprocess_gpu()
         self.preprocess()
+        self.preprocess_io()
+        self.normalize()
+        if cache:
+            self.save_cache()
+
+    def load_columnar(self):
+        # Build the DataFrame from the binary file of SystemMonitor (src/monitor_store.py):
+        # the per-core, per-GPU and per-device columns are numeric arrays, no string parsing is needed;
+        # the 2-D ones are kept aside (self.cores, self.io) instead of a column of per-row arrays.
+        self.csv = self.columnar_frame(self.open_columnar())
+
+    def open_columnar(self, memory_map=False):
+        # Read the header of the binary file (devices and GPUs) and return its records,
+        # mapped from the file with `memory_map` to read them chunk by chunk.
+        header, records = read_monitor(self.source, memory_map)
+        _, dtype, offset = read_header(self.source)
+        self.size = offset + len(records) * dtype.itemsize     # bytes of the complete records
+        self.DISKS = header['disks']
+        self.NICS = header['nics']
+
+        # GPU description in the format of the 'system.csv' header
+        self.GPUS = [{'id': '['+str(gpu['id'])+']', 'model': gpu['model'].replace(' ', ''), 'mem_total': str(gpu['mem_total'])+'MB'}
+                     for gpu in header['gpus']]
+        return records
+
+    def columnar_frame(self, records):
+        csv = pd.DataFrame({
+            'Modulo': phases(records),
+            'Time': records['time'],
+            'CPU usage %': records['cpu'].astype(float),
+            'CPU iowait %': records['cpu_iowait'].astype(float),
+            'RAM usage %': records['ram_usage'].astype(float),
+            'RAM active': records['ram_active'],
+            'RAM total': records['ram_total'],
+            'RAM Available': records['ram_available'],
+            'RAM Used': records['ram_used']
+        })
+        # totals of the monitored process tree
+        for name, label in PROCESS_COLUMNS:
+            csv[label] = records[name]
+        self.cores = records['cores'].astype(float)
+        # disk and network rates, one value per device
+        self.io = {label: records[name].astype(float).reshape(len(records), -1) for name, label in IO_COLUMNS}
+        for i in range(len(self.GPUS)):
+            csv['gtemp-'+str(i)] = records['gpu_temp'][:, i].astype(float)
+            csv['gproc-'+str(i)] = records['gpu_usage'][:, i].astype(float)
+            csv['gmem-'+str(i)] = records['gpu_mem_used'][:, i] / 1024
+        return csv
+
+    def stream(self, bin_size=60):
+        # Read the log in chunks of `chunksize` rows, preprocess every chunk as the whole log
+        # and keep only per-step sums and counts of the averaged columns, the time of the first and last sample
+        # of every step, the extremes of CPU, GPU and I/O and the per-bin usage of the throughput curves.
+        progress = read_progress(self.source)
+        self.curves = step_throughput(progress, bin_size) if len(progress) else None
+        self.bin_size = bin_size
+        self.usage = {}         # step: CPU and GPU usage per bin of the throughput curve
+        self.aggregates = {}    # 'scores', 'attribution': (sums, counts) per step
+        self.first = self.last = None   # time of the first and last sample of every step
+        self.peaks = None               # max RAM and GPU RAM of every step
+        self.start = self.end = None    # time of the first and last sample
+        self.recent = None              # samples of the last RECENT seconds, for the dashboard
+        self.totals = ({}, {}, {}, None)    # CPU, GPU, IO and GPUS of the rows read
+        self.count = 0                      # rows read
+        self.size = 0                       # bytes of the log read
+        for csv, size in self.chunks(0):
+            self.add_chunk(csv)
+            self.size = size
+        self.tail = tail_hash(self.source, self.size)
+        self.summarize()
+
+    def chunks(self, start):
+        # Chunks of `chunksize` rows of the log from row `start` (binary log) or byte `start` (text log),
+        # with the bytes of the log read after each one
+        if self.columnar:
+            records = self.open_columnar(memory_map=True)
+            for first in range(start, len(records), self.chunksize):
+                yield self.columnar_frame(records[first:first + self.chunksize]), self.size
+        else:
+            yield from text_chunks(self.source, self.chunksize, start)
+
+    def add_chunk(self, csv):
+        # Preprocess a chunk and add it to the aggregates
+        self.totals = self.preprocess_chunk(csv, self.totals, self.count)
+        self.count += len(csv)
+
+        self.accumulate('scores', csv[['Modulo'] + SCORE_COLUMNS])
+        attribution = self.attribution_frame(csv)
+        if attribution is not None:
+            self.accumulate('attribution', attribution)
+        times = csv.groupby('Modulo')['Time'].agg(['first', 'last'])
+        self.first = times['first'] if self.first is None else self.first.combine_first(times['first'])
+        self.last = times['last'] if self.last is None else times['last'].combine_first(self.last)
+        peaks = csv.groupby('Modulo')[PEAK_COLUMNS].max()
+        self.peaks = peaks if self.peaks is None else pd.concat([self.peaks, peaks]).groupby(level=0).max()
+        self.start = csv['Time'].iloc[0] if self.start is None else self.start
+        self.end = csv['Time'].iloc[-1]
+        if self.curves is not None:
+            bin_usage(csv, self.curves, self.bin_size, self.usage)
+
+        columns = ['Time', 'Modulo', 'CPU usage %', 'RAM'] + [column for i in range(len(self.GPUS)) for column in ['gproc-'+str(i), 'gmem-'+str(i)]]
+        recent = csv[columns] if self.recent is None else pd.concat([self.recent, csv[columns]], ignore_index=True)
+        self.recent = recent[recent['Time'] >= recent['Time'].iloc[-1] - RECENT].reset_index(drop=True)
+
+    def summarize(self):
+        # CPU, GPU, IO and GPUS of all the rows read
+        self.CPU, self.GPU, self.IO, self.GPUS = self.totals
+        self.RAM_GROUND = min(self.RAM_BASE, self.CPU["MIN_RAM_USAGE"])
+        # nothing of the samples is kept
+        self.csv = self.norm = self.cores = self.io = None
+
+    def update(self):
+        # Add the rows appended to the log since the last read to the aggregates and return their number.
+        # The time depends on the new rows, not on the length of the log.
+        # A log written again (shorter than the part read, or that part changed) is streamed from the start.
+        if self.rewritten():
+            self.stream(self.bin_size)
+            return self.count
+        count = self.count
+        for csv, size in self.chunks(self.count if self.columnar else self.size):
+            self.add_chunk(csv)
+            self.size = size
+        self.tail = tail_hash(self.source, self.size)
+        if self.count:
+            self.summarize()
+        return self.count - count
+
+    def rewritten(self):
+        # The bytes read before are no longer at the start of the log: a new run writes the same path
+        return os.path.getsize(self.source) < self.size or tail_hash(self.source, self.size) != self.tail
+
+    def follow(self, interval=10, dashboard=None, updates=None):
+        # Follow a log still being written: every `interval` seconds read the new rows (update())
+        # and write the dashboard, an HTML page that reloads itself (default 'dashboard.html' in the data folder).
+        # `updates`: number of updates, None to follow the log until interrupted.
+        # The throughput curves stay those of the progress recorded when the log was streamed.
+        assert self.chunksize, "Error: follow needs the streaming mode, Report(data_path, chunksize=...)."
+        path = dashboard or self.data_path + '/dashboard.html'
+        done = 0
+        while True:
+            self.update()
+            if self.count:
+                self.write_dashboard(path, interval)
+            done += 1
+            if updates is not None and done >= updates:
+                return
+            time.sleep(interval)
+
+    def write_dashboard(self, path, refresh=10):
+        # HTML page of the followed log, reloaded every `refresh` seconds: current step and usage, mean usage of every
+        # GPU in the last RECENT seconds of the step (flagged below LOW_GPU for GPU steps) and the values per step so far
+        recent, gpus = self.recent, range(len(self.GPUS))
+        last = recent.iloc[-1]
+        step = last['Modulo']
+        usage = recent.loc[recent['Modulo'] == step, ['gproc-'+str(i) for i in gpus]].mean()
+        window = recent.loc[recent['Modulo'] == step, 'Time']
+        warnings = []
+        if any(name in GPU_STEPS for name in step.split('+')):
+            warnings = [f"GPU {i} under-used: {value:.0f}% in the last {format_eta(window.iloc[-1] - window.iloc[0])} of {step}"
+                        for i, value in enumerate(usage) if value < LOW_GPU]
+        rows = [
+            ('Step', step),
+            ('Last sample', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last['Time']))),
+            ('Elapsed', format_eta(self.end - self.start)),
+            ('Samples', str(self.count)),
+            ('CPU usage %', f"{last['CPU usage %']:.0f}"),
+            ('RAM', f"{last['RAM']:.1f} of {self.CPU['RAM_TOTAL']:.1f} GB")
+        ] + [(f"GPU {i}", f"{last['gproc-'+str(i)]:.0f}% ({usage.iloc[i]:.0f}% in the step window), {last['gmem-'+str(i)]:.1f} GB") for i in gpus]
+
+        page = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8">',
+                f'<meta http-equiv="refresh" content="{int(refresh)}">',
+                f'<title>{html.escape(step)}</title>',
+                '<style>body {font-family: sans-serif} table {border-collapse: collapse} '
+                'td, th {padding: 2px 8px; text-align: right; border-bottom: 1px solid #ddd} .warning {color: #b00000}</style>',
+                '</head><body>', f'<h2>{html.escape(self.source)}</h2>']
+        page += [f'<p class="warning">{html.escape(warning)}</p>' for warning in warnings]
+        page += ['<table>'] + [f'<tr><th>{name}</th><td>{html.escape(value)}</td></tr>' for name, value in rows] + ['</table>']
+        page += ['<h3>Steps</h3>', self.steps.to_html(float_format='{:.1f}'.format, na_rep=''), '</body></html>']
+
+        # write on a temporary file and rename, the browser never reads half a page
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(page))
+        os.replace(tmp_path, path)
+
+    def preprocess_chunk(self, csv, totals, count):
+        # Preprocess rows of the log on their own (self.csv, self.CPU, ... are those of the chunk) and return
+        # the CPU, GPU, IO and GPUS values of the `count` rows before them (totals) merged with those of the chunk
+        self.csv, self.CPU, self.GPU, self.IO = csv, {}, {}, {}
+        self.preprocess_gpu()
+        self.preprocess()
+        self.preprocess_io()
+        CPU, GPU, IO, GPUS = totals
+        merge_values(CPU, self.CPU, count, len(csv))
+        merge_values(GPU, self.GPU, count, len(csv))
+        merge_values(IO, self.IO, count, len(csv))
+        GPUS = [merge_values(dict(total), gpu, count, len(csv)) for total, gpu in zip(GPUS or self.GPUS, self.GPUS)]
+        return CPU, GPU, IO, GPUS
+
+    def cache_path(self):
+        # one file per log in the cache folder, named by the hash of its absolute path
+        source = os.path.abspath(self.source)
+        return os.path.join(self.cache, hashlib.sha256(source.encode('utf-8')).hexdigest()[:16] + '.npz')
+
+    def save_cache(self):
+        # Write the parsed log on a temporary file and rename it; a log that cannot be cached is only a slower start
+        arrays = {}
+        state = {name: getattr(self, name, None) for name in CACHED_VALUES}
+        state['frames'] = {name: frame_arrays(name, getattr(self, name), arrays) for name in CACHED_FRAMES}
+        if self.cores is not None:
+            arrays['cores'] = self.cores
+        state['io'] = list(self.io)
+        for i, values in enumerate(self.io.values()):
+            arrays[f'io/{i}'] = values
+        state.update(version=CACHE_VERSION, source=os.path.abspath(self.source), thresholds=[self.CPU_THRESHOLD, self.RAM_BASE],
+                     mtime=os.path.getmtime(self.source), tail=tail_hash(self.source, self.size))
+        # numpy scalars of the totals as numbers
+        arrays['state'] = np.array(json.dumps(state, default=lambda value: value.item()))
+        tmp_path = self.cache_path() + '.tmp'
+        try:
+            os.makedirs(self.cache, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.cache_path())
+        except OSError as e:
+            print(f"Note: report cache {self.cache_path()} not written ({e}).")
+
+    def load_cache(self):
+        # Load the cache when it matches the log: same size, mtime and tail hash. When the log grew
+        # and the part read before is unchanged (tail hash), only the new rows are parsed and appended.
+        # False when there is no valid cache and the log has to be parsed.
+        if not os.path.exists(self.cache_path()):
+            return False
+        try:
+            with np.load(self.cache_path(), allow_pickle=False) as data:
+                arrays = dict(data)
+            state = json.loads(str(arrays['state']))
+        except (OSError, KeyError, ValueError):
+            return False
+        if (state.get('version') != CACHE_VERSION or state['source'] != os.path.abspath(self.source)
+                or state['thresholds'] != [self.CPU_THRESHOLD, self.RAM_BASE]):
+            return False
+        size = os.path.getsize(self.source)
+        if size < state['size'] or tail_hash(self.source, state['size']) != state['tail']:
+            return False    # log rewritten
+        if size == state['size'] and os.path.getmtime(self.source) != state['mtime']:
+            return False
+        for name in CACHED_VALUES:
+            setattr(self, name, state[name])
+        for name, columns in state['frames'].items():
+            setattr(self, name, array_frame(name, columns, arrays))
+        self.cores = arrays.get('cores')
+        self.io = {label: arrays[f'io/{i}'] for i, label in enumerate(state['io'])}
+        if size > state['size']:
+            self.extend()
+            self.save_cache()
+        return True
+
+    def extend(self):
+        # Preprocess the rows appended to the log since it was read and append them to the samples;
+        # the normalized data is computed again, its scale depends on all the samples
+        csv, cores, io, totals = self.csv, self.cores, self.io, (self.CPU, self.GPU, self.IO, self.GPUS)
+        if self.columnar:
+            new = self.columnar_frame(self.open_columnar(memory_map=True)[len(csv):])
+        else:
+            new, self.size = read_text(self.source, self.size)
+        if len(new) == 0:
+            self.cores, self.io, self.GPUS = cores, io, totals[3]
+            return
+        totals = self.preprocess_chunk(new, totals, len(csv))
+
+        # number the runs of the steps after those already read
+        new['Control'] += csv['Control'].iloc[-1] - (1 if new['Modulo'].iloc[0] == csv['Modulo'].iloc[-1] else 0)
+        self.csv = pd.concat([csv, new], ignore_index=True)
+        self.cores = np.vstack([cores, self.cores])
+        self.io = {label: np.vstack([io[label], values]) for label, values in self.io.items()}
+        self.CPU, self.GPU, self.IO, self.GPUS = totals
+        self.RAM_GROUND = min(self.RAM_BASE, self.CPU["MIN_RAM_USAGE"])
         self.normalize()
 
+    def accumulate(self, name, frame):
+        # Sums and counts (of the values that are not NaN) per step of the columns of a chunk,
+        # added to those of the chunks before it
+        groups = frame.groupby('Modulo')
+        sums, counts = groups.sum(), groups.count()
+        if name in self.aggregates:
+            total_sums, total_counts = self.aggregates[name]
+            sums, counts = total_sums.add(sums, fill_value=0), total_counts.add(counts, fill_value=0)
+        self.aggregates[name] = (sums, counts)
+
+    def means(self, name):
+        # Per-step means of the streamed columns, and their mean over all the samples in the 'Total' row
+        sums, counts = self.aggregates[name]
+        means = (sums / counts).sort_index()
+        means.loc['Total'] = sums.sum() / counts.sum()
+        return means
+
     def preprocess_gpu(self):
 
         csv = self.csv
 
-        # Extract the GPU-specific header, the last column, containing JSON string about GPU usage.
-        header = csv.columns[-1]
-        self.GPU_header = header
+        if not self.columnar:
+            # Extract the GPU-specific header, the last column, containing JSON string about GPU usage.
+            header = csv.columns[-1]
+            self.GPU_header = header
 
-        # Initialize the GPUS dictionary with parsed header data
-        self.GPUS = json.loads(self.GPU_header.replace("GPUs: ", "").replace("'", '"'))  
+            # Initialize the GPUS dictionary with parsed header data
+            self.GPUS = json.loads(self.GPU_header.replace("GPUs: ", "").replace("'", '"'))  
 
         # Initialize GPU dictionary with the number of GPUs and a placeholder for total GPU RAM.
         self.GPU = {} 
         self.GPU["number"] = len(self.GPUS) 
         self.GPU["RAM_TOTAL"] = 0
  
-        # Convert GPU column element from a JSON string to a dictionary 
-        csv[self.GPU_header] = csv[self.GPU_header].apply(lambda x : json.loads(x.replace("'", '"')) )
-        
+        if not self.columnar:
+            # Parse the GPU column (a list of dictionaries per row) into per-GPU float arrays
+            temps, usages, mems = parse_gpus(csv[self.GPU_header], self.GPU["number"])
+
         #give a name to every GPU and create colums "gproc-i", "gtemp-i" and "gmem-i" for every gpu 
         gproc = []
         gmem = []
         for i in range(self.GPU["number"]):
             gproc.append('gproc-'+str(i))
             gmem.append('gmem-'+str(i))
-            csv['gtemp-'+str(i)]=csv[self.GPU_header].apply(lambda x: x[i]['temp'])
-            csv['gproc-'+str(i)]=csv[self.GPU_header].apply(lambda x: float(x[i]['cpu_usage'][:-1]))
-            csv['gmem-'+str(i)]=csv[self.GPU_header].apply(lambda x: float(x[i]['mem_used'])/1024)
+            if not self.columnar:
+                csv['gtemp-'+str(i)]=temps[:, i]
+                csv['gproc-'+str(i)]=usages[:, i]
+                csv['gmem-'+str(i)]=mems[:, i]/1024
 
             # Record extremal values for core usage and RAM usage for each GPU.
             self.GPUS[i]['CORES_MAX_USAGE'] = csv['gproc-'+str(i)].max()
@@ -86,18 +610,22 @@ class Report:
         # Record the maximum CPU usage percentage from the data.
         self.CPU["MAX_USAGE"]=csv['CPU usage %'].max()
 
-        # Convert JSON strings in 'Cores usage %' to numpy arrays 
+        # Convert the lists of 'Cores usage %' to a rows x cores array
         # and calculate the number of cores, the average cores usage
-        csv['Cores usage %'] = csv['Cores usage %'].apply(json.loads).apply(np.array)
-        self.CPU["CORES"]=len(csv['Cores usage %'][0])
-        csv['Cores %'] = csv['Cores usage %'].apply(np.mean)
+        if not self.columnar:
+            self.cores = parse_lists(csv['Cores usage %'])
+        self.CPU["CORES"]=self.cores.shape[1]
+        csv['Cores %'] = self.cores.mean(axis=1)
 
         # Count the number of cores exceeding the CPU threshold for each row.
-        csv['Cores N.'] = csv['Cores usage %'].apply(lambda x : np.sum(x > self.CPU_THRESHOLD))
+        csv['Cores N.'] = (self.cores > self.CPU_THRESHOLD).sum(axis=1)
 
         # Extract the total RAM from the first row, assume units are in GB
         # (splitting the string to get the numeric part).
-        self.CPU['RAM_TOTAL']=float(csv['RAM total'][0].split(' ')[1])
+        if self.columnar:
+            self.CPU['RAM_TOTAL']=float(csv['RAM total'][0])
+        else:
+            self.CPU['RAM_TOTAL']=float(csv['RAM total'][0].split(' ')[1])
 
         # Calculate actual RAM usage in GB based on the percentage usage and total RAM.
         csv['RAM']=csv['RAM usage %']*(self.CPU["RAM_TOTAL"]/100)
@@ -117,19 +645,67 @@ class Report:
         csv['Control']=csv['Modulo'].ne(csv['Modulo'].shift()).cumsum()
  
 
+    def preprocess_io(self):
+        # Disk and network rates of SystemMonitor: a column per device ("dread-<disk>", "dwrite-<disk>" in MB/s,
+        # "diops-<disk>" read and write operations/s, "nrecv-<nic>", "nsent-<nic>" in MB/s) and the node totals.
+        # Nothing to do for data without I/O columns (files of the previous versions).
+
+        csv = self.csv
+        if not self.columnar:
+            if 'Disk read MB/s' not in csv:
+                self.io = {}
+            else:
+                # Convert the lists of the text file; it does not name the devices, they are numbered
+                self.io = {label: parse_lists(csv[label]) for _, label in IO_COLUMNS}
+                self.DISKS = [str(i) for i in range(self.io['Disk read MB/s'].shape[1])]
+                self.NICS = [str(i) for i in range(self.io['Net recv MB/s'].shape[1])]
+        if not self.io:
+            return
+
+        # rows x devices
+        values = self.io
+        iops = values['Disk read IOPS'] + values['Disk write IOPS']
+        for i, disk in enumerate(self.DISKS):
+            csv['dread-'+disk] = values['Disk read MB/s'][:, i]
+            csv['dwrite-'+disk] = values['Disk write MB/s'][:, i]
+            csv['diops-'+disk] = iops[:, i]
+        for i, nic in enumerate(self.NICS):
+            csv['nrecv-'+nic] = values['Net recv MB/s'][:, i]
+            csv['nsent-'+nic] = values['Net sent MB/s'][:, i]
+
+        # totals of the node
+        csv['Disk read'] = values['Disk read MB/s'].sum(axis=1)
+        csv['Disk write'] = values['Disk write MB/s'].sum(axis=1)
+        csv['Disk IOPS'] = iops.sum(axis=1)
+        csv['Net recv'] = values['Net recv MB/s'].sum(axis=1)
+        csv['Net sent'] = values['Net sent MB/s'].sum(axis=1)
+
+        # record mean and extremal values
+        for column in ['Disk read', 'Disk write', 'Disk IOPS', 'Net recv', 'Net sent']:
+            key = column.upper().replace(' ', '_')
+            self.IO['MEAN_'+key] = csv[column].mean()
+            self.IO['MAX_'+key] = csv[column].max()
+
+
+    def normalized(self, frame):
+        # Scale the SCORE_COLUMNS of frame to [0, 1]. The scaling is linear, so the normalized
+        # per-step means of the streaming mode are the means of the normalized samples.
+        norm = pd.DataFrame(index=frame.index)
+
+        norm['CPU']= frame['CPU usage %']/100
+        norm['Cores'] = frame['Cores N.']/self.CPU["MAX_CORES_USED"]
+        norm['RAM'] = (frame['RAM']-self.RAM_GROUND)/(self.CPU["RAM_TOTAL"]-self.RAM_GROUND)
+
+        norm['GPU'] = frame['GPU Core %']/100
+        norm['gRAM'] = frame['GPU RAM']/self.GPU["RAM_TOTAL"]
+        return norm
+
     def normalize(self):
         # Create a DataFrame with normalized data to facilitate comparison 
         # across different data types, such as RAM usage and cores usage.
 
         csv = self.csv
-        norm = pd.DataFrame()
-
-        norm['CPU']= csv['CPU usage %']/100
-        norm['Cores'] = csv['Cores N.']/self.CPU["MAX_CORES_USED"]
-        norm['RAM'] = (csv['RAM']-self.RAM_GROUND)/(self.CPU["RAM_TOTAL"]-self.RAM_GROUND)
-
-        norm['GPU'] = csv['GPU Core %']/100
-        norm['gRAM'] = csv['GPU RAM']/self.GPU["RAM_TOTAL"]
+        norm = self.normalized(csv)
 
         norm['Modulo'] = csv['Modulo']
         norm['Control'] = csv['Control']
@@ -146,6 +722,14 @@ class Report:
         # resource exploitation indicator 
         # from normalized data
 
+        if self.chunksize:
+            # normalized per-step means of the streamed chunks
+            s = self.normalized(self.means('scores'))
+            s['Mean']=s.mean(axis=1)
+            s['Interval (seconds)']=self.last-self.first
+            s.loc['Total','Interval (seconds)'] = self.end-self.start
+            return s
+
         # drop the 'Control' column
         norm = self.norm.drop('Control', axis=1)
 
@@ -166,6 +750,95 @@ class Report:
         return s
     
 
+    @property
+    def steps(self):
+        # Absolute values per step, to compare runs (reports/compare.py): time between the first and the last
+        # sample of the step, mean CPU and GPU usage (%), peak RAM and GPU RAM (GB), in the order the steps ran.
+        # The samples of steps run together ('buildModel+buildDem') count for each of them,
+        # so that runs with a different parallelism line up.
+        if self.chunksize:
+            (sums, counts), peaks, first, last = self.aggregates['scores'], self.peaks, self.first, self.last
+        else:
+            groups = self.csv.groupby('Modulo')
+            sums, counts, peaks = groups[SCORE_COLUMNS].sum(), groups[SCORE_COLUMNS].count(), groups[PEAK_COLUMNS].max()
+            first, last = groups['Time'].first(), groups['Time'].last()
+        means = split_steps(sums, 'sum') / split_steps(counts, 'sum')
+        peaks, first, last = split_steps(peaks, 'max'), split_steps(first, 'min'), split_steps(last, 'max')
+        return pd.DataFrame({
+            'Duration (seconds)': last - first,
+            'CPU usage %': means['CPU usage %'],
+            'GPU Core %': means['GPU Core %'],
+            'RAM peak': peaks['RAM'],
+            'GPU RAM peak': peaks['GPU RAM']
+        }).loc[first.sort_values().index]
+
+    @property
+    def attribution(self):
+        # Share of the node used by the monitored process tree and by the rest of the node
+        # (other tenants), per step. None when the data has no process columns.
+        if self.chunksize:
+            return self.means('attribution') if 'attribution' in self.aggregates else None
+        a = self.attribution_frame(self.csv)
+        if a is None:
+            return None
+        s = a.groupby('Modulo').mean()
+        s.loc['Total'] = a.drop('Modulo', axis=1).mean()
+        return s
+
+    def attribution_frame(self, csv):
+        # Per-sample values of the attribution, None without process columns
+        if 'Proc CPU %' not in csv:
+            return None
+
+        def gb(column):
+            # values of the text file have the " GB" suffix
+            return pd.to_numeric(column.astype(str).str.replace(' GB', '', regex=False).str.strip())
+
+        a = pd.DataFrame({
+            'Modulo': csv['Modulo'],
+            'CPU %': csv['CPU usage %'],
+            'Proc CPU %': pd.to_numeric(csv['Proc CPU %']),
+            'RAM Used': gb(csv['RAM Used']),
+            'Proc RSS': pd.to_numeric(csv['Proc RSS']),
+            'Proc USS': pd.to_numeric(csv['Proc USS']),
+            'Proc threads': pd.to_numeric(csv['Proc threads'])
+        })
+        a['Others CPU %'] = (a['CPU %'] - a['Proc CPU %']).clip(lower=0)
+        a['Others RAM'] = (a['RAM Used'] - a['Proc RSS']).clip(lower=0)
+        return a
+
+    def throughput(self, bin_size=60):
+        # Progress rate (percent per minute) of every step in bins of bin_size seconds, from the progress
+        # events recorded next to the samples, joined with the mean CPU and GPU usage of the samples
+        # of the step in the same bin. None when no progress was recorded.
+        if self.chunksize:
+            if bin_size != self.bin_size:
+                self.stream(bin_size)
+            curves, usage = self.curves, self.usage
+        else:
+            records = read_progress(self.source)
+            curves = step_throughput(records, bin_size) if len(records) else None
+            usage = {}
+            if curves is not None:
+                bin_usage(self.csv, curves, bin_size, usage)
+        if curves is None:
+            return None
+
+        rows = []
+        for step, (starts, rates) in curves.items():
+            cpu, cpu_count, gpu, gpu_count = usage[step]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cpu, gpu = cpu / cpu_count, gpu / gpu_count    # NaN in the bins without samples
+            for start, rate, cpu_mean, gpu_mean in zip(starts, rates, cpu, gpu):
+                rows.append({
+                    'Modulo': step,
+                    'Time': start,
+                    'Percent/min': rate,
+                    'CPU usage %': cpu_mean,
+                    'GPU Core %': gpu_mean
+                })
+        return pd.DataFrame(rows)
+
     def export(self):
         #  Convert and export system monitoring data to JSON and Excel formats.
 
@@ -183,47 +856,56 @@ class Report:
             "GPU":convert(self.GPU),
             "GPUS": [convert(x) for x in self.GPUS]
         }
+        if self.IO:
+            j["IO"] = convert(self.IO)
 
         # Write the dictionary data to the JSON file
         with open(self.data_path+'/data.json', "w") as json_file:
             json.dump(j, json_file, indent=4)
 
         self.scores.to_excel(self.data_path+'/scores.xlsx')
+        if self.attribution is not None:
+            self.attribution.to_excel(self.data_path+'/attribution.xlsx')
+        throughput = self.throughput()
+        if throughput is not None:
+            throughput.to_excel(self.data_path+'/throughput.xlsx', index=False)
         
     
 # plots
 
     def add_colored_background(self, ax, df, fontsize=12):
-        # fix the comments
+        # Alternate the background color of the steps (runs of the same 'Control' value)
+        # and write the step name below the runs; the x of the rows is their index.
+        # All the spans are a single collection and labels that would overlap the previous one are skipped,
+        # so the cost depends on the width of the figure, not on the number of runs.
 
         rotation = 90
 
 
         colors = {1: 'white', 2: "#EFEFEF"}  # Mappa i colori alternati
-        current_color = df['Control'][0]  # Start with the initial color based on the first entry
-        start_change = df.index[0]  # Index where the first segment starts
-        modulo_value = df['Modulo'][0]  # Get initial "Modulo" value for the first segment
-        
+        index = df.index.values
+        control = df['Control'].values
+        modulo = df['Modulo'].values
+        starts, ends = segments(control)
+
         # Define how much lower to place the annotations
         vertical_offset = -0.02 * (ax.get_ylim()[1] - ax.get_ylim()[0])  # Negative to move downward, adjust the factor as needed
 
-        for idx in range(1, len(df)):
-            if df['Control'][idx] != current_color:
-                end_change = df.index[idx]
-                # Place the annotation for the previous segment
-                midpoint = (start_change + end_change) / 2
-                ax.text(midpoint, ax.get_ylim()[0]+vertical_offset, str(modulo_value), verticalalignment='top', horizontalalignment='left', rotation=rotation, fontsize=fontsize)
-                ax.axvspan(start_change, end_change, facecolor=colors[current_color % 2 + 1], alpha=1)
-                # Update for new segment
-                start_change = df.index[idx]
-                current_color = df['Control'][idx]
-                modulo_value = df['Modulo'][idx]  # Update modulo_value for the new segment
-        
-        # Handle the last segment, which won't necessarily trigger in the loop
-        end_change = df.index[-1]
-        midpoint = (start_change + end_change) / 2
-        ax.text(midpoint, ax.get_ylim()[0]+ vertical_offset, str(modulo_value), verticalalignment='top', horizontalalignment='left', rotation=rotation, fontsize=fontsize)
-        ax.axvspan(start_change, end_change, facecolor=colors[current_color % 2 + 1], alpha=1)
+        # spans over the whole height of the axes: x in data, y in axes coordinates
+        spans = [[(index[start], 0), (index[start], 1), (index[end], 1), (index[end], 0)] for start, end in zip(starts, ends)]
+        background = PolyCollection(spans, facecolors=[colors[value % 2 + 1] for value in control[starts]],
+                                    edgecolors='none', transform=ax.get_xaxis_transform(), zorder=0)
+        ax.add_collection(background, autolim=False)
+
+        # minimum distance in rows between two labels: the height of a line of text in pixels
+        rows_per_pixel = (index[-1] - index[0] + 1) / max(ax.bbox.width, 1) if len(index) else 0
+        spacing = fontsize * ax.figure.dpi / 72 * rows_per_pixel
+        last = -np.inf
+        for start, end in zip(starts, ends):
+            midpoint = (index[start] + index[end]) / 2
+            if midpoint - last >= spacing:
+                ax.text(midpoint, ax.get_ylim()[0]+vertical_offset, str(modulo[start]), verticalalignment='top', horizontalalignment='left', rotation=rotation, fontsize=fontsize)
+                last = midpoint
 
     def PLOT(self, figsize, save=True, modulo=False, n=float('inf'), fileName='plot_all', fontsize=12):
         """
@@ -235,28 +917,19 @@ class Report:
                 you want to include in the plot
         - `n`: The number of elements after which the plot should wrap to the next line.
         """
+        assert self.csv is not None, "the plots need the samples, not kept with chunksize"
 
         csv = self.norm
 
-        if n == float('inf'):
-            n = len(csv)
-
         if modulo:
             assert isinstance(modulo, list), "modulo must be a list"
             csv = csv[csv['Modulo'].isin(modulo)].reset_index(drop=True)
-        
-       # num_segments = (len(csv) + n - 1) // n  # Calculate number of segments needed
-
-       # Calculate the number of segments needed
-        remainder = len(csv) % n
-        if remainder != 0:
-            padding_length = n - remainder
-            padding = pd.DataFrame(np.nan, index=range(padding_length), columns=csv.columns)
-            padding['Modulo']='padding'
-            padding['Control']=csv['Control'].iloc[len(csv)-1]+1
-            csv = pd.concat([csv, padding]).reset_index(drop=True)
-        
-        num_segments = len(csv) // n
+
+        if n == float('inf'):
+            n = len(csv)
+
+        # Calculate the number of segments needed; the last one keeps the width of n rows, without padding rows
+        num_segments = max(1, (len(csv) + n - 1) // n)
 
         figsize[1]=figsize[1]*num_segments
 
@@ -264,20 +937,20 @@ class Report:
         fig, axes = plt.subplots(num_segments, 1, figsize=figsize, sharex=True)
         if num_segments == 1:
             axes = [axes]  # Ensure axes is always a list
+        width = buckets(fig)
 
         for i in range(num_segments):
             start = i * n
             end = start + n
-            segment = csv.iloc[start:end]
+            segment = csv.iloc[start:end].reset_index(drop=True)  # Reset index for each segment
 
             ax = axes[i]
-            segment.reset_index(drop=True, inplace=True)  # Reset index for each segment
 
-            segment['CPU'].plot(ax=ax, label='CPU', color='blue')
-            segment['RAM'].plot(ax=ax, label='RAM', linestyle='--', color='blue')
-            segment['Cores'].plot(ax=ax, label='Cores', linestyle='dotted', color='blue')
-            segment['GPU'].plot(ax=ax, label='GPU', color='red')
-            segment['gRAM'].plot(ax=ax, label='gRAM', linestyle='--', color='red')
+            plot_decimated(ax, segment['CPU'], width, label='CPU', color='blue')
+            plot_decimated(ax, segment['RAM'], width, label='RAM', linestyle='--', color='blue')
+            plot_decimated(ax, segment['Cores'], width, label='Cores', linestyle='dotted', color='blue')
+            plot_decimated(ax, segment['GPU'], width, label='GPU', color='red')
+            plot_decimated(ax, segment['gRAM'], width, label='gRAM', linestyle='--', color='red')
 
             self.add_colored_background(ax, segment, fontsize=fontsize)
 
@@ -287,7 +960,7 @@ class Report:
                           edgecolor='black', facecolor='white',
                           fontsize=fontsize)
 
-            ax.set_xlim(segment.index[0], segment.index[-1])
+            ax.set_xlim(0, n - 1)
             if i < num_segments - 1:
                 ax.set_xticklabels([])  # Hide x labels for all but the last subplot
 
@@ -305,6 +978,7 @@ class Report:
         - 'modulo': a list of strings indicating the steps of the process that
                     you want to include in the plot
         """
+        assert self.csv is not None, "the plots need the samples, not kept with chunksize"
         csv = self.csv
 
         if (modulo):
@@ -313,13 +987,14 @@ class Report:
       
 
         fig, ax = plt.subplots(figsize=figsize)
+        width = buckets(fig)
         
         #csv['GPU Core %'].plot(ax=ax, label='Cores Aggr', color='yellow')  
-        csv['GPU RAM'].plot(ax=ax, label='Sum', linestyle='solid', color='red')
+        plot_decimated(ax, csv['GPU RAM'], width, label='Sum', linestyle='solid', color='red')
         #csv['gproc-0'].plot(ax=ax, label='gpu 0', color='red' )
-        csv['gmem-0'].plot(ax=ax, label='gpu 0',  linestyle='--', color='green' )        
+        plot_decimated(ax, csv['gmem-0'], width, label='gpu 0',  linestyle='--', color='green' )
         #csv['gproc-1'].plot(ax=ax, label='gpu 1, color='blue' )
-        (csv['gmem-1']*-1).plot(ax=ax, label='(-1) * gpu 1',  linestyle='--', color='blue' )
+        plot_decimated(ax, csv['gmem-1']*-1, width, label='(-1) * gpu 1',  linestyle='--', color='blue' )
 
         self.add_colored_background(ax, csv, fontsize=fontsize)
 
@@ -335,3 +1010,66 @@ class Report:
         if (save):
             self.plt.savefig(self.data_path + '/'+ fileName + '.png', format='png')  # Adjust the filename, format, and DPI as needed
 
+
+    def IO_PLOT(self, figsize, save=True, modulo=False, fileName='plot_io', fontsize=12):
+        """
+        Plot and optionally save disk and network rates below CPU and GPU usage.
+        Accepts:
+        - `figsize`: A tuple specifying the dimensions of the plot.
+        - `save`: A boolean indicating whether to save the plot to disk (default is True).
+        - 'modulo': a list of strings indicating the steps of the process that
+                    you want to include in the plot
+        """
+        assert self.csv is not None, "the plots need the samples, not kept with chunksize"
+        assert self.IO, "no I/O data, the CSV log has no I/O columns"
+        csv = self.csv
+
+        if (modulo):
+            assert isinstance(modulo, list), "modulo must be a list"
+            csv = csv[csv['Modulo'].isin(modulo)].reset_index(drop=True)
+
+        fig, axes = plt.subplots(4, 1, figsize=figsize, sharex=True)
+        width = buckets(fig)
+
+        plot_decimated(axes[0], csv['CPU usage %'], width, label='CPU', color='blue')
+        plot_decimated(axes[0], csv['GPU Core %'], width, label='GPU', color='red')
+        for disk in self.DISKS:
+            line = plot_decimated(axes[1], csv['dread-'+disk], width, label=disk+' read')
+            plot_decimated(axes[1], csv['dwrite-'+disk], width, label=disk+' write', linestyle='--', color=line.get_color())
+            plot_decimated(axes[2], csv['diops-'+disk], width, label=disk, color=line.get_color())
+        for nic in self.NICS:
+            line = plot_decimated(axes[3], csv['nrecv-'+nic], width, label=nic+' recv')
+            plot_decimated(axes[3], csv['nsent-'+nic], width, label=nic+' sent', linestyle='--', color=line.get_color())
+
+        titles = ['Usage %', 'Disk MB/s', 'Disk IOPS', 'Network MB/s']
+        for ax, title in zip(axes, titles):
+            self.add_colored_background(ax, csv, fontsize=fontsize)
+            ax.legend(loc='upper left', bbox_to_anchor=(-0.03, 0.9), shadow=True,
+                      fancybox=False, title=title,
+                      edgecolor='black', facecolor='white',
+                      fontsize=fontsize)
+            ax.set_xlim(csv.index[0], csv.index[-1])
+            ax.set_xticklabels([])
+
+        self.plt = plt
+        self.plt.tight_layout()
+        if (save):
+            self.plt.savefig(self.data_path + '/'+ fileName + '.png', format='png')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report of the monitor log of a workflow run: scores, attribution and throughput files, or a live dashboard of a running one.')
+    parser.add_argument('folder', help='Folder of the monitor log (system.csv, monitor.csv, system.bin or monitor.bin)')
+    parser.add_argument('--follow', action='store_true', help='Follow the log while it is written and keep dashboard.html up to date')
+    parser.add_argument('--interval', type=float, default=10, help='Seconds between the updates of --follow (default 10)')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Rows read at a time (default 100000)')
+    args = parser.parse_args()
+
+    report = Report(args.folder, chunksize=args.chunksize)
+    if not args.follow:
+        report.export()
+    else:
+        print(f"Following {report.source}, dashboard {os.path.join(args.folder, 'dashboard.html')} (Ctrl-C to stop)")
+        try:
+            report.follow(args.interval)
+        except KeyboardInterrupt:
+            pass
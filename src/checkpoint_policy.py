@@ -0,0 +1,50 @@
+# checkpoint_policy.py
+
+"""
+Politica di salvataggio del progetto: decide quando salvare il documento Metashape
+invece di salvarlo alla fine di ogni step.
+"""
+
+# steps worth a checkpoint before they start: a crash inside them costs hours
+EXPENSIVE_STEPS = ['matchPhotos', 'alignCameras', 'buildDepthMaps', 'buildPointCloud', 'buildModel',
+                   'buildTexture', 'buildTiledModel', 'buildDem', 'buildOrthomosaic']
+
+class CheckpointPolicy:
+    # every_step: save after every step (default)
+    # before_expensive: save pending changes only before an expensive step starts
+    # time: save after a step if at least interval minutes passed since the last save
+    # end_only: save once at the end of the run
+    modes = ['every_step', 'before_expensive', 'time', 'end_only']
+
+    def __init__(self, mode: str = 'every_step', interval: float = 30, expensive_steps: list = None) -> None:
+        if mode not in self.modes:
+            raise ValueError(f"Error: checkpoint mode {mode} is not valid {self.modes}.")
+        self.mode = mode
+        self.interval = interval    # minutes, time mode only
+        self.expensive_steps = EXPENSIVE_STEPS if expensive_steps is None else expensive_steps
+
+    """
+    Policy from the 'checkpoint' entry of the project config, e.g. {'mode': 'time', 'interval': 20}
+    """
+    @classmethod
+    def from_config(cls, config: dict = None) -> 'CheckpointPolicy':
+        config = config or {}
+        return cls(mode=config.get('mode', 'every_step'),
+                   interval=config.get('interval', 30),
+                   expensive_steps=config.get('expensive_steps'))
+
+    """
+    Save right after step completed; since_last_save in seconds
+    """
+    def save_after(self, step: str, since_last_save: float) -> bool:
+        if self.mode == 'every_step':
+            return True
+        if self.mode == 'time':
+            return since_last_save >= self.interval * 60
+        return False
+
+    """
+    Save the pending changes before step starts
+    """
+    def save_before(self, step: str) -> bool:
+        return self.mode == 'before_expensive' and step in self.expensive_steps
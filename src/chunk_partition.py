@@ -0,0 +1,77 @@
+# chunk_partition.py
+import math
+
+"""
+Suddivisione spaziale delle immagini in chunk sovrapposti a partire dalla posizione GPS delle camere.
+Ogni chunk contiene al più max_images immagini "proprie", più quelle che cadono nella fascia di sovrapposizione
+con i chunk vicini (necessaria per allineare e unire i chunk alla fine).
+"""
+
+EARTH_RADIUS = 6378137.0    # WGS84, meters
+
+"""
+Project {path: (longitude, latitude)} on a local plane in meters (equirectangular around the mean latitude)
+"""
+def to_local_metric(positions: dict) -> dict:
+    if not positions:
+        return {}
+    lat0 = math.radians(sum(lat for _, lat in positions.values()) / len(positions))
+    return {path: (math.radians(lon) * EARTH_RADIUS * math.cos(lat0), math.radians(lat) * EARTH_RADIUS)
+            for path, (lon, lat) in positions.items()}
+
+"""
+Recursive median split along the longest side until each group has at most max_images items (path, x, y)
+"""
+def split_balanced(items: list, max_images: int) -> list:
+    if len(items) <= max_images:
+        return [items]
+    width = max(x for _, x, _ in items) - min(x for _, x, _ in items)
+    height = max(y for _, _, y in items) - min(y for _, _, y in items)
+    axis = 1 if width >= height else 2
+    items = sorted(items, key=lambda item: (item[axis], item[0]))
+    half = len(items) // 2
+    return split_balanced(items[:half], max_images) + split_balanced(items[half:], max_images)
+
+"""
+Split the images in overlapping spatial chunks.
+positions: {path: (longitude, latitude)} or None for images without GPS
+overlap: margin added around every chunk, as a fraction of its largest side
+Returns a list of chunks, each a sorted list of paths.
+"""
+def partition_images(positions: dict, max_images: int, overlap: float = 0.1) -> list:
+    if max_images < 2:
+        raise ValueError("Error: max_images must be at least 2.")
+    located = {path: pos for path, pos in positions.items() if pos is not None}
+    if not located:
+        raise ValueError("Error: no image has a GPS position, the images cannot be partitioned.")
+    metric = to_local_metric(located)
+    cores = split_balanced([(path, x, y) for path, (x, y) in metric.items()], max_images)
+
+    chunks = []
+    for core in cores:
+        min_x, max_x = min(x for _, x, _ in core), max(x for _, x, _ in core)
+        min_y, max_y = min(y for _, _, y in core), max(y for _, _, y in core)
+        margin = overlap * max(max_x - min_x, max_y - min_y)
+        chunk = {path for path, (x, y) in metric.items()
+                 if min_x - margin <= x <= max_x + margin and min_y - margin <= y <= max_y + margin}
+        chunks.append(chunk)
+
+    # images without GPS follow the closest located image in capture (file name) order
+    ordered = sorted(positions)
+    for i, path in enumerate(ordered):
+        if positions[path] is not None:
+            continue
+        neighbours = sorted((abs(i - j), other) for j, other in enumerate(ordered) if positions[other] is not None)
+        nearest = neighbours[0][1]
+        for chunk, core in zip(chunks, cores):
+            if any(nearest == core_path for core_path, _, _ in core):
+                chunk.add(path)
+    return [sorted(chunk) for chunk in chunks]
+
+"""
+Binary gpu_mask (Settings.set_gpu_mask format) enabling a single GPU for the index-th worker
+"""
+def gpu_mask_for(index: int, num_gpus: int) -> str:
+    if num_gpus <= 0:
+        return None
+    return format(1 << (index % num_gpus), '0{}b'.format(num_gpus))
@@ -1,7 +1,7 @@
 # geographic_projection.py
 from src.project import Project
+from src.step_tracer import traced
 import Metashape
-import threading
 
 
 filter_modes = {
@@ -56,6 +56,7 @@ class GeographicProjection:
     """
     Build Digital Elevation Model
     """
+    @traced
     def buildDem(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'source_data': Metashape.PointCloudData,
@@ -78,17 +79,15 @@ class GeographicProjection:
                 print(f"Note: '{kwargs['interpolation']}' is not valid on Metashape.")
             default_params['interpolation'] = interpolation  # interpolation updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildDem',))
-            thread.start()
-        self.project.chunk.buildDem(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildDem")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildDem'):
+            self.project.chunk.buildDem(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildDem")
 
     """
     Export Digital Elevation Model
     """
+    @traced
     def exportDEM(self, progress_printer: str, path: str, **kwargs) -> None:
         if self.project.chunk.elevation:
             default_params = {
@@ -97,16 +96,14 @@ class GeographicProjection:
             }
             # update default params with the input
             default_params.update(kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportDEM',))
-                thread.start()
-            self.project.chunk.exportRaster(path=path+"/dem/dem.tif", progress= progress_printer, **default_params)
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportDEM'):
+                self.project.chunk.exportRaster(path=path+"/dem/dem.tif", progress= progress_printer, **default_params)
 
     """
     Build Orthomosaic
     """
+    @traced
     def buildOrthomosaic(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'surface_data': Metashape.ElevationData,
@@ -129,17 +126,15 @@ class GeographicProjection:
                 print(f"Note: '{kwargs['blending_mode']}' is not valid on Metashape.")
             default_params['blending_mode'] = blending_mode  # blending_mode updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildOrthomosaic',))
-            thread.start()
-        self.project.chunk.buildOrthomosaic(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildOrthomosaic")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildOrthomosaic'):
+            self.project.chunk.buildOrthomosaic(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildOrthomosaic")
 
     """
     Export Orthomosaic
     """
+    @traced
     def exportOrthomosaic(self, progress_printer: str, path: str, **kwargs) -> None:
         if self.project.chunk.orthomosaic:
             default_params = {
@@ -149,16 +144,14 @@ class GeographicProjection:
             }
             # update default params with the input
             default_params.update(kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportOrthomosaic',))
-                thread.start()
-            self.project.chunk.exportRaster(path=path+"/orthomosaic/orthomosaic.tif", progress= progress_printer, **default_params)
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportOrthomosaic'):
+                self.project.chunk.exportRaster(path=path+"/orthomosaic/orthomosaic.tif", progress= progress_printer, **default_params)
 
     """
     Export Orthophoto
     """
+    @traced
     def exportOrthophotos(self, progress_printer: str, path: str, **kwargs) -> None:
         if self.project.chunk.orthomosaic:
             default_params = {
@@ -175,9 +168,6 @@ class GeographicProjection:
             }
             # update default params with the input
             default_params.update(kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportOrthophotos',))
-                thread.start()
-            self.project.chunk.exportOrthophotos(path=path+"/orthophotos/orthophoto.tif", progress= progress_printer, **default_params)
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()           
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportOrthophotos'):
+                self.project.chunk.exportOrthophotos(path=path+"/orthophotos/orthophoto.tif", progress= progress_printer, **default_params)
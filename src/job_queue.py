@@ -0,0 +1,128 @@
+# job_queue.py
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from src.chunk_partition import gpu_mask_for
+
+"""
+Coda locale di job step_workflow.py: ogni job gira in un processo separato (Project è un singleton per processo)
+con la maschera GPU di uno slot libero; lo stato di ogni job è salvato in un file JSON.
+"""
+
+step_workflow_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'step_workflow.py')
+
+class GpuSlots:
+    # jobs_per_gpu: jobs sharing the same GPU at the same time
+    def __init__(self, num_gpus: int, jobs_per_gpu: int = 1) -> None:
+        self.num_gpus = num_gpus
+        self.capacity = max(1, num_gpus) * max(1, jobs_per_gpu)
+        self.free = queue.Queue()
+        for slot in range(self.capacity):
+            self.free.put(slot % num_gpus if num_gpus else 0)
+
+    """
+    Take a free GPU (blocking) and give it back at the end: yields (gpu index, gpu_mask for Settings.set_gpu_mask)
+    """
+    @contextmanager
+    def slot(self):
+        gpu = self.free.get()
+        try:
+            yield gpu, gpu_mask_for(gpu, self.num_gpus)
+        finally:
+            self.free.put(gpu)
+
+"""
+Copy of a workflow config with the settings of a job: its gpu_mask, log folder and project path
+"""
+def job_config(workflow: dict, gpu_mask: str, log_folder: str, project_path: str = None) -> dict:
+    config = dict(workflow)
+    settings = dict(config.get('settings') or {})
+    settings['log'] = log_folder.rstrip('/') + '/'
+    if gpu_mask is not None:
+        settings['gpu_mask'] = gpu_mask
+    config['settings'] = settings
+    if project_path is not None:
+        config['project'] = dict(config.get('project') or {}, path=project_path)
+    return {'workflow': config}
+
+"""
+Run step_workflow.py in a new process, output redirected to log_path. Returns the exit code.
+"""
+def run_step_workflow(images_folder: str, config: dict, output_folder: str, log_path: str,
+                      monitoring: bool = False, resume: bool = False) -> int:
+    os.makedirs(output_folder, exist_ok=True)
+    config_path = os.path.join(output_folder, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    command = [sys.executable, step_workflow_script, '-i', images_folder, '-c', config_path, '-o', output_folder]
+    if monitoring:
+        command.append('-m')
+    if resume:
+        command.append('-r')
+    with open(log_path, 'w') as log:
+        return subprocess.run(command, stdout=log, stderr=subprocess.STDOUT).returncode
+
+
+class JobQueue:
+    # jobs: list of dict with name, input (images folder), workflow (config dict), output, project (optional)
+    def __init__(self, jobs: list, gpu_slots: GpuSlots, status_path: str, monitoring: bool = False, resume: bool = False) -> None:
+        self.jobs = jobs
+        self.gpu_slots = gpu_slots
+        self.status_path = status_path
+        self.monitoring = monitoring
+        self.resume = resume
+        self.lock = threading.Lock()
+        self.status = self.load_status() if resume else {}
+        for job in jobs:
+            if self.status.get(job['name'], {}).get('status') != 'done':
+                self.status[job['name']] = {'status': 'pending'}
+        self.save_status()
+
+    def load_status(self) -> dict:
+        if not os.path.exists(self.status_path):
+            return {}
+        with open(self.status_path, 'r') as f:
+            return json.load(f)
+
+    def save_status(self) -> None:
+        tmp_path = self.status_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.status, f, indent=4)
+        os.replace(tmp_path, self.status_path)
+
+    def update(self, name: str, **values) -> None:
+        with self.lock:
+            self.status[name].update(values)
+            self.save_status()
+
+    def run_job(self, job: dict) -> None:
+        name = job['name']
+        with self.gpu_slots.slot() as (gpu, gpu_mask):
+            log_path = os.path.join(job['output'], 'workflow.log')
+            self.update(name, status='running', gpu=gpu, start=time.time(), log=log_path)
+            print(f"-- {name}: running on GPU {gpu}")
+            try:
+                config = job_config(job['workflow'], gpu_mask, job['output'], job.get('project', job['output']))
+                returncode = run_step_workflow(job['input'], config, job['output'], log_path, self.monitoring, self.resume)
+            except Exception as e:
+                self.update(name, status='failed', end=time.time(), error=str(e))
+                print(f"-- {name}: failed ({e})")
+                return
+        status = 'done' if returncode == 0 else 'failed'
+        self.update(name, status=status, end=time.time(), returncode=returncode)
+        print(f"-- {name}: {status}")
+
+    """
+    Run the pending jobs, at most gpu_slots.capacity at the same time. Returns the status of every job.
+    """
+    def run(self) -> dict:
+        pending = [job for job in self.jobs if self.status[job['name']]['status'] != 'done']
+        with ThreadPoolExecutor(max_workers=self.gpu_slots.capacity) as executor:
+            list(executor.map(self.run_job, pending))
+        return self.status
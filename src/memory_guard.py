@@ -0,0 +1,180 @@
+# memory_guard.py
+import math
+import time
+import psutil
+from src.run_planner import plan_steps, step_units, step_cost, default_cost
+
+"""
+Protezione dalla memoria insufficiente: prima di ogni step pesante confronta la RAM che lo step aggiunge a quella
+già in uso (modello di costo di run_planner calibrato sullo storico delle esecuzioni precedenti) con la RAM disponibile
+(ultimo campione di SystemMonitor, psutil senza monitoraggio). Gli step senza storico non sono modificati: i costi
+di default sono solo indicativi (use_defaults per usarli comunque). Se la RAM non basta passa a parametri più sicuri:
+downscale maggiore per buildDepthMaps, split_in_blocks con blocks_size calcolato per buildModel,
+texture_size minore per buildTexture. Uno step più lento che termina vale più di un'esecuzione interrotta per OOM.
+Ogni modifica è stampata, scritta nel trace (kind 'guard') e conservata in MemoryGuard.changes.
+"""
+
+GB = 1024 * 1024 * 1024
+DOWNSCALES = [1, 2, 4, 8, 16]   # ultra, high, medium, low, lowest quality of buildDepthMaps
+MIN_TEXTURE_SIZE = 1024
+MAX_BLOCKS = 256
+# guarded steps and the defaults of their processor methods for the adapted params
+GUARDED_STEPS = {
+    'buildDepthMaps': {'downscale': 2},
+    'buildModel': {'split_in_blocks': False, 'blocks_size': 250},
+    'buildTexture': {'texture_size': 8192}
+}
+
+class MemoryGuard:
+    # workflow: config {step group: params} of the run
+    # images, megapixels: number and mean resolution (MP) of the images
+    # histories: run_planner.read_history of previous runs, for the predicted footprint
+    # monitor: SystemMonitor of the run, None to read the memory with psutil
+    # tracer: StepTracer where the changes are recorded
+    # region: callable returning (width, height) in meters of the reconstruction region, or None
+    # headroom: fraction of the available RAM a step may use
+    # max_age: sec, older monitor samples are not used
+    # use_defaults: adapt also the steps without history, from the default costs of run_planner
+    def __init__(self, workflow: dict, images: int, megapixels: float, histories: list = None, monitor=None, tracer=None,
+                 region=None, headroom: float = 0.85, max_age: float = 60, enabled: bool = True, use_defaults: bool = False) -> None:
+        self.steps = plan_steps(workflow)
+        self.images = images
+        self.megapixels = megapixels
+        self.histories = histories or []
+        self.monitor = monitor
+        self.tracer = tracer
+        self.region = region
+        self.headroom = headroom
+        self.max_age = max_age
+        self.enabled = enabled
+        self.use_defaults = use_defaults
+        self.uncalibrated = set()   # steps left unchanged for lack of history, noted once
+        self.changes = []   # {'step', 'changes': {param: [old, new]}, 'predicted_ram', 'adapted_ram', 'budget', 'time'}
+
+    """
+    Guard from the 'memory_guard' entry of the project config, e.g. {'enabled': True, 'headroom': 0.8, 'use_defaults': False}
+    """
+    @classmethod
+    def from_config(cls, config: dict = None, **kwargs) -> 'MemoryGuard':
+        config = config or {}
+        return cls(headroom=config.get('headroom', 0.85), enabled=config.get('enabled', True),
+                   use_defaults=config.get('use_defaults', False), **kwargs)
+
+    # the memory of the step is predicted from previous runs
+    def calibrated(self, name: str) -> bool:
+        return any(name in history and history[name]['units'] > 0 for history in self.histories)
+
+    """
+    RAM (GB) a step may add to the RAM in use: headroom of the available RAM
+    """
+    def budget(self) -> float:
+        latest = self.monitor.latest if self.monitor is not None else None
+        if latest is not None and time.time() - latest['time'] <= self.max_age:
+            available = latest['ram_available']
+        else:
+            available = psutil.virtual_memory().available / GB
+        return available * self.headroom
+
+    def region_size(self):
+        return self.region() if self.region is not None else None
+
+    # blocks of buildModel for blocks_size, None if the region is unknown
+    def blocks(self, blocks_size: float):
+        region = self.region_size()
+        if region is None or not blocks_size:
+            return None
+        width, height = region
+        return max(1, math.ceil(width / blocks_size) * math.ceil(height / blocks_size))
+
+    """
+    Predicted RAM (GB) a step run with params adds to the RAM in use when it starts, the steps before it as adapted so far
+    """
+    def predict(self, name: str, params: dict) -> float:
+        steps = dict(self.steps)
+        steps[name] = dict(steps.get(name, {}), **params)
+        ram = step_cost(name, step_units(name, steps, self.images, self.megapixels), self.histories)['ram']
+        if name == 'buildModel' and params.get('split_in_blocks'):
+            blocks = self.blocks(params.get('blocks_size'))
+            if blocks is not None:
+                # the fixed part stays, the part that grows with the work is split among the blocks
+                fixed = min(default_cost(name)['ram'][0], ram)
+                ram = fixed + (ram - fixed) / blocks
+        return ram
+
+    """
+    Params of a step adapted to the memory available now; the configured params are returned unchanged
+    when the step is predicted to fit, when the guard is disabled, for the steps not guarded and for the steps
+    without history (unless use_defaults)
+    """
+    def adapt(self, name: str, params: dict) -> dict:
+        if not self.enabled or name not in GUARDED_STEPS:
+            return params
+        if not self.use_defaults and not self.calibrated(name):
+            if name not in self.uncalibrated:
+                self.uncalibrated.add(name)
+                print(f"Note: memory guard: no --history run with {name}, its params are not adapted "
+                      f"(memory_guard: {{use_defaults: true}} to adapt them from the default costs).")
+            return params
+        current = dict(GUARDED_STEPS[name])
+        current.update(self.steps.get(name, {}))
+        current.update(params)
+        budget = self.budget()
+        predicted = self.predict(name, current)
+        adapted = current
+        if predicted > budget:
+            adapted = getattr(self, '_adapt_' + name)(current, budget)
+        self.steps[name] = adapted      # the steps that follow are predicted from the adapted params
+        changes = {key: [current.get(key), value] for key, value in adapted.items() if current.get(key) != value}
+        if not changes:
+            if predicted > budget:
+                print(f"-- MEMORY GUARD: {name} predicted {predicted:.1f} GB > {budget:.1f} GB, no safer params left")
+            return params
+        self.record(name, changes, predicted, self.predict(name, adapted), budget)
+        return dict(params, **{key: value for key, (_, value) in changes.items()})
+
+    def record(self, name: str, changes: dict, predicted: float, adapted: float, budget: float) -> None:
+        entry = {'step': name, 'changes': changes, 'predicted_ram': predicted, 'adapted_ram': adapted, 'budget': budget, 'time': time.time()}
+        self.changes.append(entry)
+        print(f"-- MEMORY GUARD: {name} predicted {predicted:.1f} GB > {budget:.1f} GB, " +
+              ', '.join(f"{key} {old} -> {new}" for key, (old, new) in changes.items()) + f" (predicted {adapted:.1f} GB)")
+        if self.tracer is not None and self.tracer.enabled:
+            self.tracer.write(dict(entry, name=name, kind='guard', parent=None))
+
+    # higher downscale (lower depth maps quality) until the step fits
+    def _adapt_buildDepthMaps(self, params: dict, budget: float) -> dict:
+        adapted = params
+        for downscale in DOWNSCALES:
+            if downscale > params['downscale']:
+                adapted = dict(params, downscale=downscale)
+                if self.predict('buildDepthMaps', adapted) <= budget:
+                    break
+        return adapted
+
+    # smaller texture until the step fits
+    def _adapt_buildTexture(self, params: dict, budget: float) -> dict:
+        adapted = params
+        texture_size = params['texture_size']
+        while texture_size > MIN_TEXTURE_SIZE:
+            texture_size //= 2
+            adapted = dict(params, texture_size=texture_size)
+            if self.predict('buildTexture', adapted) <= budget:
+                break
+        return adapted
+
+    # model built in blocks, blocks_size from the region so that a block fits
+    def _adapt_buildModel(self, params: dict, budget: float) -> dict:
+        adapted = dict(params, split_in_blocks=True)
+        region = self.region_size()
+        if region is None:
+            return adapted  # configured blocks_size
+        ram = self.predict('buildModel', dict(params, split_in_blocks=False))
+        fixed = min(default_cost('buildModel')['ram'][0], ram)
+        blocks = MAX_BLOCKS if budget <= fixed else min(max(2, math.ceil((ram - fixed) / (budget - fixed))), MAX_BLOCKS)
+        width, height = region
+        blocks_size = max(10, int(math.sqrt(width * height / blocks) // 10 * 10))     # m, multiple of 10
+        if params.get('split_in_blocks') and params['blocks_size'] <= blocks_size:
+            blocks_size = params['blocks_size']
+        while self.blocks(blocks_size) < blocks and blocks_size > 10:
+            blocks_size -= 10
+        adapted['blocks_size'] = blocks_size
+        return adapted
@@ -1,7 +1,7 @@
 # mesh_processor.py
 from src.project import Project
+from src.step_tracer import traced
 import Metashape
-import threading
 
 """
 Determina la creazione della mesh del modello, la texture a partire dalle foto e il tiled model
@@ -78,6 +78,7 @@ class MeshProcessor:
     """
     Build 3D model 
     """
+    @traced
     def buildModel(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'surface_type': Metashape.Arbitrary,
@@ -119,29 +120,24 @@ class MeshProcessor:
                 print(f"Note: '{kwargs['face_count']}' is not valid on Metashape.")
             default_params['face_count'] = face_count  # face_count updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildModel',))
-            thread.start()
-        self.project.chunk.buildModel(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildModel")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildModel'):
+            self.project.chunk.buildModel(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildModel")
 
     """
     Colorize 3D model
     """
+    @traced
     def colorizeModel(self, progress_printer: str) -> None:
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('colorizeModel',))
-            thread.start()
-        self.project.chunk.colorizeModel(source_data=Metashape.ImagesData, progress=progress_printer)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="colorizeModel")
+        with self.project.monitor_phase('colorizeModel'):
+            self.project.chunk.colorizeModel(source_data=Metashape.ImagesData, progress=progress_printer)
+        self.project.checkpoint(version="colorizeModel")
 
     """
     Generate uv mapping for the model
     """
+    @traced
     def buildUV(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'mapping_mode': Metashape.GenericMapping,
@@ -157,17 +153,15 @@ class MeshProcessor:
                 print(f"Note: '{kwargs['mapping_mode']}' is not valid on Metashape.")
             default_params['mapping_mode'] = mapping_mode  # mapping_mode updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildUV',))
-            thread.start()
-        self.project.chunk.buildUV(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildUV")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildUV'):
+            self.project.chunk.buildUV(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildUV")
 
     """
     Generate texture layer
     """
+    @traced
     def buildTexture(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'blending_mode': Metashape.MosaicBlending,
@@ -184,19 +178,17 @@ class MeshProcessor:
                 print(f"Note: '{kwargs['blending_mode']}' is not valid on Metashape.")
             default_params['blending_mode'] = blending_mode  # blending_mode updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildTexture',))
-            thread.start()
-        self.project.chunk.buildTexture(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildTexture")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildTexture'):
+            self.project.chunk.buildTexture(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildTexture")
 
         
     # buildTiledModel: https://www.agisoft.com/forum/index.php?topic=13206.0
     """
     Build tiled model
     """
+    @traced
     def buildTiledModel(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'pixel_size': 0,
@@ -218,17 +210,15 @@ class MeshProcessor:
                 print(f"Note: '{kwargs['source_data']}' is not valid on Metashape.")
             default_params['source_data'] = source_data  # source_data updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildTiledModel',))
-            thread.start()
-        self.project.chunk.buildTiledModel(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildTiledModel")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildTiledModel'):
+            self.project.chunk.buildTiledModel(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildTiledModel")
 
     """
     Export Model
     """
+    @traced
     def exportModel(self, progress_printer: str, path: str, **kwargs) -> None:
         if self.project.chunk.model:
             default_params = {
@@ -245,16 +235,14 @@ class MeshProcessor:
             }
             # update default params with the input
             default_params.update(kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportModel',))
-                thread.start()
-            self.project.chunk.exportModel(path=path+'/model/model.obj', progress= progress_printer, **default_params)
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportModel'):
+                self.project.chunk.exportModel(path=path+'/model/model.obj', progress= progress_printer, **default_params)
 
     """
     Export TiledModel
     """
+    @traced
     def exportTiledModel(self, progress_printer: str, path: str, **kwargs) -> None:
         if self.project.chunk.tiled_model:
             default_params = {
@@ -268,16 +256,14 @@ class MeshProcessor:
             }
             # update default params with the input
             default_params.update(kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportTiledModel',))
-                thread.start()
-            self.project.chunk.exportTiledModel(path=path+'/tiled/tile.zip', progress= progress_printer, **default_params)
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportTiledModel'):
+                self.project.chunk.exportTiledModel(path=path+'/tiled/tile.zip', progress= progress_printer, **default_params)
 
     """
     Export model texture to file
     """
+    @traced
     def exportTexture(self, progress_printer: str, path: str, **kwargs):
         if self.project.chunk.model.textures:
             default_params = {
@@ -286,9 +272,6 @@ class MeshProcessor:
                 "save_alpha": False
             }
             default_params.update(kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportTexture',))
-                thread.start()
-            self.project.chunk.exportTexture(path=path+'/texture/texture.jpg', progress= progress_printer, **default_params)    # png/tiff
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportTexture'):
+                self.project.chunk.exportTexture(path=path+'/texture/texture.jpg', progress= progress_printer, **default_params)    # png/tiff
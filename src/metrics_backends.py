@@ -0,0 +1,314 @@
+# metrics_backends.py
+import itertools
+import math
+import os
+import time
+import psutil
+
+"""
+Sorgenti delle metriche di sistema per SystemMonitor, interrogate nel processo stesso (niente subprocess per campione):
+- NvmlBackend: CPU/RAM da psutil, GPU NVIDIA da NVML (pynvml, nvidia-ml-py)
+- PsutilBackend: solo CPU/RAM (psutil, /proc), nodi senza GPU o senza NVML
+- FakeBackend: valori deterministici per i test
+select_backend sceglie automaticamente la prima disponibile.
+
+Le GPU sono descritte da dict {'id', 'model', 'temp' (°C), 'utilization' (%), 'mem_used' (MB), 'mem_total' (MB)};
+i valori che la scheda non fornisce (NVMLError, es. NotSupported) sono NaN, il campionamento continua.
+Le risorse del processo corrente e dei suoi figli (Metashape, worker degli export) sono sommate in processes(),
+separate dai totali di sistema di cpu() e ram(); cpu() restituisce anche la quota di tempo CPU in attesa di I/O (iowait,
+NaN dove il sistema operativo non la fornisce).
+io() restituisce i rate di I/O dall'ultima chiamata: MB/s e operazioni/s di ogni disco (backend.disks) e MB/s
+di ogni interfaccia di rete (backend.nics), dove passa anche il traffico verso lo storage condiviso (network_path).
+"""
+
+# totals of the process tree: number of processes, CPU % (of the whole node), RSS/USS (GB), threads, open files,
+# voluntary/involuntary context switches, bytes read/written (cumulative), GPU memory (MB)
+PROCESS_KEYS = ['count', 'cpu', 'rss', 'uss', 'threads', 'files', 'ctx_voluntary', 'ctx_involuntary',
+                'read_bytes', 'write_bytes', 'gpu_mem']
+# cumulative counters, the last values of the terminated processes are kept in the totals
+PROCESS_COUNTERS = ['ctx_voluntary', 'ctx_involuntary', 'read_bytes', 'write_bytes']
+# sec between two readings of the USS of a process: it walks all the memory maps of the process, RSS does not
+USS_INTERVAL = 30
+
+# rates of every disk: MB/s read and written, read and write operations/s; of every network interface: MB/s received and sent
+DISK_KEYS = ['disk_read', 'disk_write', 'disk_read_iops', 'disk_write_iops']
+NIC_KEYS = ['net_recv', 'net_sent']
+# virtual block devices, not backed by a disk
+IGNORED_DISKS = ('loop', 'ram', 'zram', 'sr', 'fd')
+
+def to_gb(value: float) -> float:
+    return value / (1024 * 1024 * 1024)
+
+def to_mb(value: float) -> float:
+    return value / (1024 * 1024)
+
+"""
+Whole disks among the devices of psutil.disk_io_counters: the partitions (counted again in their disk)
+and the virtual devices are dropped
+"""
+def block_devices(names) -> list:
+    if os.path.isdir('/sys/block'):     # Linux: whole disks only
+        whole = set(os.listdir('/sys/block'))
+        names = [name for name in names if name in whole]
+    return sorted(name for name in names if not name.startswith(IGNORED_DISKS))
+
+def rate(current, previous, field: str, elapsed: float, scale=float) -> float:
+    if current is None or previous is None:
+        return 0.0
+    return scale(max(getattr(current, field) - getattr(previous, field), 0)) / elapsed   # counters reset: 0
+
+class PsutilBackend:
+    name = 'psutil'
+
+    def __init__(self) -> None:
+        psutil.cpu_percent(interval=None)   # the first call only sets the reference
+        psutil.cpu_percent(interval=None, percpu=True)
+        psutil.cpu_times_percent(interval=None)
+        self.root = psutil.Process()
+        self.cpu_count = psutil.cpu_count() or 1
+        self.tree = {}          # pid: (Process, last counters, (USS, time)), Process kept for cpu_percent
+        self.finished = dict.fromkeys(PROCESS_COUNTERS, 0)
+        self.io_time = time.monotonic()
+        self.disk_counters = psutil.disk_io_counters(perdisk=True) or {}
+        self.nic_counters = psutil.net_io_counters(pernic=True) or {}
+        self.disks = block_devices(self.disk_counters)
+        self.nics = sorted(name for name in self.nic_counters if name != 'lo')
+
+    # (cpu usage %, usage % of every core, iowait % of the CPU time), averages since the previous call
+    def cpu(self) -> tuple:
+        iowait = getattr(psutil.cpu_times_percent(interval=None), 'iowait', math.nan)  # Linux only
+        return psutil.cpu_percent(interval=None), psutil.cpu_percent(interval=None, percpu=True), iowait
+
+    # (usage %, total, available, active, used), in GB
+    def ram(self) -> tuple:
+        memory = psutil.virtual_memory()
+        active = getattr(memory, 'active', memory.used)     # not available on Windows
+        return memory.percent, to_gb(memory.total), to_gb(memory.available), to_gb(active), to_gb(memory.used)
+
+    def gpus(self) -> list:
+        return []
+
+    # uss: (USS in GB, time) read before, read again when older than USS_INTERVAL; returns the stats and the USS
+    def _process_stats(self, process: psutil.Process, uss: tuple = None) -> tuple:
+        now = time.monotonic()
+        with process.oneshot():
+            memory = process.memory_info()
+            if uss is None or now - uss[1] >= USS_INTERVAL:
+                try:
+                    uss = (to_gb(getattr(process.memory_full_info(), 'uss', memory.rss)), now)
+                except psutil.AccessDenied:     # memory maps of another user
+                    uss = (to_gb(memory.rss), now)
+            ctx = process.num_ctx_switches()
+            files = process.num_fds() if hasattr(process, 'num_fds') else process.num_handles()
+            try:
+                io = process.io_counters()
+                read_bytes, write_bytes = io.read_bytes, io.write_bytes
+            except (AttributeError, psutil.AccessDenied):     # not available on macOS
+                read_bytes = write_bytes = 0
+            stats = {
+                'cpu': process.cpu_percent(interval=None) / self.cpu_count,
+                'rss': to_gb(memory.rss),
+                'uss': uss[0],
+                'threads': process.num_threads(),
+                'files': files,
+                'ctx_voluntary': ctx.voluntary,
+                'ctx_involuntary': ctx.involuntary,
+                'read_bytes': read_bytes,
+                'write_bytes': write_bytes
+            }
+            return stats, uss
+
+    """
+    Totals of the current process and of its children (PROCESS_KEYS)
+    """
+    def processes(self) -> dict:
+        try:
+            processes = [self.root] + self.root.children(recursive=True)
+        except psutil.Error:
+            processes = [self.root]
+        totals = dict.fromkeys(PROCESS_KEYS, 0)
+        tree = {}
+        for process in processes:
+            process, _, uss = self.tree.get(process.pid, (process, None, None))
+            try:
+                stats, uss = self._process_stats(process, uss)
+            except psutil.AccessDenied:
+                # still running: its last counters stay in the totals, not among the finished processes
+                if process.pid in self.tree:
+                    tree[process.pid] = self.tree[process.pid]
+                    for key, value in tree[process.pid][1].items():
+                        totals[key] += value
+                continue
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue
+            tree[process.pid] = (process, {key: stats[key] for key in PROCESS_COUNTERS}, uss)
+            totals['count'] += 1
+            for key, value in stats.items():
+                totals[key] += value
+        for pid, (_, counters, _) in self.tree.items():
+            if pid not in tree and counters is not None:
+                for key in PROCESS_COUNTERS:
+                    self.finished[key] += counters[key]
+        self.tree = tree
+        for key in PROCESS_COUNTERS:
+            totals[key] += self.finished[key]
+        return totals
+
+    """
+    Rates since the previous call of every disk (DISK_KEYS) and network interface (NIC_KEYS), as lists
+    in the order of self.disks and self.nics
+    """
+    def io(self) -> dict:
+        now = time.monotonic()
+        disks = psutil.disk_io_counters(perdisk=True) or {}
+        nics = psutil.net_io_counters(pernic=True) or {}
+        elapsed = max(now - self.io_time, 1e-6)
+        rates = {key: [] for key in DISK_KEYS + NIC_KEYS}
+        for name in self.disks:
+            current, previous = disks.get(name), self.disk_counters.get(name)
+            rates['disk_read'].append(rate(current, previous, 'read_bytes', elapsed, to_mb))
+            rates['disk_write'].append(rate(current, previous, 'write_bytes', elapsed, to_mb))
+            rates['disk_read_iops'].append(rate(current, previous, 'read_count', elapsed))
+            rates['disk_write_iops'].append(rate(current, previous, 'write_count', elapsed))
+        for name in self.nics:
+            current, previous = nics.get(name), self.nic_counters.get(name)
+            rates['net_recv'].append(rate(current, previous, 'bytes_recv', elapsed, to_mb))
+            rates['net_sent'].append(rate(current, previous, 'bytes_sent', elapsed, to_mb))
+        self.io_time, self.disk_counters, self.nic_counters = now, disks, nics
+        return rates
+
+    def close(self) -> None:
+        pass
+
+class NvmlBackend(PsutilBackend):
+    name = 'nvml'
+
+    def __init__(self) -> None:
+        import pynvml      # raises ImportError without nvidia-ml-py
+        pynvml.nvmlInit()   # raises NVMLError without driver
+        self.nvml = pynvml
+        self.handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+        self.models = [self._text(pynvml.nvmlDeviceGetName(handle)) for handle in self.handles]
+        memories = [self._query(pynvml.nvmlDeviceGetMemoryInfo, handle) for handle in self.handles]
+        self.mem_totals = [memory.total // (1024 * 1024) if memory is not None else 0 for memory in memories]
+        super().__init__()
+
+    @staticmethod
+    def _text(value) -> str:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    # result of an NVML query, None when the board does not answer it (e.g. NVMLError_NotSupported)
+    def _query(self, query, *args):
+        try:
+            return query(*args)
+        except self.nvml.NVMLError:
+            return None
+
+    def gpus(self) -> list:
+        stats = []
+        for i, handle in enumerate(self.handles):
+            memory = self._query(self.nvml.nvmlDeviceGetMemoryInfo, handle)
+            utilization = self._query(self.nvml.nvmlDeviceGetUtilizationRates, handle)
+            temp = self._query(self.nvml.nvmlDeviceGetTemperature, handle, self.nvml.NVML_TEMPERATURE_GPU)
+            if memory is not None:
+                self.mem_totals[i] = memory.total // (1024 * 1024)
+            stats.append({
+                'id': i,
+                'model': self.models[i],
+                'temp': temp if temp is not None else math.nan,
+                'utilization': utilization.gpu if utilization is not None else math.nan,
+                'mem_used': memory.used // (1024 * 1024) if memory is not None else math.nan,
+                'mem_total': self.mem_totals[i]
+            })
+        return stats
+
+    def processes(self) -> dict:
+        totals = super().processes()
+        pids = set(self.tree)
+        for handle in self.handles:
+            try:
+                running = self.nvml.nvmlDeviceGetComputeRunningProcesses(handle)
+            except self.nvml.NVMLError:
+                continue
+            totals['gpu_mem'] += sum((process.usedGpuMemory or 0) // (1024 * 1024) for process in running if process.pid in pids)
+        return totals
+
+    def close(self) -> None:
+        self.nvml.nvmlShutdown()
+
+class FakeBackend:
+    name = 'fake'
+
+    # every call of cpu() advances the sample: values cycle over a fixed sequence
+    def __init__(self, num_gpus: int = 2, cores: int = 4, ram_total: float = 64.0, gpu_mem_total: int = 32768) -> None:
+        self.num_gpus = num_gpus
+        self.cores = cores
+        self.ram_total = ram_total
+        self.gpu_mem_total = gpu_mem_total
+        self.samples = itertools.count()
+        self.sample = 0
+        self.disks = ['fake0']
+        self.nics = ['eth0']
+
+    def cpu(self) -> tuple:
+        self.sample = next(self.samples)
+        usage = float(self.sample * 10 % 100)
+        return usage, [usage] * self.cores, float(self.sample * 5 % 50)
+
+    def ram(self) -> tuple:
+        used = self.ram_total * (self.sample % 10) / 10
+        return used / self.ram_total * 100, self.ram_total, self.ram_total - used, used, used
+
+    def gpus(self) -> list:
+        return [{
+            'id': i,
+            'model': 'FakeGPU',
+            'temp': 40 + i,
+            'utilization': self.sample * 10 % 100,
+            'mem_used': self.sample * 1024 % self.gpu_mem_total,
+            'mem_total': self.gpu_mem_total
+        } for i in range(self.num_gpus)]
+
+    def processes(self) -> dict:
+        return {
+            'count': 2,
+            'cpu': self.sample * 5 % 50,
+            'rss': self.ram_total * (self.sample % 10) / 20,
+            'uss': self.ram_total * (self.sample % 10) / 25,
+            'threads': 16,
+            'files': 32,
+            'ctx_voluntary': self.sample * 100,
+            'ctx_involuntary': self.sample * 10,
+            'read_bytes': self.sample * 2 ** 20,
+            'write_bytes': self.sample * 2 ** 19,
+            'gpu_mem': self.sample * 512 % self.gpu_mem_total * self.num_gpus
+        }
+
+    def io(self) -> dict:
+        return {
+            'disk_read': [float(self.sample * 16 % 256)],
+            'disk_write': [float(self.sample * 8 % 128)],
+            'disk_read_iops': [float(self.sample * 100 % 1000)],
+            'disk_write_iops': [float(self.sample * 50 % 500)],
+            'net_recv': [float(self.sample * 4 % 125)],
+            'net_sent': [float(self.sample * 2 % 125)]
+        }
+
+    def close(self) -> None:
+        pass
+
+backends = {'nvml': NvmlBackend, 'psutil': PsutilBackend, 'fake': FakeBackend}
+
+"""
+Backend by name, 'auto': NVML if a NVIDIA driver and nvidia-ml-py are available, psutil only otherwise
+"""
+def select_backend(name: str = 'auto'):
+    if name != 'auto':
+        if name not in backends:
+            raise ValueError(f"Error: '{name}' is not a metrics backend, choose one of {list(backends)}.")
+        return backends[name]()
+    try:
+        return NvmlBackend()
+    except Exception as e:   # ImportError, NVMLError (no driver/GPU)
+        print(f"-- DEBUG: NVML not available ({e}), GPU metrics disabled")
+        return PsutilBackend()
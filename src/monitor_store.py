@@ -0,0 +1,248 @@
+# monitor_store.py
+import argparse
+import json
+import os
+import struct
+import numpy as np
+
+"""
+Formato binario a colonne dei campioni di SystemMonitor (monitor.bin): un header JSON con lo schema
+(versione, numero di core e GPU, nomi di dischi e interfacce di rete) seguito dai record a dimensione fissa di un dtype numpy strutturato,
+aggiunti in coda a blocchi. Core e GPU sono colonne numeriche (array per riga); il CSV resta disponibile con export_csv.
+Gli eventi di progresso degli step sono una seconda tabella con lo stesso formato (monitor.progress.bin).
+
+    MAGIC | uint32 lunghezza header | header JSON | record ...
+"""
+
+MAGIC = b'HMMONBIN'
+VERSION = 1
+PHASE_SIZE = 64     # bytes of the step label, longer labels are truncated
+
+# totals of the monitored process tree (src/metrics_backends.py PROCESS_KEYS):
+# (column, dtype, csv header)
+PROCESS_COLUMNS = [
+    ('proc_count', '<i4', 'Processes'),
+    ('proc_cpu', '<f4', 'Proc CPU %'),
+    ('proc_rss', '<f8', 'Proc RSS'),
+    ('proc_uss', '<f8', 'Proc USS'),
+    ('proc_threads', '<i4', 'Proc threads'),
+    ('proc_files', '<i4', 'Proc open files'),
+    ('proc_ctx_voluntary', '<i8', 'Proc ctx voluntary'),
+    ('proc_ctx_involuntary', '<i8', 'Proc ctx involuntary'),
+    ('proc_read_bytes', '<i8', 'Proc read bytes'),
+    ('proc_write_bytes', '<i8', 'Proc write bytes'),
+    ('proc_gpu_mem', '<f4', 'Proc GPU mem')
+]
+
+# I/O rates (src/metrics_backends.py DISK_KEYS, NIC_KEYS), one value per device of the header:
+# (column, devices in the header, csv header)
+IO_COLUMNS = [
+    ('disk_read', 'disks', 'Disk read MB/s'),
+    ('disk_write', 'disks', 'Disk write MB/s'),
+    ('disk_read_iops', 'disks', 'Disk read IOPS'),
+    ('disk_write_iops', 'disks', 'Disk write IOPS'),
+    ('net_recv', 'nics', 'Net recv MB/s'),
+    ('net_sent', 'nics', 'Net sent MB/s')
+]
+
+"""
+Record dtype: time, phase, system-wide CPU %, CPU iowait % and cores %, RAM (% and GB), totals of the process tree,
+I/O rates of every disk and network interface, temperature, usage % and memory used (MB) of every GPU
+"""
+def monitor_dtype(cores: int, gpus: int, disks: int = 0, nics: int = 0) -> np.dtype:
+    columns = [
+        ('time', '<f8'),
+        ('phase', f'S{PHASE_SIZE}'),
+        ('cpu', '<f4'),
+        ('cpu_iowait', '<f4'),
+        ('cores', '<f4', (cores,)),
+        ('ram_usage', '<f4'),
+        ('ram_active', '<f8'),
+        ('ram_total', '<f8'),
+        ('ram_available', '<f8'),
+        ('ram_used', '<f8')
+    ]
+    columns += [(name, dtype) for name, dtype, _ in PROCESS_COLUMNS]
+    devices = {'disks': disks, 'nics': nics}
+    columns += [(name, '<f4', (devices[kind],)) for name, kind, _ in IO_COLUMNS]
+    columns += [
+        ('gpu_temp', '<f4', (gpus,)),
+        ('gpu_usage', '<f4', (gpus,)),
+        ('gpu_mem_used', '<f4', (gpus,))
+    ]
+    return np.dtype(columns)
+
+class MonitorStore:
+    # path: binary file, overwritten
+    # cores: number of CPU cores
+    # gpus: list of {'id', 'model', 'mem_total' (MB)}
+    # disks, nics: names of the disks and network interfaces of the I/O columns
+    def __init__(self, path: str, cores: int, gpus: list, disks: list = (), nics: list = ()) -> None:
+        self.path = path
+        self.dtype = monitor_dtype(cores, len(gpus), disks=len(disks), nics=len(nics))
+        header = json.dumps({'version': VERSION, 'cores': cores, 'gpus': gpus, 'disks': list(disks), 'nics': list(nics)}).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        remove_progress(path)
+
+    """
+    Append rows (tuples in the order of monitor_dtype) in a single write
+    """
+    def append(self, rows: list) -> None:
+        if rows:
+            records = np.array(rows, dtype=self.dtype)
+            with open(self.path, 'ab') as f:
+                records.tofile(f)
+
+    """
+    Append progress events (time, step, percent) to the progress table, created by the first events
+    """
+    def append_progress(self, events: list) -> None:
+        if events:
+            path = progress_path(self.path)
+            if not os.path.exists(path):
+                header = json.dumps({'version': VERSION, 'table': 'progress'}).encode('utf-8')
+                with open(path, 'wb') as f:
+                    f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            records = np.array(events, dtype=PROGRESS_DTYPE)
+            with open(path, 'ab') as f:
+                records.tofile(f)
+
+"""
+Header of a monitor.bin file, dtype of its records and offset of the first record
+"""
+def read_header(path: str):
+    with open(path, 'rb') as f:
+        data = f.read(len(MAGIC) + 4)
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Error: {path} is not a monitor file.")
+        offset = len(MAGIC) + 4
+        size = struct.unpack('<I', data[len(MAGIC):offset])[0]
+        header = json.loads(f.read(size).decode('utf-8'))
+    if header['version'] != VERSION:
+        raise ValueError(f"Error: unsupported monitor file version {header['version']}.")
+    if header.get('table') == 'progress':
+        dtype = PROGRESS_DTYPE
+    else:
+        dtype = monitor_dtype(header['cores'], len(header['gpus']), len(header['disks']), len(header['nics']))
+    return header, dtype, offset + size
+
+"""
+Header and records of a monitor.bin file; a record truncated by an interrupted run is dropped.
+memory_map: records mapped from the file instead of read, for the files larger than the memory
+"""
+def read_monitor(path: str, memory_map: bool = False):
+    header, dtype, offset = read_header(path)
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if memory_map and count:
+        # records read from the disk when sliced, for files larger than the memory
+        records = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+    else:
+        records = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+    return header, records
+
+def phases(records: np.ndarray) -> np.ndarray:
+    return np.char.decode(records['phase'], 'utf-8')
+
+# progress callbacks of the steps, written next to the samples: monitor.bin -> monitor.progress.bin
+PROGRESS_DTYPE = np.dtype([('time', '<f8'), ('step', f'S{PHASE_SIZE}'), ('percent', '<f4')])
+
+def progress_path(path: str) -> str:
+    root, extension = os.path.splitext(path)
+    return root + '.progress' + extension
+
+# progress of a previous run, the sample file is overwritten
+def remove_progress(path: str) -> None:
+    if os.path.exists(progress_path(path)):
+        os.remove(progress_path(path))
+
+"""
+Progress events (time, step, percent) of a monitor file, empty if none was recorded
+"""
+def read_progress(path: str) -> np.ndarray:
+    path = progress_path(path)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=PROGRESS_DTYPE)
+    if path.endswith('.csv'):
+        rows = []
+        with open(path, 'r') as f:
+            next(f, None)
+            for line in f:
+                fields = line.rstrip('\n').split(';')
+                if len(fields) == 3:
+                    rows.append((float(fields[0]), fields[1].encode('utf-8'), float(fields[2])))
+        return np.array(rows, dtype=PROGRESS_DTYPE)
+    header, records = read_monitor(path)
+    return records
+
+class CsvStore:
+    # path: csv file in the monitor.csv format of the previous versions (reports/report.py, run_planner.py), overwritten;
+    # the process and I/O columns are between 'RAM Used' and the GPUs, which stay the last column
+    # disks, nics: devices of the I/O columns (lists of values, in this order), None without I/O columns
+    def __init__(self, path: str, cores: int, gpus: list, process: bool = True, disks: list = None, nics: list = None) -> None:
+        self.path = path
+        self.process = process
+        self.io = disks is not None
+        gpu_header = [{'id': f"[{gpu['id']}]", 'model': gpu['model'].replace(' ', ''), 'mem_total': f"{gpu['mem_total']}MB"} for gpu in gpus]
+        header = ['Modulo', 'Time', 'CPU usage %', 'CPU iowait %', 'Cores usage %', 'RAM usage %', 'RAM active', 'RAM total',
+                  'RAM Available', 'RAM Used']
+        if process:
+            header += [name for _, _, name in PROCESS_COLUMNS]
+        if self.io:
+            header += [name for _, _, name in IO_COLUMNS]
+        header += [f'GPUs: {gpu_header}']
+        with open(path, 'w', newline='') as f:
+            f.write(';'.join(header) + '\n')
+        remove_progress(path)
+
+    def format_row(self, row) -> str:
+        time, phase, cpu, iowait, cores, ram_usage, ram_active, ram_total, ram_available, ram_used = tuple(row)[:10]
+        process = tuple(row)[10:10 + len(PROCESS_COLUMNS)] if self.process else ()
+        io = tuple(row)[10 + len(process):-3] if self.io else ()
+        temps, usages, mems = tuple(row)[-3:]
+        if isinstance(phase, bytes):
+            phase = phase.decode('utf-8')
+        # float32 columns printed with their shortest repr (7.9, not 7.900000095367432)
+        cpu, iowait, ram_usage = str(np.float32(cpu)), str(np.float32(iowait)), str(np.float32(ram_usage))
+        cores = '[' + ', '.join(str(np.float32(value)) for value in cores) + ']'
+        gpus = [{'temp': f"{temp:g}°C", 'cpu_usage': f"{usage:g}%", 'mem_used': f"{mem:g}"} for temp, usage, mem in zip(temps, usages, mems)]
+        process = ''.join(f' {value};' if isinstance(value, (int, np.integer)) else f' {value:.6g};' for value in process)
+        io = ''.join(' [' + ', '.join(f'{value:.6g}' for value in values) + '];' for values in io)
+        return f"{phase};{time}; {cpu}; {iowait}; {cores}; {ram_usage}; {ram_active} GB; {ram_total} GB; {ram_available} GB; {ram_used} GB;{process}{io} {gpus}\n"
+
+    # rows: tuples or records in the order of monitor_dtype
+    def append(self, rows) -> None:
+        if len(rows):
+            with open(self.path, 'a') as f:
+                f.writelines(self.format_row(row) for row in rows)
+
+    # events: (time, step, percent), in monitor.progress.csv
+    def append_progress(self, events: list) -> None:
+        if events:
+            path = progress_path(self.path)
+            lines = [] if os.path.exists(path) else ['Time;Step;Percent\n']
+            lines += [f"{time};{step.decode('utf-8') if isinstance(step, bytes) else step};{percent:.6g}\n" for time, step, percent in events]
+            with open(path, 'a') as f:
+                f.writelines(lines)
+
+"""
+Store of the samples by file extension: .csv text, binary otherwise
+"""
+def open_store(path: str, cores: int, gpus: list, disks: list = (), nics: list = ()):
+    if path.endswith('.csv'):
+        return CsvStore(path, cores, gpus, disks=list(disks), nics=list(nics))
+    return MonitorStore(path, cores, gpus, disks, nics)
+
+"""
+Convert a monitor.bin file to the monitor.csv format
+"""
+def export_csv(path: str, csv_path: str) -> None:
+    header, records = read_monitor(path)
+    CsvStore(csv_path, header['cores'], header['gpus'], disks=header['disks'], nics=header['nics']).append(records)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Esporta un file monitor.bin di SystemMonitor nel formato CSV.')
+    parser.add_argument('input', help='Path monitor.bin')
+    parser.add_argument('output', help='Path CSV file')
+    args = parser.parse_args()
+    export_csv(args.input, args.output)
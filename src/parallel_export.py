@@ -0,0 +1,97 @@
+# parallel_export.py
+import importlib
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.progress_sinks import ProgressAggregator
+
+"""
+Esportazione in parallelo dei risultati: ogni export gira in un processo separato
+che apre il progetto in sola lettura; l'avanzamento di tutti gli export passa dall'aggregatore del run (src/progress_sinks.py).
+"""
+
+# processor of every export, imported by the worker processes only (Metashape)
+export_processors = {
+    'exportDEM': 'src.geographic_projection.GeographicProjection',
+    'exportOrthomosaic': 'src.geographic_projection.GeographicProjection',
+    'exportModel': 'src.mesh_processor.MeshProcessor',
+    'exportPointCloud': 'src.point_cloud_processor.PointCloudProcessor',
+    'exportTiledModel': 'src.mesh_processor.MeshProcessor',
+    'exportTexture': 'src.mesh_processor.MeshProcessor',
+    'exportOrthophotos': 'src.geographic_projection.GeographicProjection'
+}
+
+"""
+Progress callback sending (name, percent) to the parent process, only when percent advanced by min_delta
+"""
+class QueueProgress:
+    def __init__(self, name: str, progress_queue, min_delta: float = 0.5) -> None:
+        self.name = name
+        self.progress_queue = progress_queue
+        self.min_delta = min_delta
+        self.last = None
+
+    def __call__(self, percent: float) -> None:
+        if self.last is None or percent - self.last >= self.min_delta or percent >= 100:
+            self.last = percent
+            self.progress_queue.put((self.name, percent))
+
+"""
+Worker process: open the project read-only and run a single export
+"""
+def run_export(project_path: str, name: str, output_folder: str, params: dict, progress_queue) -> str:
+    from src.project import Project
+    prj = Project(project_path=project_path)
+    prj.load_project(read_only=True)
+    module, processor_class = export_processors[name].rsplit('.', 1)
+    processor = getattr(importlib.import_module(module), processor_class)()
+    getattr(processor, name)(progress_printer=QueueProgress(name, progress_queue), path=output_folder, **params)
+    progress_queue.put((name, 100.0))
+    return name
+
+"""
+Forward the progress of the running exports to the progress aggregator of the run (one line for all of them on a terminal),
+until stop is set and the queue is empty
+"""
+def forward_progress(progress_queue, stop: threading.Event) -> None:
+    aggregator = ProgressAggregator()
+    while True:
+        try:
+            name, percent = progress_queue.get(timeout=0.5)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        aggregator.update(name, percent)
+
+"""
+Run the exports {name: params} in at most workers processes at the same time.
+The project must be saved before: the workers read it from disk.
+"""
+def run_parallel_exports(project_path: str, exports: dict, output_folder: str, workers: int) -> None:
+    unknown = [name for name in exports if name not in export_processors]
+    if unknown:
+        raise ValueError(f"Error: {unknown} are not valid exports.")
+    context = multiprocessing.get_context('spawn')     # fresh Metashape module and Project singleton in every worker
+    errors = {}
+    with context.Manager() as manager:
+        progress_queue = manager.Queue()
+        stop = threading.Event()
+        printer = threading.Thread(target=forward_progress, args=(progress_queue, stop), daemon=True)
+        printer.start()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(run_export, project_path, name, output_folder, params, progress_queue): name
+                       for name, params in exports.items()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[futures[future]] = e
+        stop.set()
+        printer.join()
+    for name in exports:
+        ProgressAggregator().finish(name)
+    if errors:
+        raise RuntimeError("Error: exports failed: " + ", ".join(f"{name} ({error})" for name, error in errors.items()))
+    print(f"-- DEBUG: {len(exports)} exports completed")
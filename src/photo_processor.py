@@ -1,6 +1,6 @@
 # photo_processor.py
-import threading
 from src.project import Project
+from src.step_tracer import traced
 
 """
 Esegue l'inserimento delle foto, il filtro qualità, il match delle foto e l'allineamento di queste, 
@@ -16,45 +16,40 @@ class PhotoProcessor:
     """
     Add a list of photos to the chunk.
     """
+    @traced
     def addPhotos(self, progress_printer: str) -> None:
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('addPhotos',))
-            thread.start()
-        self.project.chunk.addPhotos(filenames=self.photos_path,
-                                     progress=progress_printer)
-        # NOTE: load_reference(bool) in addPhotos [https://www.agisoft.com/forum/index.php?topic=13603.0]
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="addPhotos")
+        with self.project.monitor_phase('addPhotos'):
+            self.project.chunk.addPhotos(filenames=self.photos_path,
+                                         progress=progress_printer)
+            # NOTE: load_reference(bool) in addPhotos [https://www.agisoft.com/forum/index.php?topic=13603.0]
+        self.project.checkpoint(version="addPhotos")
         print("-- DEBUG: "+ str(len(self.project.chunk.cameras)) + " images loaded")
     
     """
     Estimate the image quality. Cameras with a quality less than 0.5 are considered blurred and it’s recommended to disable them.
     """
+    @traced
     def filterImageQuality(self, progress_printer: str) -> None:
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('filterImageQuality',))
-            thread.start()
-        self.project.chunk.analyzeImages(cameras=self.project.chunk.cameras,
-                                         filter_mask= False,
-                                         progress=progress_printer)
-        # FIXME: filter_mask(bool), delete it if not necessary
-        print()
-        num_disable_photos = 0
-        for camera in self.project.chunk.cameras:
-            if float(camera.meta['Image/Quality']) < 0.5:
-                camera.enabled = False
-                num_disable_photos += 1
+        with self.project.monitor_phase('filterImageQuality'):
+            self.project.chunk.analyzeImages(cameras=self.project.chunk.cameras,
+                                             filter_mask= False,
+                                             progress=progress_printer)
+            # FIXME: filter_mask(bool), delete it if not necessary
+            print()
+            num_disable_photos = 0
+            for camera in self.project.chunk.cameras:
+                if float(camera.meta['Image/Quality']) < 0.5:
+                    camera.enabled = False
+                    num_disable_photos += 1
 
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
         print("-- DEBUG: "+ str(num_disable_photos) + " images filtered")
-        self.project.save_project(version="filterImageQuality")
+        self.project.checkpoint(version="filterImageQuality")
 
 
     """
     Perform image matching
     """
+    @traced
     def matchPhotos(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'downscale': 1,
@@ -71,17 +66,15 @@ class PhotoProcessor:
         # NOTE: pairs (list[tuple[int, int]]) – User defined list of camera pairs to match.
         # update default params with the input
         default_params.update(kwargs)
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('matchPhotos',))
-            thread.start()
-        self.project.chunk.matchPhotos(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="matchPhotos")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('matchPhotos'):
+            self.project.chunk.matchPhotos(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="matchPhotos")
     
     """
     Perform photo alignment
     """
+    @traced
     def alignCameras(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'adaptive_fitting': False,
@@ -90,17 +83,15 @@ class PhotoProcessor:
         }
         # update default params with the input
         default_params.update(kwargs)
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('alignCameras',))
-            thread.start()
-        self.project.chunk.alignCameras(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="alignCameras")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('alignCameras'):
+            self.project.chunk.alignCameras(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="alignCameras")
 
     """
     Perform optimization of tie points / camera parameters
     """
+    @traced
     def optimizeCameras(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'fit_f': True, 
@@ -120,12 +111,9 @@ class PhotoProcessor:
         }
         # update default params with the input
         default_params.update(kwargs)
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('optimizeCameras',))
-            thread.start()
-        self.project.chunk.optimizeCameras(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="optimizeCameras")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('optimizeCameras'):
+            self.project.chunk.optimizeCameras(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="optimizeCameras")
 
     
\ No newline at end of file
@@ -1,7 +1,7 @@
 # point_cloud_processor.py
 from src.project import Project
+from src.step_tracer import traced
 import Metashape
-import threading
 
 
 filter_modes = {
@@ -56,6 +56,7 @@ class PointCloudProcessor:
     """
     Build depth maps
     """
+    @traced
     def buildDepthMaps(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'downscale': 2,
@@ -74,18 +75,16 @@ class PointCloudProcessor:
                 print(f"Note: '{kwargs['filter_mode']}' is not valid on Metashape.")
             default_params['filter_mode'] = filter_mode  # filter_mode updated correctly
             
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildDepthMaps',))
-            thread.start()
-        self.project.chunk.buildDepthMaps(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildDepthMaps")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildDepthMaps'):
+            self.project.chunk.buildDepthMaps(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildDepthMaps")
 
 
     """
     Build dense point cloud
     """
+    @traced
     def buildPointCloud(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'source_data': Metashape.DepthMapsData,
@@ -105,18 +104,16 @@ class PointCloudProcessor:
                 print(f"Note: '{kwargs['source_data']}' is not valid on Metashape.")
             default_params['source_data'] = source_data  # source_data updated correctly
         
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('buildPointCloud',))
-            thread.start()
-        self.project.chunk.buildPointCloud(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="buildPointCloud")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('buildPointCloud'):
+            self.project.chunk.buildPointCloud(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="buildPointCloud")
 
 
     """
     Calculate point colors for the point cloud
     """
+    @traced
     def colorizePointCloud(self, progress_printer: str, **kwargs) -> None:
         default_params = {
             'source_data': Metashape.ImagesData,
@@ -133,18 +130,16 @@ class PointCloudProcessor:
                 print(f"Note: '{kwargs['source_data']}' is not valid on Metashape.")
             default_params['source_data'] = source_data  # source_data updated correctly
 
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('colorizePointCloud',))
-            thread.start()
-        self.project.chunk.colorizePointCloud(progress=progress_printer, **default_params)
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
-        self.project.save_project(version="colorizePointCloud")
+        self.project.tracer.annotate(default_params)
+        with self.project.monitor_phase('colorizePointCloud'):
+            self.project.chunk.colorizePointCloud(progress=progress_printer, **default_params)
+        self.project.checkpoint(version="colorizePointCloud")
 
         
     """
     export dense point cloud
     """
+    @traced
     def exportPointCloud(self, progress_printer: str, path: str, **kwargs) -> None:
         if self.project.chunk.point_cloud:
             default_params = {
@@ -171,23 +166,19 @@ class PointCloudProcessor:
             # update default params with the input
             #default_params.update(kwargs)
             default_params = update_existing_keys(default_params, kwargs)
-            if self.project.monitoring is not None:
-                thread = threading.Thread(target=self.project.monitoring.start, args=('exportPointCloud',))
-                thread.start()
-            self.project.chunk.exportPointCloud(path=path+'/point_cloud/point_cloud.las', progress=progress_printer,  **default_params)
-            if self.project.monitoring is not None:
-                self.project.monitoring.stop()
+            self.project.tracer.annotate(default_params)
+            with self.project.monitor_phase('exportPointCloud'):
+                self.project.chunk.exportPointCloud(path=path+'/point_cloud/point_cloud.las', progress=progress_printer,  **default_params)
 
      
+    @traced
     def filterPointCloud(self, maxconf: int = 3) -> None:
-        if self.project.monitoring is not None:
-            thread = threading.Thread(target=self.project.monitoring.start, args=('filterPointCloud',))
-            thread.start()
-        for chunk in self.project.doc.chunks:
-            chunk.point_cloud.setConfidenceFilter(0, maxconf) # configuring point cloud filter so that only point with low-confidence currently active
-            all_points_classes = list(range(128))
-            chunk.point_cloud.removePoints(all_points_classes)  # removes all active points of the point cloud, i.e. removing all low-confidence points
-            chunk.point_cloud.resetFilters()  # resetting filter, so that all other points (i.e. high-confidence points) are now active
-        if self.project.monitoring is not None:
-            self.project.monitoring.stop()
+        self.project.tracer.annotate({'maxconf': maxconf})
+        with self.project.monitor_phase('filterPointCloud'):
+            for chunk in self.project.doc.chunks:
+                chunk.point_cloud.setConfidenceFilter(0, maxconf) # configuring point cloud filter so that only point with low-confidence currently active
+                all_points_classes = list(range(128))
+                chunk.point_cloud.removePoints(all_points_classes)  # removes all active points of the point cloud, i.e. removing all low-confidence points
+                chunk.point_cloud.resetFilters()  # resetting filter, so that all other points (i.e. high-confidence points) are now active
+        self.project.checkpoint(version="filterPointCloud")
 
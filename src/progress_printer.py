@@ -1,45 +1,23 @@
-import sys, time
+from src.progress_sinks import ProgressAggregator
 
 """
-Classe per tenere traccia dello status progressivo di ogni step
+Classe per tenere traccia dello status progressivo di ogni step: callback di progresso di Metashape,
+inoltrato all'aggregatore del run (src/progress_sinks.py) che ne limita la frequenza e lo scrive sui sink configurati
 """
 class ProgressPrinter:
-	def __init__( self, name ):
+	def __init__( self, name, listener=None ):
 		self.name = name	# process name
-		#self.start_time = time.time()	# start time process (progress_print_vone/vtwo)
+		self.listener = listener	# called with the percent, e.g. Project.progress of the step
+		self.aggregator = ProgressAggregator()	# shared by the steps running at the same time
 	def __call__( self, percent ):
-		print("{} progress: {:.2f}%".format(self.name, percent), end="\r", flush=True)
-		# svuotare il buffer di output standard in modo da vedere live progression
-		# e non direttamente a esito finale
-		#sys.stdout.flush()
-
-# altri metodi usabili per la progressione 
-"""
-def __call__( self, percent ):
-		elapsed = float(time.time() - self.start_time) # self.start_time
-		if percent:
-			sec = elapsed / percent * 100
-			minuti = sec / 60
-			if minuti > 1:
-				print('Current task progress: {:.2f}%, estimated time left: {:.0f} minutes'.format(percent, minuti), end="\r", flush=True)
-			else:
-				print('Current task progress: {:.2f}%, estimated time left: {:.0f} seconds'.format(percent, sec), end="\r", flush=True)
-		else:
-			print('Current task progress: {:.2f}%, estimated time left: unknown'.format(percent), end="\r", flush=True) #if 0% progress
-"""
-"""
-def __call__( self, percent ):
-	print("{} progress: {:.2f}%".format(self.name, percent))
-	# svuotare il buffer di output standard in modo da vedere live progression
-	# e non direttamente a esito finale
-	sys.stdout.flush()
-"""
-"""
-def __call__( self, percent ):
-		elapsed = float(time.time() - self.start_time) # self.start_time
-		if percent:
-			sec = elapsed / percent * 100
-			print('Current task progress: {:.2f}%, estimated time left: {:.0f} seconds'.format(percent, sec), end="\r", flush=True)
-		else:
-			print('Current task progress: {:.2f}%, estimated time left: unknown'.format(percent), end="\r", flush=True) #if 0% progress
-"""
\ No newline at end of file
+		self.aggregator.update(self.name, percent)
+		if self.listener is not None:
+			self.listener(percent)
+	# step ended: final line/event of the step
+	def close( self ):
+		self.aggregator.finish(self.name)
+	# with ProgressPrinter(name) as printer: closed also when the step fails
+	def __enter__( self ):
+		return self
+	def __exit__( self, *exc_info ):
+		self.close()
@@ -0,0 +1,77 @@
+# progress_rate.py
+import time
+from collections import deque
+import numpy as np
+
+"""
+Velocità di avanzamento degli step dai callback di progresso di Metashape: stima live del tempo rimanente (ProgressRate)
+e curve di throughput (% al minuto) dagli eventi registrati da SystemMonitor (monitor.progress.bin).
+"""
+
+"""
+Remaining time of a step from its recent progress rate
+"""
+class ProgressRate:
+    # window: sec of recent progress used for the rate, the whole step until then
+    # resolution: sec, callbacks closer than this replace the last point (bounded memory at any callback rate)
+    def __init__(self, window: float = 300, resolution: float = 1) -> None:
+        self.window = window
+        self.resolution = resolution
+        self.events = deque()   # (time, percent)
+
+    def update(self, percent: float, now: float = None) -> None:
+        now = time.time() if now is None else now
+        if self.events and percent < self.events[-1][1]:
+            self.events.clear()     # Metashape restarted the progress (new sub-task)
+        if len(self.events) >= 2 and now - self.events[-2][0] < self.resolution:
+            self.events[-1] = (now, percent)
+        else:
+            self.events.append((now, percent))
+        while len(self.events) > 2 and now - self.events[1][0] >= self.window:
+            self.events.popleft()
+
+    # percent per second, None until the progress moves
+    def rate(self):
+        if len(self.events) < 2:
+            return None
+        (start, first), (end, last) = self.events[0], self.events[-1]
+        if end <= start or last <= first:
+            return None
+        return (last - first) / (end - start)
+
+    # seconds to 100%, None if unknown
+    def eta(self):
+        rate = self.rate()
+        if rate is None:
+            return None
+        return (100 - self.events[-1][1]) / rate
+
+def format_eta(seconds) -> str:
+    if seconds is None:
+        return "unknown"
+    hours, rest = divmod(int(seconds), 3600)
+    return "{:d}h{:02d}m{:02d}s".format(hours, rest // 60, rest % 60) if hours else "{:d}m{:02d}s".format(rest // 60, rest % 60)
+
+"""
+Throughput curve of a step: percent per minute in bins of bin_size sec, from its progress events.
+Returns (start time of every bin, percent per minute)
+"""
+def throughput(times: np.ndarray, percents: np.ndarray, bin_size: float = 60):
+    times = np.asarray(times, dtype=float)
+    percents = np.maximum.accumulate(np.asarray(percents, dtype=float))     # restarts do not count as negative progress
+    if len(times) < 2 or times[-1] <= times[0]:
+        return np.zeros(0), np.zeros(0)
+    edges = np.append(np.arange(times[0], times[-1], bin_size), times[-1])     # the last bin may be shorter
+    at_edges = np.interp(edges, times, percents)
+    return edges[:-1], np.diff(at_edges) / np.diff(edges) * 60
+
+"""
+Throughput curves of every step of the progress records (src/monitor_store.py read_progress): {step: (times, percent/min)}
+"""
+def step_throughput(records: np.ndarray, bin_size: float = 60) -> dict:
+    steps = np.char.decode(records['step'], 'utf-8')
+    curves = {}
+    for step in dict.fromkeys(steps):
+        mask = steps == step
+        curves[step] = throughput(records['time'][mask], records['percent'][mask], bin_size)
+    return curves
@@ -0,0 +1,210 @@
+# progress_sinks.py
+import json
+import socket
+import sys
+import threading
+import time
+from src.singleton_meta import SingletonMeta
+from src.progress_rate import ProgressRate, format_eta
+
+"""
+Avanzamento degli step: un unico aggregatore per il run riceve i callback di progresso di tutti gli step
+(anche concorrenti, -p, e degli export paralleli), li limita nel tempo e nella variazione minima
+e li inoltra a uno o più sink configurabili:
+- TtySink: riga unica aggiornata con \\r con tutti gli step in corso (terminale interattivo)
+- LogSink: una riga key=value per evento, su file o stdout (job batch, log rediretti)
+- SocketSink: eventi JSON, uno per riga, su una connessione TCP (host:port)
+- NullSink: nessun output
+Gli eventi sono dict {'event': 'progress' | 'end', 'time', 'step', 'percent', 'eta' (sec o None), 'elapsed' (sec)}.
+"""
+
+class NullSink:
+    def write(self, event: dict, running: dict) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+class TtySink:
+    # stream: terminal, stdout by default
+    def __init__(self, stream=None) -> None:
+        self.stream = stream if stream is not None else sys.stdout
+        self.width = 0
+
+    # running: {step: last event} of the steps in progress, shown on the same line
+    def write(self, event: dict, running: dict) -> None:
+        if event['event'] == 'end':
+            self._line("{} {:.0f}% in {}".format(event['step'], event['percent'], format_eta(event['elapsed'])))
+            self.stream.write("\n")
+            self.width = 0
+        if running:
+            self._line(" | ".join("{} {:.1f}% ETA {}".format(step, state['percent'], format_eta(state['eta']))
+                                  for step, state in running.items()))
+        self.stream.flush()
+
+    def _line(self, text: str) -> None:
+        self.stream.write("\r" + text.ljust(self.width))   # blank the rest of a longer previous line
+        self.width = len(text)
+
+    def close(self) -> None:
+        if self.width:
+            self.stream.write("\n")
+            self.stream.flush()
+
+class LogSink:
+    # path: log file (appended), stdout if None
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self.stream = open(path, 'a') if path is not None else sys.stdout
+
+    @staticmethod
+    def format(event: dict) -> str:
+        fields = [time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(event['time'])), event['event'],
+                  f"step={event['step']}", f"percent={event['percent']:.1f}", f"elapsed={event['elapsed']:.0f}"]
+        if event['eta'] is not None:
+            fields.append(f"eta={event['eta']:.0f}")
+        return ' '.join(fields) + "\n"
+
+    def write(self, event: dict, running: dict) -> None:
+        self.stream.write(self.format(event))
+        self.stream.flush()
+
+    def close(self) -> None:
+        if self.path is not None:
+            self.stream.close()
+
+class SocketSink:
+    # address: 'host:port' of a TCP listener reading JSON lines
+    # retry: sec before connecting again after an error; the workflow never fails because of the sink
+    def __init__(self, address: str, retry: float = 30) -> None:
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.retry = retry
+        self.connection = None
+        self.failed_at = None
+
+    def _connect(self):
+        if self.connection is None and (self.failed_at is None or time.time() - self.failed_at >= self.retry):
+            try:
+                self.connection = socket.create_connection(self.address, timeout=1)
+            except OSError as e:
+                self.failed_at = time.time()
+                print(f"-- DEBUG: progress socket {self.address[0]}:{self.address[1]} not available ({e})")
+        return self.connection
+
+    def write(self, event: dict, running: dict) -> None:
+        connection = self._connect()
+        if connection is None:
+            return
+        try:
+            connection.sendall((json.dumps(event) + "\n").encode('utf-8'))
+        except OSError:
+            self.close()
+            self.failed_at = time.time()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+sinks = {'tty': TtySink, 'log': LogSink, 'socket': SocketSink, 'none': NullSink}
+
+"""
+Sink from its config: 'tty', 'none', {'type': 'log', 'path': 'progress.log'}, {'type': 'socket', 'address': 'host:9000'}
+"""
+def create_sink(config):
+    if isinstance(config, str):
+        config = {'type': config}
+    config = dict(config)
+    kind = config.pop('type')
+    if kind not in sinks:
+        raise ValueError(f"Error: progress sink {kind} is not valid {list(sinks)}.")
+    return sinks[kind](**config)
+
+class ProgressAggregator(metaclass=SingletonMeta):
+    # sinks: outputs of the progress, default: TtySink on a terminal, LogSink on stdout otherwise
+    # interval: min sec between two events of a step sent to the sinks, default 1 on a terminal, 30 otherwise
+    # min_delta: min progress (percentage points) between two events of a step
+    def __init__(self, sinks: list = None, interval: float = None, min_delta: float = 1) -> None:
+        self.lock = threading.Lock()
+        self.sinks = []
+        self.running = {}   # step: last state {'percent', 'eta', ...}
+        self.started = {}   # step: start time
+        self.rates = {}     # step: ProgressRate
+        self.sent = {}      # step: (time, percent) of the last event sent to the sinks
+        self.configure(sinks, interval, min_delta)
+
+    """
+    Replace sinks and throttling of the aggregator; the previous sinks are closed.
+    The aggregator is a singleton: ProgressAggregator(...) returns the existing instance and ignores its arguments,
+    the config of the run is applied with configure
+    """
+    def configure(self, sinks: list = None, interval: float = None, min_delta: float = 1) -> None:
+        interactive = sys.stdout.isatty()
+        sinks = sinks if sinks is not None else [TtySink() if interactive else LogSink()]
+        with self.lock:
+            for sink in self.sinks:
+                sink.close()
+            self.sinks = sinks
+            self.interval = interval if interval is not None else (1 if interactive else 30)
+            self.min_delta = min_delta
+
+    """
+    Aggregator from the 'progress' entry of the project config,
+    e.g. {'sinks': ['tty', {'type': 'log', 'path': 'progress.log'}], 'interval': 5, 'min_delta': 2}
+    """
+    @classmethod
+    def from_config(cls, config: dict = None) -> 'ProgressAggregator':
+        config = config or {}
+        sinks = [create_sink(sink) for sink in config['sinks']] if 'sinks' in config else None
+        aggregator = cls()  # the instance of the run, possibly created before by a ProgressPrinter
+        aggregator.configure(sinks=sinks, interval=config.get('interval'), min_delta=config.get('min_delta', 1))
+        return aggregator
+
+    """
+    Progress callback of a step; sent to the sinks at the first call, at 100% and then when both interval sec
+    and min_delta points passed since the last event of the step
+    """
+    def update(self, step: str, percent: float) -> None:
+        now = time.time()
+        with self.lock:
+            if step not in self.started:
+                self.started[step] = now
+                self.rates[step] = ProgressRate()
+            self.rates[step].update(percent, now)
+            last = self.sent.get(step)
+            if last is not None and percent == last[1]:
+                return
+            if last is not None and percent < 100 and (now - last[0] < self.interval or abs(percent - last[1]) < self.min_delta):
+                return
+            self.sent[step] = (now, percent)
+            self._emit('progress', step, percent, now)
+
+    """
+    Step ended: final event and removal from the running steps
+    """
+    def finish(self, step: str) -> None:
+        now = time.time()
+        with self.lock:
+            if step not in self.started:
+                return
+            events = self.rates[step].events
+            percent = events[-1][1] if events else 0.0
+            self._emit('end', step, percent, now)
+
+    def _emit(self, kind: str, step: str, percent: float, now: float) -> None:
+        event = {'event': kind, 'time': now, 'step': step, 'percent': percent,
+                 'eta': self.rates[step].eta() if kind == 'progress' else None, 'elapsed': now - self.started[step]}
+        if kind == 'end':
+            self.running.pop(step, None)
+            del self.started[step], self.rates[step]
+            self.sent.pop(step, None)
+        else:
+            self.running[step] = event
+        for sink in self.sinks:
+            sink.write(event, self.running)
+
+    def close(self) -> None:
+        with self.lock:
+            for sink in self.sinks:
+                sink.close()
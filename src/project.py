@@ -1,27 +1,46 @@
 # project.py
 import Metashape
 import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 from src.singleton_meta import SingletonMeta
+from src.step_graph import DocumentLock
 from src.system_monitor import SystemMonitor
+from src.checkpoint_policy import CheckpointPolicy
+from src.step_tracer import StepTracer
+from src.run_metrics import RunMetrics
     
 class Project(metaclass=SingletonMeta):
-    def __init__(self, project_path: str = None, enable_monitoring: bool = False) -> None:
+    # progress_interval: sec, min interval between two progress events of a step recorded by the monitor
+    def __init__(self, project_path: str = None, enable_monitoring: bool = False, progress_interval: float = 1) -> None:
         self.project_path = project_path
         self.doc = None
         self.chunk = None
         self.monitoring = None
+        self.save_lock = threading.RLock()   # steps running concurrently share the document
+        self.document_lock = DocumentLock()  # saves wait for the running steps (Project.step)
+        self.local = threading.local()  # save_due: checkpoint requested by the step of the thread, saved when it ends
+        self.checkpoint_policy = CheckpointPolicy()
+        self.unsaved_steps = []     # steps completed after the last save
+        self.last_save = time.time()
+        self.save_times = []        # (version, seconds) of every save
+        self.save_listeners = []    # called with the list of steps covered by a save
+        self.tracer = StepTracer(os.path.dirname(project_path) + "/trace.jsonl" if project_path else None)
         
         if enable_monitoring:
             directory_path = os.path.dirname(project_path)
-            self.monitoring = SystemMonitor(directory_path + "/monitor.csv")
+            self.monitoring = SystemMonitor(directory_path + "/monitor.bin", progress_interval=progress_interval)
+        self.metrics = RunMetrics(self.monitoring)     # served by step_workflow.py --metrics-port
+        self.memory_guard = None    # MemoryGuard adapting the params of the heavy steps
 
     @classmethod
     def get_project(cls):
         return cls()
 
-    def load_project(self) -> None:
+    def load_project(self, read_only: bool = False) -> None:
         self.doc = Metashape.Document()
-        self.doc.open(path=self.project_path, read_only=False)
+        self.doc.open(path=self.project_path, read_only=read_only)
         self.chunk = self.doc.chunk
         print("--Load Project", self.doc.path)
 
@@ -31,13 +50,123 @@ class Project(metaclass=SingletonMeta):
         self.chunk = self.doc.addChunk()
         print("--New Project", self.doc.path)
 
+    def set_checkpoint_policy(self, policy: CheckpointPolicy) -> None:
+        self.checkpoint_policy = policy
+        print("-- CHECKPOINT:", policy.mode)
+
+    def set_memory_guard(self, guard) -> None:
+        self.memory_guard = guard
+        print("-- MEMORY GUARD:", "enabled" if guard.enabled else "disabled")
+
+    """
+    Progress callback of a step: metrics endpoint and, with monitoring, progress events next to the samples
+    """
+    def progress(self, step: str, percent: float) -> None:
+        self.metrics.progress(step, percent)
+        if self.monitoring is not None:
+            self.monitoring.progress(step, percent)
+
+    """
+    Params of a step adapted by the memory guard to the RAM available now
+    """
+    def adapt_params(self, step: str, params: dict) -> dict:
+        if self.memory_guard is None:
+            return params
+        return self.memory_guard.adapt(step, params)
+
+    """
+    (width, height) in meters of the region of the chunk, None if the chunk is not georeferenced
+    """
+    def region_size(self):
+        if self.chunk is None or not self.chunk.transform.scale:
+            return None
+        size = self.chunk.region.size * self.chunk.transform.scale
+        return size.x, size.y
+
+    """
+    Monitoring phase of a step (SystemMonitor.phase), nothing if monitoring is disabled
+    """
+    def monitor_phase(self, name: str):
+        if self.monitoring is None:
+            return nullcontext()
+        return self.monitoring.phase(name)
+
+    def add_save_listener(self, listener) -> None:
+        self.save_listeners.append(listener)
+
     # project version to save
     def save_project(self, version: str, path: str = None) -> None:
-        if path == None:
-            self.doc.save(version=version)
+        with self.document_lock.exclusive(), self.save_lock, self.tracer.span('save', kind='save', params={'version': version}):
+            start = time.time()
+            if path == None:
+                self.doc.save(version=version)
+            else:
+                # init project case
+                self.doc.save(path=path, version=version)
+            elapsed = time.time() - start
+            self.last_save = time.time()
+            self.save_times.append((version, elapsed))
+            print(f"-- DEBUG: project saved ({version}) in {elapsed:.2f} s")
+            saved_steps, self.unsaved_steps = self.unsaved_steps, []
+            for listener in self.save_listeners:
+                listener(saved_steps)
+
+    """
+    Step completed: save it or leave it pending, according to the checkpoint policy
+    """
+    def checkpoint(self, version: str) -> None:
+        with self.save_lock:
+            self.unsaved_steps.append(version)
+            due = self.checkpoint_policy.save_after(version, time.time() - self.last_save)
+        if due and self.document_lock.held():
+            self.local.save_due = True  # the step still holds the document: saved when it ends (Project.step)
+        elif due:
+            self.save_pending()
+
+    """
+    Step about to start: save the pending changes if the policy requires it
+    """
+    def before_step(self, step: str) -> None:
+        if self.checkpoint_policy.save_before(step):
+            self.save_pending()
+
+    """
+    Step running on the document: the pending changes are saved before it when the policy requires it
+    (or with save_before), the document is shared with the other running steps and every save waits for them;
+    the checkpoint of the step is saved when it ends, inside the span of the step (its save time, not compute time)
+    """
+    @contextmanager
+    def step(self, name: str, save_before: bool = False):
+        if save_before:
+            self.save_pending()
         else:
-            # init project case
-            self.doc.save(path=path, version=version)
+            self.before_step(name)
+        with self.tracer.span(name, join=True):
+            with self.document_lock.shared():
+                yield
+            if getattr(self.local, 'save_due', False):
+                self.local.save_due = False
+                self.save_pending()
+
+    """
+    Save the changes of the steps completed after the last save, if any
+    """
+    def save_pending(self) -> None:
+        with self.document_lock.exclusive(), self.save_lock:
+            if self.unsaved_steps:
+                self.save_project(version=self.unsaved_steps[-1])
+
+    """
+    End of the run: save the pending changes
+    """
+    def finalize(self) -> None:
+        self.save_pending()
+        print(f"-- DEBUG: {len(self.save_times)} project saves, {sum(t for _, t in self.save_times):.2f} s")
+
+    def is_saved(self, step: str) -> bool:
+        return step not in self.unsaved_steps
 
     def quit_project(self) -> None:
+        if self.monitoring is not None:
+            self.monitoring.close()
         Metashape.app.quit()
@@ -0,0 +1,114 @@
+# run_manifest.py
+import json
+import hashlib
+import os
+import time
+import threading
+
+"""
+Manifest dei passi completati, salvato accanto al progetto .psx: per ogni step registra l'hash dei parametri,
+gli hash degli step a monte e l'hash complessivo, così da poter riprendere un'esecuzione interrotta (--resume).
+"""
+
+class RunManifest:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.steps = {}
+        self.lock = threading.Lock()    # steps may complete concurrently
+        self.load()
+
+    """
+    Manifest path for a Metashape project: <project>.manifest.json
+    """
+    @staticmethod
+    def project_manifest_path(project_path: str) -> str:
+        return os.path.splitext(project_path)[0] + '.manifest.json'
+
+    @staticmethod
+    def hash_params(params: dict) -> str:
+        encoded = json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    """
+    Hash of a step from its name, its parameters and the hashes of its upstream steps
+    """
+    @staticmethod
+    def step_hash(name: str, params_hash: str, upstream: dict) -> str:
+        encoded = json.dumps({'step': name, 'params': params_hash, 'upstream': upstream}, sort_keys=True)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.steps = json.load(f).get('steps', {})
+        except (json.JSONDecodeError, OSError):
+            print(f"Note: manifest {self.path} is not readable, every step will be executed.")
+            self.steps = {}
+
+    def save(self) -> None:
+        # write on a temporary file and rename, a crash never leaves a truncated manifest
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'steps': self.steps}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    """
+    Forget every step, e.g. when a new project replaces the old one
+    """
+    def reset(self) -> None:
+        with self.lock:
+            self.steps = {}
+            if os.path.exists(self.path):
+                self.save()
+
+    def recorded_hash(self, name: str) -> str:
+        entry = self.steps.get(name)
+        return entry['hash'] if entry else None
+
+    """
+    Step completed with the same hash and its result saved in the project
+    """
+    def is_completed(self, name: str, step_hash: str) -> bool:
+        return self.recorded_hash(name) == step_hash and self.steps[name].get('saved', True)
+
+    # saved: False if the project was not saved after the step (checkpoint policy), see mark_saved
+    def record(self, name: str, step_hash: str, params_hash: str, upstream: dict, saved: bool = True) -> None:
+        with self.lock:
+            self.steps[name] = {
+                'hash': step_hash,
+                'params_hash': params_hash,
+                'upstream': upstream,
+                'completed_at': time.time(),
+                'saved': saved
+            }
+            self.save()
+
+    """
+    Project saved: the given steps are now persistent
+    """
+    def mark_saved(self, names: list) -> None:
+        with self.lock:
+            changed = False
+            for name in names:
+                if name in self.steps and not self.steps[name].get('saved', True):
+                    self.steps[name]['saved'] = True
+                    changed = True
+            if changed:
+                self.save()
+
+    """
+    Forget a step that is going to be executed again, together with every recorded step downstream of it
+    """
+    def invalidate(self, name: str) -> None:
+        with self.lock:
+            removed = []
+            stale = [name]
+            while stale:
+                current = stale.pop()
+                if self.steps.pop(current, None) is not None:
+                    removed.append(current)
+                stale += [step for step, entry in self.steps.items() if current in entry['upstream']]
+            if removed:
+                self.save()
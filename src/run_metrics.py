@@ -0,0 +1,153 @@
+# run_metrics.py
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.progress_rate import ProgressRate
+
+"""
+Stato del workflow in esecuzione esposto nel formato testuale di Prometheus (endpoint /metrics, step_workflow.py --metrics-port):
+step in corso e relativo progresso, durata degli step conclusi e ultimo campione di SystemMonitor (con -m).
+"""
+
+PREFIX = 'hammon'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+"""
+Lines of a metric family: # HELP, # TYPE and a sample for every (labels, value)
+"""
+def family(name: str, kind: str, help_text: str, samples: list) -> list:
+    lines = [f'# HELP {PREFIX}_{name} {help_text}', f'# TYPE {PREFIX}_{name} {kind}']
+    for labels, value in samples:
+        labels = ','.join(f'{key}="{escape(label)}"' for key, label in labels.items())
+        lines.append(f'{PREFIX}_{name}{{{labels}}} {float(value)!r}' if labels else f'{PREFIX}_{name} {float(value)!r}')
+    return lines
+
+class RunMetrics:
+    # monitor: SystemMonitor of the run, None without monitoring
+    def __init__(self, monitor=None) -> None:
+        self.monitor = monitor
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.running = {}       # step: (start time, progress %)
+        self.durations = {}     # step: (seconds, 'done' | 'failed') of the steps ended
+        self.rates = {}         # step: ProgressRate of the running steps
+
+    """
+    Track a step: running while inside the block, then its duration (StepGraph.run track)
+    """
+    @contextmanager
+    def step(self, name: str):
+        with self.lock:
+            self.running[name] = (time.time(), 0.0)
+            self.rates[name] = ProgressRate()
+        status = 'failed'
+        try:
+            yield
+            status = 'done'
+        finally:
+            with self.lock:
+                start, _ = self.running.pop(name)
+                self.rates.pop(name, None)
+                self.durations[name] = (time.time() - start, status)
+
+    # progress % of a running step (ProgressPrinter listener)
+    def progress(self, name: str, percent: float) -> None:
+        with self.lock:
+            if name in self.running:
+                self.running[name] = (self.running[name][0], percent)
+                self.rates[name].update(percent)
+
+    def render(self) -> str:
+        now = time.time()
+        with self.lock:
+            running = dict(self.running)
+            durations = dict(self.durations)
+            etas = {name: rate.eta() for name, rate in self.rates.items()}
+        lines = family('run_elapsed_seconds', 'gauge', 'Seconds since the start of the run.', [({}, now - self.start_time)])
+        lines += family('step_running', 'gauge', 'Steps running (1).', [({'step': name}, 1) for name in running])
+        lines += family('step_progress_percent', 'gauge', 'Progress of the running steps.',
+                        [({'step': name}, percent) for name, (_, percent) in running.items()])
+        lines += family('step_eta_seconds', 'gauge', 'Estimated seconds to the end of the running steps, from the recent progress rate.',
+                        [({'step': name}, eta) for name, eta in etas.items() if eta is not None])
+        lines += family('step_duration_seconds', 'gauge', 'Wall time of the steps, elapsed for the running ones.',
+                        [({'step': name, 'status': status}, seconds) for name, (seconds, status) in durations.items()] +
+                        [({'step': name, 'status': 'running'}, now - start) for name, (start, _) in running.items()])
+        lines += family('steps_completed_total', 'counter', 'Steps completed.',
+                        [({}, sum(status == 'done' for _, status in durations.values()))])
+        latest = self.monitor.latest if self.monitor is not None else None
+        if latest is not None:
+            lines += self.render_sample(latest)
+        return '\n'.join(lines) + '\n'
+
+    """
+    Latest sample of SystemMonitor (SystemMonitor.latest)
+    """
+    @staticmethod
+    def render_sample(latest: dict) -> list:
+        gb = 1024 * 1024 * 1024
+        mb = 1024 * 1024
+        process = latest['process']
+        lines = family('monitor_sample_timestamp_seconds', 'gauge', 'Time of the latest monitor sample.', [({}, latest['time'])])
+        lines += family('monitor_phase', 'gauge', 'Label of the latest monitor sample (1).', [({'phase': latest['phase']}, 1)])
+        lines += family('cpu_usage_percent', 'gauge', 'CPU usage of the node.', [({}, latest['cpu'])])
+        lines += family('ram_usage_percent', 'gauge', 'RAM usage of the node.', [({}, latest['ram_usage'])])
+        lines += family('ram_used_bytes', 'gauge', 'RAM used on the node.', [({}, latest['ram_used'] * gb)])
+        lines += family('process_count', 'gauge', 'Processes of the workflow tree.', [({}, process['count'])])
+        lines += family('process_cpu_percent', 'gauge', 'CPU usage of the workflow tree (of the node).', [({}, process['cpu'])])
+        lines += family('process_rss_bytes', 'gauge', 'RSS of the workflow tree.', [({}, process['rss'] * gb)])
+        lines += family('process_uss_bytes', 'gauge', 'USS of the workflow tree.', [({}, process['uss'] * gb)])
+        lines += family('process_threads', 'gauge', 'Threads of the workflow tree.', [({}, process['threads'])])
+        io = latest['io']
+        for name, help_text in (('disk_read', 'Disk read rate.'), ('disk_write', 'Disk write rate.')):
+            lines += family(f'{name}_bytes_per_second', 'gauge', help_text,
+                            [({'device': disk}, value * mb) for disk, value in zip(latest['disks'], io[name])])
+        for name, help_text in (('disk_read_iops', 'Disk read operations per second.'), ('disk_write_iops', 'Disk write operations per second.')):
+            lines += family(name, 'gauge', help_text, [({'device': disk}, value) for disk, value in zip(latest['disks'], io[name])])
+        for name, help_text in (('net_recv', 'Network receive rate.'), ('net_sent', 'Network send rate.')):
+            lines += family(f'{name}_bytes_per_second', 'gauge', help_text,
+                            [({'interface': nic}, value * mb) for nic, value in zip(latest['nics'], io[name])])
+        gpus = latest['gpus']
+        lines += family('gpu_utilization_percent', 'gauge', 'GPU utilization.', [({'gpu': gpu['id']}, gpu['utilization']) for gpu in gpus])
+        lines += family('gpu_memory_used_bytes', 'gauge', 'GPU memory used.', [({'gpu': gpu['id']}, gpu['mem_used'] * mb) for gpu in gpus])
+        lines += family('gpu_memory_total_bytes', 'gauge', 'GPU memory.', [({'gpu': gpu['id']}, gpu['mem_total'] * mb) for gpu in gpus])
+        lines += family('gpu_temperature_celsius', 'gauge', 'GPU temperature.', [({'gpu': gpu['id']}, gpu['temp']) for gpu in gpus])
+        return lines
+
+class MetricsServer:
+    # metrics: RunMetrics served on GET /metrics
+    # port: TCP port, 0 for a free one (self.port)
+    # host: address to bind, all the interfaces by default so that the cluster can scrape the node
+    def __init__(self, metrics: RunMetrics, port: int, host: str = '') -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass    # no line per scrape on the workflow output
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        print(f"-- DEBUG: metrics on http://localhost:{self.port}/metrics")
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.server.shutdown()
+            self.thread.join()
+        self.server.server_close()
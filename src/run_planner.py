@@ -0,0 +1,312 @@
+# run_planner.py
+import csv
+import json
+import os
+import statistics
+import struct
+from src.step_graph import STEP_DEPENDENCIES
+from src.step_tracer import read_trace, summarize_trace
+from src.monitor_store import read_monitor, phases
+from src.progress_rate import format_eta
+
+"""
+Pianificazione preventiva di un'esecuzione (--plan): stima tempo e picco di RAM/VRAM di ogni step
+dalla configurazione, dal numero e dalla risoluzione delle immagini e dai dati di monitoraggio delle esecuzioni precedenti.
+Non usa Metashape.
+"""
+
+# defaults of the processor methods that change the amount of work
+PLAN_DEFAULTS = {
+    'matchPhotos': {'downscale': 1, 'keypoint_limit': 40000},
+    'alignCameras': {},
+    'buildDepthMaps': {'downscale': 2},
+    'buildModel': {'face_count': 'Metashape.HighFaceCount'},
+    'buildUV': {'texture_size': 8192, 'page_count': 1},
+    'buildTexture': {'texture_size': 8192},
+    'buildTiledModel': {'face_count': 20000}
+}
+
+# faces relative to HighFaceCount (Metashape: high 1/5, medium 1/15, low 1/45 of the point count)
+FACE_COUNT_FACTORS = {'High': 1.0, 'Medium': 1 / 3, 'Low': 1 / 9}
+
+# rough defaults for a 2xV100 node, used when there is no history for a step:
+# seconds per unit, RAM GB = base + slope * units, VRAM GB = base + slope * units
+DEFAULT_COSTS = {
+    'addPhotos':          {'time': 0.05,  'ram': (2, 0.002),   'vram': (0, 0)},
+    'filterImageQuality': {'time': 0.01,  'ram': (2, 0.0001),  'vram': (0, 0)},
+    'matchPhotos':        {'time': 0.03,  'ram': (4, 0.0002),  'vram': (2, 0)},
+    'alignCameras':       {'time': 0.5,   'ram': (4, 0.004),   'vram': (0, 0)},
+    'optimizeCameras':    {'time': 0.05,  'ram': (4, 0.002),   'vram': (0, 0)},
+    'buildDepthMaps':     {'time': 0.25,  'ram': (8, 0.0004),  'vram': (6, 0)},
+    'buildPointCloud':    {'time': 0.1,   'ram': (8, 0.002),   'vram': (0, 0)},
+    'filterPointCloud':   {'time': 0.005, 'ram': (8, 0.002),   'vram': (0, 0)},
+    'colorizePointCloud': {'time': 0.02,  'ram': (8, 0.002),   'vram': (0, 0)},
+    'buildModel':         {'time': 0.2,   'ram': (8, 0.006),   'vram': (4, 0)},
+    'colorizeModel':      {'time': 0.02,  'ram': (8, 0.004),   'vram': (0, 0)},
+    'buildUV':            {'time': 0.03,  'ram': (8, 0.004),   'vram': (0, 0)},
+    'buildTexture':       {'time': 0.05,  'ram': (8, 0.002),   'vram': (4, 0)},
+    'buildTiledModel':    {'time': 0.15,  'ram': (8, 0.002),   'vram': (4, 0)},
+    'buildDem':           {'time': 0.02,  'ram': (4, 0.001),   'vram': (0, 0)},
+    'buildOrthomosaic':   {'time': 0.03,  'ram': (4, 0.001),   'vram': (0, 0)},
+    'export':             {'time': 0.01,  'ram': (4, 0.001),   'vram': (0, 0)}
+}
+
+"""
+Image size (width, height) read from the JPEG/PNG/TIFF header, None if unknown
+"""
+def image_size(path: str):
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+            if head[:8] == b'\x89PNG\r\n\x1a\n':
+                f.read(8)   # IHDR length and type
+                return struct.unpack('>II', f.read(8))
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                while True:
+                    marker, size = struct.unpack('>2sH', f.read(4))
+                    if marker[0] != 0xff:
+                        return None
+                    if marker[1] in (0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf):
+                        height, width = struct.unpack('>xHH', f.read(5))
+                        return width, height
+                    f.seek(size - 2, 1)
+            if head[:4] in (b'II*\x00', b'MM\x00*'):
+                order = '<' if head[:2] == b'II' else '>'
+                f.seek(struct.unpack(order + 'I', head[4:8])[0])
+                entries = struct.unpack(order + 'H', f.read(2))[0]
+                tags = {}
+                for _ in range(entries):
+                    tag, kind, _, value = struct.unpack(order + 'HHI4s', f.read(12))
+                    if tag in (256, 257):
+                        tags[tag] = struct.unpack(order + ('H' if kind == 3 else 'I'), value[:2 if kind == 3 else 4])[0]
+                if 256 in tags and 257 in tags:
+                    return tags[256], tags[257]
+    except (OSError, struct.error):
+        pass
+    return None
+
+"""
+Mean megapixels of a sample of the images
+"""
+def image_megapixels(image_files: list, sample: int = 5, default: float = 20.0) -> float:
+    sizes = [image_size(path) for path in sorted(image_files)[:sample]]
+    sizes = [width * height / 1e6 for width, height in (size for size in sizes if size)]
+    return statistics.mean(sizes) if sizes else default
+
+"""
+Effective params of every step in the workflow config {step: params}, processor defaults included
+"""
+def plan_steps(workflow: dict) -> dict:
+    steps = {}
+    groups = {name: params for name, params in workflow.items() if name not in ('settings', 'project')}
+    if 'PhotoProcessor' in groups:
+        steps['addPhotos'] = {}
+        steps['filterImageQuality'] = {}
+    for group, params in groups.items():
+        if not isinstance(params, dict):
+            continue
+        for name, step_params in params.items():
+            name = 'buildOrthomosaic' if name == 'buildOrtho' else name
+            steps[name] = dict(PLAN_DEFAULTS.get(name, {}), **(step_params or {}))
+            if name == 'buildPointCloud' and 'maxconf' in (step_params or {}):
+                steps['filterPointCloud'] = {}
+            if name == 'buildModel':
+                steps['colorizeModel'] = {}
+    # execution order of the step graph
+    order = list(STEP_DEPENDENCIES)
+    return dict(sorted(steps.items(), key=lambda item: order.index(item[0]) if item[0] in order else len(order)))
+
+def face_factor(face_count) -> float:
+    for name, factor in FACE_COUNT_FACTORS.items():
+        if isinstance(face_count, str) and name in face_count:
+            return factor
+    return 1.0
+
+"""
+Work units of a step: megapixels actually processed (images for the per-image steps)
+"""
+def step_units(name: str, steps: dict, images: int, megapixels: float) -> float:
+    params = steps.get(name, {})
+    pixels = images * megapixels
+    depth_downscale = steps.get('buildDepthMaps', PLAN_DEFAULTS['buildDepthMaps']).get('downscale', 2)
+    dense = pixels / depth_downscale ** 2
+    if name in ('addPhotos', 'optimizeCameras', 'alignCameras'):
+        return images
+    if name == 'filterImageQuality':
+        return pixels
+    if name == 'matchPhotos':
+        return pixels / params.get('downscale', 1) ** 2 * params.get('keypoint_limit', 40000) / 40000
+    if name in ('buildModel', 'colorizeModel', 'buildUV'):
+        return dense * face_factor(steps.get('buildModel', {}).get('face_count'))
+    if name == 'buildTexture':
+        page_count = steps.get('buildUV', {}).get('page_count', 1)
+        return pixels * (params.get('texture_size', 8192) / 8192) ** 2 * page_count
+    if name == 'buildOrthomosaic':
+        return pixels
+    return dense
+
+"""
+Per-step samples of a previous run folder: monitor.bin or monitor.csv (SystemMonitor), trace.jsonl (StepTracer)
+and run_info.json (step_workflow.py). The compute time of the trace, when present, replaces the monitor estimate.
+Runs older than run_info.json (monitor.csv or system.csv only) are read with the workflow, images and megapixels
+given, those of the run being planned. Returns {step: {'units', 'time', 'ram', 'vram'}}
+"""
+def read_history(folder: str, workflow: dict = None, images: int = None, megapixels: float = None) -> dict:
+    monitor_path = next((os.path.join(folder, name) for name in ['monitor.bin', 'monitor.csv', 'system.csv']
+                         if os.path.exists(os.path.join(folder, name))), None)
+    trace_path = os.path.join(folder, 'trace.jsonl')
+    info_path = os.path.join(folder, 'run_info.json')
+    if monitor_path is None and not os.path.exists(trace_path):
+        print(f"Note: {folder} has no monitor log or trace, not used as history.")
+        return {}
+    if os.path.exists(info_path):
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+    elif workflow is not None and images:
+        print(f"Note: {folder} has no run_info.json, its steps are scaled with the workflow and images of this run.")
+        info = {'workflow': workflow, 'images': images, 'megapixels': megapixels}
+    else:
+        print(f"Note: {folder} has no run_info.json, not used as history.")
+        return {}
+    steps = plan_steps(info['workflow'])
+    history = {}
+    if monitor_path is not None:
+        history = read_monitor_history(monitor_path, steps, info)
+    if os.path.exists(trace_path):
+        for name, entry in summarize_trace(read_trace(trace_path), since=info.get('time')).items():
+            if name not in steps:
+                continue
+            sample = history.setdefault(name, {
+                'units': step_units(name, steps, info['images'], info['megapixels']),
+                'ram': entry['peak_rss'] / 1024 ** 3,
+                'vram': 0.0
+            })
+            sample['time'] = entry['compute'] / entry['count']     # attempts of the step in the run
+    return history
+
+"""
+(time, RAM used GB, VRAM used GB of the fullest GPU) of the samples of every step
+"""
+def read_monitor_samples(monitor_path: str) -> dict:
+    samples = {}
+    if monitor_path.endswith('.bin'):
+        _, records = read_monitor(monitor_path)
+        vram = records['gpu_mem_used'].max(axis=1, initial=0) / 1024
+        for name, values in zip(phases(records), zip(records['time'], records['ram_used'], vram)):
+            samples.setdefault(name, []).append(tuple(float(value) for value in values))
+        return samples
+    with open(monitor_path, 'r', newline='') as f:
+        reader = csv.reader(f, delimiter=';')
+        next(reader, None)
+        for row in reader:
+            if len(row) < 10:
+                continue
+            try:
+                gpus = json.loads(row[-1].replace("'", '"'))     # GPUs are the last column
+                vram = max((float(gpu['mem_used']) for gpu in gpus), default=0) / 1024
+                values = (float(row[1]), float(row[8].split()[0]), vram)
+            except (ValueError, KeyError, IndexError):
+                continue
+            samples.setdefault(row[0], []).append(values)
+    return samples
+
+def read_monitor_history(monitor_path: str, steps: dict, info: dict) -> dict:
+    samples = read_monitor_samples(monitor_path)
+
+    # a step lasts from its first sample to one sampling interval after the last one
+    deltas = [b[0] - a[0] for rows in samples.values() for a, b in zip(rows, rows[1:]) if b[0] > a[0]]
+    interval = statistics.median(deltas) if deltas else 0
+    history = {}
+    for name, rows in samples.items():
+        if name not in steps:
+            continue
+        times = [row[0] for row in rows]
+        # memory the step adds to what is in use when it starts (OS, other tenants, the project already loaded)
+        history[name] = {
+            'units': step_units(name, steps, info['images'], info['megapixels']),
+            'time': max(times) - min(times) + interval,
+            'ram': max(row[1] for row in rows) - rows[0][1],
+            'vram': max(row[2] for row in rows) - rows[0][2]
+        }
+    return history
+
+"""
+Default cost of a step (DEFAULT_COSTS), for the steps without history
+"""
+def default_cost(name: str) -> dict:
+    return DEFAULT_COSTS.get(name, DEFAULT_COSTS['export'] if name.startswith('export') else DEFAULT_COSTS['buildDem'])
+
+"""
+Fixed GB and GB per unit of the memory of a step from the (units, GB) of previous runs: least squares over runs
+of different size, the default fixed part (capped by the smallest run) with a single size. The fixed part is then
+raised until no previous run is underestimated.
+"""
+def fit_memory(points: list, default_fixed: float) -> tuple:
+    sizes = [units for units, _ in points]
+    if len(set(sizes)) > 1:
+        mean_units = statistics.mean(sizes)
+        mean_gb = statistics.mean(gb for _, gb in points)
+        slope = sum((units - mean_units) * (gb - mean_gb) for units, gb in points) / sum((units - mean_units) ** 2 for units in sizes)
+    else:
+        units, gb = max(points, key=lambda point: point[1])
+        slope = (gb - min(default_fixed, gb)) / units
+    slope = max(slope, 0.0)
+    fixed = max(0.0, max(gb - slope * units for units, gb in points))
+    return fixed, slope
+
+"""
+Predicted {'time', 'ram', 'vram', 'source'} of a step of the given work units: RAM the step adds to what is in use
+when it starts, VRAM of each GPU. Steps with history are scaled from the previous runs (time: median seconds per unit,
+memory: fixed part plus a part per unit, fit_memory), the defaults are used otherwise.
+"""
+def step_cost(name: str, units: float, histories: list) -> dict:
+    samples = [history[name] for history in histories if name in history and history[name]['units'] > 0]
+    if samples:
+        cost = default_cost(name)
+        ram_fixed, ram_slope = fit_memory([(sample['units'], sample['ram']) for sample in samples], cost['ram'][0])
+        vram_fixed, vram_slope = fit_memory([(sample['units'], sample['vram']) for sample in samples], cost['vram'][0])
+        return {
+            'time': statistics.median(sample['time'] / sample['units'] for sample in samples) * units,
+            'ram': ram_fixed + ram_slope * units,
+            'vram': vram_fixed + vram_slope * units,
+            'source': f"history ({len(samples)})"
+        }
+    cost = default_cost(name)
+    return {
+        'time': cost['time'] * units,
+        'ram': cost['ram'][0] + cost['ram'][1] * units,
+        'vram': cost['vram'][0] + cost['vram'][1] * units,
+        'source': "default"
+    }
+
+"""
+Plan of the workflow: list of {'step', 'units', 'time', 'ram', 'vram', 'source'}
+"""
+def plan_run(workflow: dict, images: int, megapixels: float, history_folders: list = None) -> list:
+    steps = plan_steps(workflow)
+    histories = [read_history(folder, workflow, images, megapixels) for folder in history_folders or []]
+    plan = []
+    for name in steps:
+        units = step_units(name, steps, images, megapixels)
+        plan.append(dict({'step': name, 'units': units}, **step_cost(name, units, histories)))
+    return plan
+
+"""
+Plan table; steps over ram_limit (GB of the node) or vram_limit (GB of a GPU) are flagged
+"""
+def format_plan(plan: list, ram_limit: float = None, vram_limit: float = None) -> str:
+    lines = ["{:<20} {:>12} {:>11} {:>10} {:>10}  {}".format('Step', 'Units', 'Time', 'RAM GB', 'VRAM GB', 'Source')]
+    for row in plan:
+        warning = ''
+        if ram_limit is not None and row['ram'] > ram_limit:
+            warning += ' RAM!'
+        if vram_limit is not None and row['vram'] > vram_limit:
+            warning += ' VRAM!'
+        lines.append("{:<20} {:>12.0f} {:>11} {:>10.1f} {:>10.1f}  {}{}".format(
+            row['step'], row['units'], format_eta(row['time']), row['ram'], row['vram'], row['source'], warning))
+    total = sum(row['time'] for row in plan)
+    peak_ram = max((row['ram'] for row in plan), default=0)
+    peak_vram = max((row['vram'] for row in plan), default=0)
+    lines.append("{:<20} {:>12} {:>11} {:>10.1f} {:>10.1f}".format('Total', '', format_eta(total), peak_ram, peak_vram))
+    return "\n".join(lines)
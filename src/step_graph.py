@@ -0,0 +1,287 @@
+# step_graph.py
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from src.run_manifest import RunManifest
+
+"""
+Grafo dichiarativo degli step del workflow: ogni step dichiara gli step a monte da cui dipende
+e le risorse che occupa in modo esclusivo. Lo scheduler esegue in parallelo gli step pronti e non in conflitto.
+"""
+
+# step -> upstream steps (only the ones present in the current run are taken into account,
+# the others are assumed to be already done in the loaded project)
+STEP_DEPENDENCIES = {
+    'addPhotos': [],
+    'filterImageQuality': ['addPhotos'],
+    'matchPhotos': ['addPhotos', 'filterImageQuality'],
+    'alignCameras': ['matchPhotos'],
+    'optimizeCameras': ['alignCameras'],
+    'buildDepthMaps': ['alignCameras', 'optimizeCameras'],
+    'buildPointCloud': ['buildDepthMaps'],
+    'filterPointCloud': ['buildPointCloud'],
+    'colorizePointCloud': ['buildPointCloud', 'filterPointCloud'],
+    'exportPointCloud': ['buildPointCloud', 'filterPointCloud', 'colorizePointCloud'],
+    'buildModel': ['buildDepthMaps'],
+    'colorizeModel': ['buildModel'],
+    'buildUV': ['buildModel', 'colorizeModel'],
+    'buildTexture': ['buildUV'],
+    'buildTiledModel': ['buildDepthMaps', 'buildPointCloud', 'filterPointCloud'],
+    'exportTiledModel': ['buildTiledModel'],
+    'exportModel': ['buildModel', 'colorizeModel', 'buildUV', 'buildTexture'],
+    'exportTexture': ['buildTexture'],
+    'buildDem': ['buildPointCloud', 'filterPointCloud'],
+    'exportDEM': ['buildDem'],
+    'buildOrthomosaic': ['buildDem'],
+    'exportOrthomosaic': ['buildOrthomosaic'],
+    'exportOrthophotos': ['buildOrthomosaic'],
+}
+
+# step -> resources held exclusively while running: two steps sharing a resource never overlap.
+# Exports only read finished data and hold none; saves of the document are kept apart from every running step
+# by the DocumentLock of the project.
+STEP_RESOURCES = {
+    'addPhotos': ['cpu'],
+    'filterImageQuality': ['cpu'],
+    'matchPhotos': ['gpu'],
+    'alignCameras': ['cpu'],
+    'optimizeCameras': ['cpu'],
+    'buildDepthMaps': ['gpu'],
+    'buildPointCloud': ['cpu'],
+    'filterPointCloud': ['cpu'],
+    'colorizePointCloud': ['cpu'],
+    'buildModel': ['gpu'],
+    'colorizeModel': ['cpu'],
+    'buildUV': ['cpu'],
+    'buildTexture': ['gpu'],
+    'buildTiledModel': ['gpu'],
+    'buildDem': ['cpu'],
+    'buildOrthomosaic': ['cpu'],
+}
+
+
+"""
+Lock of the Metashape document shared by the steps running at the same time: any number of steps hold it together
+(shared), a save needs it alone (exclusive) and waits for the running steps to end; no step starts while a save waits.
+A thread holding it shared cannot take it exclusive, it would wait for itself: held() tells the caller to save later.
+"""
+class DocumentLock:
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = None          # thread holding it exclusive
+        self.writer_depth = 0
+        self.waiting_writers = 0
+        self.local = threading.local()
+
+    def held(self) -> bool:
+        return getattr(self.local, 'shared', 0) > 0
+
+    @contextmanager
+    def shared(self):
+        with self.condition:
+            # a thread already holding it goes on, a waiting save would wait for it
+            while not self.held() and (self.writer is not None or self.waiting_writers):
+                self.condition.wait()
+            self.readers += 1
+        self.local.shared = getattr(self.local, 'shared', 0) + 1
+        try:
+            yield
+        finally:
+            self.local.shared -= 1
+            with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        me = threading.get_ident()
+        if self.held():
+            raise RuntimeError("Error: the document cannot be saved by a running step, save it after the step.")
+        with self.condition:
+            if self.writer != me:
+                self.waiting_writers += 1
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+                self.waiting_writers -= 1
+                self.writer = me
+            self.writer_depth += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writer_depth -= 1
+                if not self.writer_depth:
+                    self.writer = None
+                    self.condition.notify_all()
+
+
+class Step:
+    # action: callable without arguments that runs the step
+    # condition: optional callable evaluated when the step is ready, if False the step is skipped
+    # params: effective inputs of the step, hashed in the run manifest
+    def __init__(self, name: str, action, depends_on: list = None, resources: list = None, condition=None, params: dict = None) -> None:
+        self.name = name
+        self.action = action
+        self.params = params or {}
+        self.effective_params = None    # params the action ran with when it changed them (memory guard)
+        self.depends_on = list(STEP_DEPENDENCIES.get(name, []) if depends_on is None else depends_on)
+        self.resources = set(STEP_RESOURCES.get(name, []) if resources is None else resources)
+        self.condition = condition
+
+
+class StepGraph:
+    def __init__(self) -> None:
+        self.steps = {}    # insertion order is the sequential execution order
+        self.manifest = None
+        self.resume = False
+        self.hashes = {}
+        self.is_saved = None
+        self.track = None
+
+    def add_step(self, step: Step) -> None:
+        if step.name in self.steps:
+            raise ValueError(f"Error: step {step.name} already in the workflow.")
+        self.steps[step.name] = step
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.steps
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    """
+    Upstream steps of name that are part of this graph
+    """
+    def dependencies(self, name: str) -> list:
+        return [dep for dep in self.steps[name].depends_on if dep in self.steps]
+
+    """
+    Raise ValueError if the graph contains a dependency cycle
+    """
+    def check(self) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Error: dependency cycle on step {name}.")
+            visiting.add(name)
+            for dep in self.dependencies(name):
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    """
+    Steps whose dependencies are done and whose resources do not conflict with the running ones (and with each other)
+    """
+    def ready_steps(self, done: set, running: set, limit: int = None) -> list:
+        busy = set()
+        for name in running:
+            busy |= self.steps[name].resources
+        ready = []
+        for name, step in self.steps.items():
+            if limit is not None and len(ready) >= limit:
+                break
+            if name in done or name in running:
+                continue
+            if all(dep in done for dep in self.dependencies(name)) and not (step.resources & busy):
+                ready.append(name)
+                busy |= step.resources
+        return ready
+
+    """
+    Hash of every step: parameters plus the hashes of the upstream steps.
+    Upstream steps not in the graph contribute the hash recorded in the manifest, if any.
+    """
+    def step_hashes(self, manifest: RunManifest = None) -> dict:
+        hashes = {}
+
+        def compute(name: str) -> str:
+            if name not in hashes:
+                upstream = {}
+                for dep in self.steps[name].depends_on:
+                    if dep in self.steps:
+                        upstream[dep] = compute(dep)
+                    elif manifest is not None and manifest.recorded_hash(dep):
+                        upstream[dep] = manifest.recorded_hash(dep)
+                params_hash = RunManifest.hash_params(self.steps[name].params)
+                hashes[name] = (RunManifest.step_hash(name, params_hash, upstream), params_hash, upstream)
+            return hashes[name][0]
+
+        for name in self.steps:
+            compute(name)
+        return hashes
+
+    def _execute(self, step: Step) -> None:
+        if self.manifest is not None:
+            step_hash, params_hash, upstream = self.hashes[step.name]
+            if self.resume and self.manifest.is_completed(step.name, step_hash):
+                print(f"-- DEBUG: {step.name} already completed, skipped (resume)")
+                return
+            # the step and every step downstream of it are no longer valid
+            self.manifest.invalidate(step.name)
+        if step.condition is not None and not step.condition():
+            print(f"-- DEBUG: {step.name} skipped")
+            return
+        if self.track is not None:
+            with self.track(step.name):
+                step.action()
+        else:
+            step.action()
+        if self.manifest is not None:
+            if step.effective_params is not None and step.effective_params != step.params:
+                # recorded with the params it ran with: a resume with the configured params runs it again
+                params_hash = RunManifest.hash_params(step.effective_params)
+                step_hash = RunManifest.step_hash(step.name, params_hash, upstream)
+            saved = self.is_saved(step.name) if self.is_saved is not None else True
+            self.manifest.record(step.name, step_hash, params_hash, upstream, saved=saved)
+
+    """
+    Run every step respecting dependencies, with at most max_workers steps at the same time.
+    Returns the steps in completion order. With max_workers=1 steps run in the calling thread, in insertion order.
+    Completed steps are recorded in manifest; with resume, steps whose hash matches the manifest are skipped.
+    is_saved(step) tells whether the result of a completed step is already saved in the project.
+    track(step) is a context manager around the action of every step executed (e.g. RunMetrics.step).
+    """
+    def run(self, max_workers: int = 1, manifest: RunManifest = None, resume: bool = False, is_saved=None, track=None) -> list:
+        self.check()
+        self.track = track
+        self.manifest = manifest
+        self.resume = resume
+        self.is_saved = is_saved
+        self.hashes = self.step_hashes(manifest)
+        done = set()
+        order = []
+        if max_workers <= 1:
+            while len(done) < len(self.steps):
+                name = self.ready_steps(done, set(), limit=1)[0]
+                self._execute(self.steps[name])
+                done.add(name)
+                order.append(name)
+            return order
+
+        running = {}    # future -> step name
+        error = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(done) < len(self.steps):
+                if error is None:
+                    for name in self.ready_steps(done, set(running.values()), limit=max_workers - len(running)):
+                        running[executor.submit(self._execute, self.steps[name])] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()    # stop scheduling, let the running steps end
+                        continue
+                    done.add(name)
+                    order.append(name)
+        if error is not None:
+            raise error
+        return order
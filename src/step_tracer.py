@@ -0,0 +1,226 @@
+# step_tracer.py
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import psutil
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+"""
+Tracciamento dei tempi di ogni step: ogni metodo dei processor è racchiuso in uno span
+(tempo reale, tempo CPU del processo, picco di RSS, tempo di salvataggio, parametri effettivi)
+scritto come una riga JSON nel file di trace. Gli span sono annidati: il salvataggio del progetto
+è uno span figlio, quindi il suo tempo è separato dal tempo di calcolo dello step.
+"""
+
+def _max_rss() -> int:
+    # high-water mark of the process RSS in bytes (ru_maxrss is in KB on Linux)
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class Span:
+    def __init__(self, tracer, name: str, kind: str, parent, params: dict) -> None:
+        self.id = next(tracer.ids)
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.params = params
+        self.effective_params = None
+        self.children_time = 0.0
+        self.save_time = 0.0
+        self.start = time.time()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = tracer.cpu_time()
+        self.rss_start = tracer.rss()
+        self.max_rss_start = _max_rss()
+        self.peak_rss = self.rss_start
+
+class StepTracer:
+    # trace_file: JSONL file, None disables the tracing
+    # interval: sec between two RSS samples while a span is open
+    def __init__(self, trace_file: str = None, interval: float = 0.5) -> None:
+        self.trace_file = trace_file
+        self.interval = interval
+        self.process = psutil.Process()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.local = threading.local()      # stack of the open spans of each thread
+        self.open_spans = set()
+        self.sampler = None
+        self.wake = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.trace_file is not None
+
+    def cpu_time(self) -> float:
+        times = self.process.cpu_times()
+        return times.user + times.system
+
+    def rss(self) -> int:
+        return self.process.memory_info().rss
+
+    def _stack(self) -> list:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    """
+    RSS sampling thread, alive only while some span is open
+    """
+    def _sample_rss(self) -> None:
+        while True:
+            with self.lock:
+                if not self.open_spans:
+                    self.sampler = None
+                    return
+                rss = self.rss()
+                for span in self.open_spans:
+                    span.peak_rss = max(span.peak_rss, rss)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def _open(self, span: Span) -> None:
+        with self.lock:
+            self.open_spans.add(span)
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self._sample_rss, daemon=True)
+                self.sampler.start()
+
+    def _close(self, span: Span) -> None:
+        with self.lock:
+            self.open_spans.discard(span)
+        if not self.open_spans:
+            self.wake.set()
+
+    """
+    Span of a block of code. params: configured params of the step; kind: 'step', 'save', ...
+    join: when the current span of the thread has the same name and kind, the block runs in it instead of a
+    nested span (a processor method inside the span opened for its step by Project.step)
+    """
+    @contextmanager
+    def span(self, name: str, kind: str = 'step', params: dict = None, join: bool = False):
+        if not self.enabled:
+            yield None
+            return
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        if join and parent is not None and (parent.name, parent.kind) == (name, kind):
+            if params is not None:
+                parent.params = params
+            yield parent
+            return
+        span = Span(self, name, kind, parent, params)
+        stack.append(span)
+        self._open(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            stack.pop()
+            self._close(span)
+            self._finish(span, error)
+
+    """
+    Effective params of the current span (defaults of the processor merged with the configured params)
+    """
+    def annotate(self, params: dict) -> None:
+        span = self.current()
+        if span is not None:
+            span.effective_params = dict(params)
+
+    def _finish(self, span: Span, error: str) -> None:
+        wall = time.perf_counter() - span.wall_start
+        rss_end = self.rss()
+        max_rss_end = _max_rss()
+        # a new high-water mark during the span is its exact peak, otherwise use the sampled peak
+        peak_rss = max_rss_end if max_rss_end > span.max_rss_start else max(span.peak_rss, rss_end)
+        if span.parent is not None:
+            span.parent.children_time += wall
+            span.parent.save_time += wall if span.kind == 'save' else span.save_time
+        record = {
+            'id': span.id,
+            'parent': span.parent.id if span.parent is not None else None,
+            'name': span.name,
+            'kind': span.kind,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'start': span.start,
+            'wall': wall,
+            'self': wall - span.children_time,
+            'save': span.save_time,
+            'cpu': self.cpu_time() - span.cpu_start,
+            'rss_start': span.rss_start,
+            'rss_end': rss_end,
+            'peak_rss': peak_rss,
+            'params': span.params,
+            'effective_params': span.effective_params,
+            'error': error
+        }
+        self.write(record)
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, default=str) + "\n"    # Metashape enums as strings
+        with self.lock:
+            with open(self.trace_file, 'a') as f:
+                f.write(line)
+
+"""
+Decorator of the processor methods: span named after the method, configured params from the kwargs;
+the span of the step opened by Project.step is used when there is one
+"""
+def traced(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        params = {name: value for name, value in kwargs.items() if name not in ('progress_printer', 'path')}
+        with self.project.tracer.span(method.__name__, params=params, join=True):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+"""
+Spans of a trace file, in completion order
+"""
+def read_trace(trace_file: str) -> list:
+    spans = []
+    with open(trace_file, 'r') as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue    # line truncated by an interrupted run
+    return spans
+
+"""
+Total per step of the top level 'step' spans: {name: {'count', 'wall', 'compute', 'save', 'cpu', 'peak_rss'}}.
+The trace file is appended by every run of the project: since (time) keeps only the spans of the run started then.
+Failed spans are left out.
+"""
+def summarize_trace(spans: list, since: float = None) -> dict:
+    summary = {}
+    for span in spans:
+        if span['kind'] != 'step' or span['parent'] is not None or span.get('error'):
+            continue
+        if since is not None and span['start'] < since:
+            continue
+        entry = summary.setdefault(span['name'], {'count': 0, 'wall': 0.0, 'compute': 0.0, 'save': 0.0, 'cpu': 0.0, 'peak_rss': 0})
+        entry['count'] += 1
+        entry['wall'] += span['wall']
+        entry['compute'] += span['wall'] - span['save']
+        entry['save'] += span['save']
+        entry['cpu'] += span['cpu']
+        entry['peak_rss'] = max(entry['peak_rss'], span['peak_rss'])
+    return summary
@@ -1,10 +1,10 @@
-import logging
-import psutil
-import csv
 import time
 import threading
-import subprocess
+from collections import deque
+from contextlib import contextmanager
 from src.singleton_meta import SingletonMeta
+from src.metrics_backends import select_backend
+from src.monitor_store import open_store, PHASE_SIZE, PROCESS_COLUMNS, IO_COLUMNS
 from typing import Tuple
 
 
@@ -13,89 +13,203 @@ Sistema per il monitoraggio dei task svolti.
 """
 
 class SystemMonitor(metaclass=SingletonMeta):
-    # log_file: file csv 
-    # time: sec 
-    def __init__(self, log_file: str, time: int = 30) -> None:
-        logging.basicConfig(filename=log_file, level=logging.INFO, filemode='a', format='%(name)s;%(message)s')
-        self.logger = None
-        self.running = False
+    # log_file: monitor.bin (src/monitor_store.py), or .csv for the text format
+    # time: sec, max interval between two samples (steady state)
+    # backend: source of the metrics (src/metrics_backends.py), default chosen by select_backend
+    # min_time: sec, interval after a step boundary and when the metrics change sharply
+    # burst: sec of fast sampling after a step boundary
+    # threshold: change (percentage points of CPU, RAM, GPU usage or GPU memory) that restarts the fast sampling
+    # buffer_size: samples kept in memory before being written
+    # flush_time: sec, max time a sample stays in memory
+    # progress_interval: sec, min interval between two progress events recorded for a step
+    def __init__(self, log_file: str, time: int = 30, backend=None, min_time: float = 0.5, burst: float = 10,
+                 threshold: float = 10, buffer_size: int = 512, flush_time: float = 60, progress_interval: float = 1) -> None:
         self.time = time
+        self.min_time = min_time
+        self.burst = burst
+        self.threshold = threshold
         self.log_file = log_file
+        self.backend = backend if backend is not None else select_backend()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.phases = []        # labels of the active phases, in start order
+        self.boundary = 0       # time of the last phase change
+        self.closed = False
+        self.thread = None      # single sampling thread of the run, started by the first phase
+        self.buffer = deque(maxlen=buffer_size)     # rows not written yet
+        self.flush_time = flush_time
+        self.last_flush = 0
+        self.previous = None    # metrics of the previous sample
+        self.latest = None      # latest sample, read by the metrics endpoint (src/run_metrics.py)
+        self.progress_interval = progress_interval
+        self.progress_buffer = []   # progress events not written yet
+        self.progress_last = {}     # step: (time, percent) of the last event recorded
 
-        self.create_csv()
+        self.create_store()
 
+    """
+    Sampling loop of the monitor thread, while a phase is active: every min_time sec for burst sec after a
+    phase change or after a sharp change of the metrics, then the interval doubles up to self.time.
+    Waits without sampling when no phase is active. The wait is interrupted as soon as the phases change or the monitor is closed.
+    """
+    def run(self) -> None:
+        interval = self.min_time
+        while True:
+            with self.lock:
+                if self.closed:
+                    break
+                module_name = '+'.join(self.phases)  # steps running at the same time share the samples
+                boundary = self.boundary
+                self.wake.clear()
+            if module_name:
+                metrics = self.sample(module_name)
+                interval = self.next_interval(metrics, interval, boundary)
+                self.wake.wait(interval)
+            else:
+                self.flush()
+                self.previous = None
+                self.wake.wait()
+        self.flush()
+
+    def next_interval(self, metrics: list, interval: float, boundary: float) -> float:
+        previous, self.previous = self.previous, metrics
+        if time.time() - boundary < self.burst:
+            return self.min_time
+        if previous is not None and len(previous) == len(metrics) and \
+                max(abs(a - b) for a, b in zip(metrics, previous)) >= self.threshold:
+            return self.min_time
+        return min(interval * 2, self.time)
+
+    """
+    Take a sample into the buffer, written when the buffer is full or its oldest row is flush_time sec old:
+    system-wide CPU (with its iowait share) and RAM, totals of the process tree (current process and children), disk and network rates and GPUs.
+    Returns the metrics compared between samples: CPU %, RAM %, usage % and memory % of every GPU
+    """
+    def sample(self, module_name: str) -> list:
+        cpu_usage, cpu_core_usage, cpu_iowait = self.log_cpu()
+        ram_usage, ram_total, ram_available, ram_active, ram_used = self.log_ram()
+        process = self.log_process()
+        io = self.log_io()
+        gpus = self.backend.gpus()
+        if not self.buffer:
+            self.last_flush = time.time()
+        self.buffer.append((time.time(), module_name.encode('utf-8')[:PHASE_SIZE], cpu_usage, cpu_iowait, cpu_core_usage,
+                            ram_usage, ram_active, ram_total, ram_available, ram_used, *process, *io,
+                            [gpu['temp'] for gpu in gpus], [gpu['utilization'] for gpu in gpus], [gpu['mem_used'] for gpu in gpus]))
+        self.latest = {'time': time.time(), 'phase': module_name, 'cpu': cpu_usage, 'iowait': cpu_iowait, 'ram_usage': ram_usage, 'ram_used': ram_used, 'ram_available': ram_available,
+                       'process': dict(zip((name[len('proc_'):] for name, _, _ in PROCESS_COLUMNS), process)),
+                       'io': dict(zip((name for name, _, _ in IO_COLUMNS), io)),
+                       'disks': self.backend.disks, 'nics': self.backend.nics, 'gpus': gpus}
+        if len(self.buffer) == self.buffer.maxlen or time.time() - self.last_flush >= self.flush_time:
+            self.flush()
+        metrics = [cpu_usage, ram_usage]
+        for gpu in gpus:
+            metrics += [gpu['utilization'], gpu['mem_used'] / gpu['mem_total'] * 100 if gpu['mem_total'] else 0]
+        return metrics
+
+    """
+    Record a progress callback of a step, at most one every progress_interval sec per step
+    (the first and the 100% ones always); written with the samples
+    """
+    def progress(self, step: str, percent: float) -> None:
+        now = time.time()
+        with self.lock:
+            last = self.progress_last.get(step)
+            if last is not None and now - last[0] < self.progress_interval and percent < 100:
+                return
+            if last is not None and percent == last[1]:
+                return
+            self.progress_last[step] = (now, percent)
+            self.progress_buffer.append((now, step.encode('utf-8')[:PHASE_SIZE], percent))
+
+    """
+    Write the buffered samples and progress events to the store, in a single write each
+    """
+    def flush(self) -> None:
+        rows = []
+        while self.buffer:
+            rows.append(self.buffer.popleft())
+        self.store.append(rows)
+        with self.lock:
+            events, self.progress_buffer = self.progress_buffer, []
+        self.store.append_progress(events)
+
+    def _start_thread(self) -> None:
+        if self.thread is None:
+            self.closed = False
+            self.thread = threading.Thread(target=self.run, name='SystemMonitor', daemon=True)
+            self.thread.start()
+
+    """
+    Samples taken inside the block are labelled with name; the first one is taken on entering
+    """
+    @contextmanager
+    def phase(self, name: str):
+        self.start(name)
+        try:
+            yield self
+        finally:
+            with self.lock:
+                if name in self.phases:
+                    self.phases.remove(name)
+                self.boundary = time.time()
+                self.wake.set()
+
+    # start labelling the samples with module_name, until stop()
     def start(self, module_name: str) -> None:
-        self.running = True
-        self.logger = logging.getLogger(module_name)
-        while self.running:
-            cpu_usage, cpu_core_usage = self.log_cpu()
-            ram_usage, ram_total, ram_available, ram_active, ram_used = self.log_ram()
-            gpu_info = self.log_gpu()
-            gpu_info_filter = [{entry: info[entry] for entry in ('temp', 'cpu_usage', 'mem_used')} for info in gpu_info]
-            self.logger.info(f'{time.time()}; {cpu_usage}; {cpu_core_usage}; {ram_usage}; {ram_active} GB; {ram_total} GB; {ram_available} GB; {ram_used} GB; {gpu_info_filter}')
-            #for stat in stats:
-                # self.logger.info(f'{time.time()}; {cpu_usage}; {cpu_core_usage}; {ram_usage}; {ram_active} GB; {ram_total} GB; {ram_available} GB; {ram_used} GB; {stat["id"]}; {stat["model"]}; {stat["temp"]}; {stat["cpu_usage"]}; {stat["mem_used"]}/{stat["mem_total"]} MB')
-            time.sleep(self.time)  # every 30 sec
+        with self.lock:
+            self._start_thread()
+            self.phases.append(module_name)
+            self.boundary = time.time()
+            self.wake.set()
 
     def stop(self) -> None:
-        self.running = False
-    
-    def create_csv(self) -> None:
-        header = ['Modulo', 'Time', 'CPU usage %', 'Cores usage %', 'RAM usage %', 'RAM active', 'RAM total', 'RAM Available', 'RAM Used']
-        gpu_info = self.log_gpu()   # get gpu header info
-        header_info = [f'GPUs: {[{entry: info[entry] for entry in ("id", "model", "mem_total")} for info in gpu_info]}']
-
-        with open(self.log_file, 'w', newline='') as file:
-            writer = csv.writer(file, delimiter=';')
-            writer.writerow(header + header_info)
-
-    def parese_dataram(self, ram_memory) -> float:
-        # Convert in GB and exclude the decimal part
-        ram_memory = ram_memory / (1024 * 1024 * 1024)
-        return ram_memory
-
-    def parse_gpustat(self, gpustat_output) -> list:
-        lines = gpustat_output.split('\n')
-        stats = []
-        for i, line in enumerate(lines):
-            if line and i != 0: # check empty row and avoid timestamp row
-                parts = line.split("|")
-                id_gpumodel = parts[0].split()
-                temp_gpu = parts[1].split()
-                memgpu = parts[2].split()
-                stat = {
-                    'id': id_gpumodel[0],
-                    'model': ''.join(id_gpumodel[1:]),
-                    'temp': temp_gpu[0][:-1],
-                    'cpu_usage': ''.join(temp_gpu[1:]),
-                    'mem_used': memgpu[0],
-                    'mem_total': ''.join(memgpu[2:])
-                }
-                stats.append(stat)
-        return stats
-
-    def log_cpu(self) -> Tuple[float, list]:
-        cpu_usage = psutil.cpu_percent(interval=None, percpu=False) # avg from last call (delta_t)
-        cpu_core_usage = psutil.cpu_percent(interval=None, percpu=True)    # percpu floating for each core cpu
-        return cpu_usage, cpu_core_usage
+        with self.lock:
+            self.phases = []
+            self.boundary = time.time()
+            self.wake.set()
+
+    """
+    Stop the monitor thread and write the buffered samples, at the end of the run
+    """
+    def close(self) -> None:
+        with self.lock:
+            self.phases = []
+            self.closed = True
+            self.wake.set()
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    """
+    Create the sample file, its header describes the cores, the GPUs, the disks and the network interfaces of the node
+    """
+    def create_store(self) -> None:
+        cores = len(self.log_cpu()[1])
+        gpus = [{entry: gpu[entry] for entry in ('id', 'model', 'mem_total')} for gpu in self.backend.gpus()]
+        self.store = open_store(self.log_file, cores, gpus, self.backend.disks, self.backend.nics)
+
+    def log_cpu(self) -> Tuple[float, list, float]:
+        cpu_usage, cpu_core_usage, cpu_iowait = self.backend.cpu()  # avg from last call (delta_t), total, for each core and iowait
+        return cpu_usage, cpu_core_usage, cpu_iowait
 
     def log_ram(self) -> Tuple[float, float, float, float, float]:
-        ram_usage = psutil.virtual_memory().percent
-        ram_total = self.parese_dataram(psutil.virtual_memory().total)
-        ram_available = self.parese_dataram(psutil.virtual_memory().available)
-        ram_active = self.parese_dataram(psutil.virtual_memory().active)
-        ram_used = self.parese_dataram(psutil.virtual_memory().used)
+        ram_usage, ram_total, ram_available, ram_active, ram_used = self.backend.ram()     # GB
         return ram_usage, ram_total, ram_available, ram_active, ram_used
 
-    def log_gpu(self) -> list:
-        result = subprocess.run(['gpustat'], stdout=subprocess.PIPE)
-        stats_str = result.stdout.decode('utf-8')
-        stats = self.parse_gpustat(stats_str)
-        return stats
+    # totals of the current process and its children, in the order of PROCESS_COLUMNS
+    def log_process(self) -> tuple:
+        process = self.backend.processes()
+        return tuple(process[name[len('proc_'):]] for name, _, _ in PROCESS_COLUMNS)
+
+    # per-device rates since the previous sample, in the order of IO_COLUMNS
+    def log_io(self) -> tuple:
+        io = self.backend.io()
+        return tuple(io[name] for name, _, _ in IO_COLUMNS)
 
 if __name__ == "__main__":
-    monitor = SystemMonitor('system.csv')
-    thread = threading.Thread(target=monitor.start, args=('TestSystemMonitor',))
-    thread.start()
-    time.sleep(20)
-    monitor.stop()
\ No newline at end of file
+    monitor = SystemMonitor('system.bin')
+    with monitor.phase('TestSystemMonitor'):
+        time.sleep(20)
+    monitor.close()
\ No newline at end of file
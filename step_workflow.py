@@ -3,18 +3,36 @@ import argparse
 import json
 import yaml
 import os
+import time
+import psutil
+import Metashape
 from src.progress_printer import ProgressPrinter
+from src.progress_sinks import ProgressAggregator
 from src.settings import Settings
 from src.project import Project
+from src.checkpoint_policy import CheckpointPolicy
 from src.photo_processor import PhotoProcessor
 from src.point_cloud_processor import PointCloudProcessor
 from src.mesh_processor import MeshProcessor
 from src.geographic_projection import GeographicProjection
+from src.step_graph import Step, StepGraph, STEP_DEPENDENCIES
+from src.parallel_export import run_parallel_exports
+from src.run_manifest import RunManifest
+from src.run_planner import plan_run, format_plan, image_megapixels, read_history
+from src.memory_guard import MemoryGuard
+from src.run_metrics import MetricsServer
+from src.metrics_backends import select_backend
 
 input_images_folder = ""
 output_save_folder = "."
 image_files = []
 flag_monitoring = False
+max_parallel_steps = 1
+flag_resume = False
+export_workers = 1
+metrics_port = None
+history_folders = []
+progress_interval = 1
 
 valid_steps = ['settings', 'project', 'PhotoProcessor', 'PointCloudProcessor', "3DModelProcessor", "OrthoAndDEMCreation", "exportResults"]
 
@@ -22,6 +40,131 @@ valid_steps = ['settings', 'project', 'PhotoProcessor', 'PointCloudProcessor', "
 def is_file_path(path: str) -> bool:
     return os.path.splitext(path)[1] != ''
 
+# step running method with a fresh ProgressPrinter and the step params (hashed in the run manifest)
+def processor_step(name: str, method, label: str, condition=None, **kwargs) -> Step:
+    def action() -> None:
+        prj = Project.get_project()
+        with prj.step(name):   # checkpoint policy, document shared with the running steps
+            params = prj.adapt_params(name, kwargs)     # memory guard
+            step.effective_params = params              # hashed in the run manifest
+            printer = ProgressPrinter(label, listener=lambda percent: prj.progress(name, percent))
+            try:
+                method(progress_printer=printer, **params)
+            finally:
+                printer.close()
+    step = Step(name, action, condition=condition, params=kwargs)
+    return step
+
+"""
+Step running the exports of exportResults in export_workers processes, after every step they depend on
+"""
+def parallel_export_step(exports: dict, prj: Project) -> Step:
+    depends_on = []
+    for name in exports:
+        depends_on += [dep for dep in STEP_DEPENDENCIES.get(name, []) if dep not in depends_on]
+
+    def action() -> None:
+        with prj.tracer.span('exportResults', params={'exports': exports, 'workers': export_workers}):
+            # workers read the project from disk: saved before, and not saved again while they read it
+            with prj.step('exportResults', save_before=True), prj.monitor_phase('exportResults'):
+                run_parallel_exports(prj.project_path, exports, output_save_folder, export_workers)
+    return Step('exportResults', action, depends_on=depends_on, resources=[], params={'exports': exports, 'path': output_save_folder})
+
+"""
+Costruisce il grafo degli step scelti: le dipendenze tra gli step sono dichiarate in src/step_graph.py,
+l'ordine di inserimento corrisponde all'esecuzione sequenziale
+"""
+def build_step_graph(steps_params_to_run: dict, prj: Project) -> StepGraph:
+    graph = StepGraph()
+    # exports required in exportResults run once, at that stage
+    final_exports = steps_params_to_run.get('exportResults', {})
+
+    # check chunk location in the world coordinate system: scale component, rotation component, translation component
+    def is_georeferenced() -> bool:
+        return bool(prj.chunk.transform.scale and prj.chunk.transform.rotation and prj.chunk.transform.translation)
+
+    if 'PhotoProcessor' in steps_params_to_run:
+        params = steps_params_to_run['PhotoProcessor']
+        photoprocess = PhotoProcessor(photos_path=image_files)
+        # the photo list is the input of addPhotos
+        def add_photos() -> None:
+            printer = ProgressPrinter("addPhotos", listener=lambda percent: prj.progress('addPhotos', percent))
+            try:
+                with prj.step('addPhotos'):
+                    photoprocess.addPhotos(progress_printer=printer)
+            finally:
+                printer.close()
+        graph.add_step(Step('addPhotos', add_photos, params={'photos': sorted(image_files)}))
+        graph.add_step(processor_step('filterImageQuality', photoprocess.filterImageQuality, "filterPhotos"))
+        for name in ('matchPhotos', 'alignCameras', 'optimizeCameras'):
+            if name in params:
+                graph.add_step(processor_step(name, getattr(photoprocess, name), name, **params[name]))
+
+    if 'PointCloudProcessor' in steps_params_to_run:
+        params = steps_params_to_run['PointCloudProcessor']
+        pointcloudprocess = PointCloudProcessor()
+        if 'buildDepthMaps' in params:
+            graph.add_step(processor_step('buildDepthMaps', pointcloudprocess.buildDepthMaps, "buildDepthMaps", **params['buildDepthMaps']))
+        if 'buildPointCloud' in params:
+            graph.add_step(processor_step('buildPointCloud', pointcloudprocess.buildPointCloud, "buildPointCloud", condition=is_georeferenced, **params['buildPointCloud']))
+            if 'maxconf' in params['buildPointCloud']:
+                maxconf = params['buildPointCloud']['maxconf']
+                def filter_point_cloud() -> None:
+                    with prj.step('filterPointCloud'):
+                        pointcloudprocess.filterPointCloud(maxconf)
+                graph.add_step(Step('filterPointCloud', filter_point_cloud, condition=is_georeferenced, params={'maxconf': maxconf}))
+        if 'colorizePointCloud' in params:
+            graph.add_step(processor_step('colorizePointCloud', pointcloudprocess.colorizePointCloud, "colorizePointCloud", condition=is_georeferenced))
+        if 'exportPointCloud' in params and 'exportPointCloud' not in final_exports:
+            graph.add_step(processor_step('exportPointCloud', pointcloudprocess.exportPointCloud, "exportPointCloud", condition=is_georeferenced, path=output_save_folder, **params['exportPointCloud']))
+
+    if "3DModelProcessor" in steps_params_to_run:
+        params = steps_params_to_run['3DModelProcessor']
+        meshprocess = MeshProcessor()
+        if 'buildModel' in params:
+            graph.add_step(processor_step('buildModel', meshprocess.buildModel, "buildModel", **params['buildModel']))
+            graph.add_step(processor_step('colorizeModel', meshprocess.colorizeModel, "colorizeModel"))
+        for name in ('buildUV', 'buildTexture', 'buildTiledModel'):
+            if name in params:
+                graph.add_step(processor_step(name, getattr(meshprocess, name), name, **params[name]))
+        for name in ('exportTiledModel', 'exportModel', 'exportTexture'):
+            if name in params and name not in final_exports:
+                graph.add_step(processor_step(name, getattr(meshprocess, name), name, path=output_save_folder, **params[name]))
+
+    if "OrthoAndDEMCreation" in steps_params_to_run:
+        params = steps_params_to_run['OrthoAndDEMCreation']
+        orthodemprocess = GeographicProjection()
+        if 'buildDem' in params:
+            graph.add_step(processor_step('buildDem', orthodemprocess.buildDem, "buildDem", condition=is_georeferenced))
+            if 'exportDEM' in params and 'exportDEM' not in final_exports:
+                graph.add_step(processor_step('exportDEM', orthodemprocess.exportDEM, "exportDEM", condition=is_georeferenced, path=output_save_folder, **params['exportDEM']))
+        if 'buildOrtho' in params:
+            graph.add_step(processor_step('buildOrthomosaic', orthodemprocess.buildOrthomosaic, "buildOrtho", condition=is_georeferenced))
+            for name in ('exportOrthomosaic', 'exportOrthophotos'):
+                if name in params and name not in final_exports:
+                    graph.add_step(processor_step(name, getattr(orthodemprocess, name), name, condition=is_georeferenced, path=output_save_folder, **params[name]))
+
+    if 'exportResults' in steps_params_to_run and export_workers > 1:
+        graph.add_step(parallel_export_step(final_exports, prj))
+    elif 'exportResults' in steps_params_to_run:
+        orthodemprocess = GeographicProjection()
+        meshprocess = MeshProcessor()
+        pointcloudprocess = PointCloudProcessor()
+        export_methods = {
+            'exportDEM': orthodemprocess.exportDEM,
+            'exportOrthomosaic': orthodemprocess.exportOrthomosaic,
+            'exportModel': meshprocess.exportModel,
+            'exportPointCloud': pointcloudprocess.exportPointCloud,
+            'exportTiledModel': meshprocess.exportTiledModel,
+            'exportTexture': meshprocess.exportTexture,
+            'exportOrthophotos': orthodemprocess.exportOrthophotos
+        }
+        for name, method in export_methods.items():
+            if name in final_exports:
+                graph.add_step(processor_step(name, method, name, path=output_save_folder, **final_exports[name]))
+
+    return graph
+
 """
 Core: esecuzione dei singoli steps scelti 
 """
@@ -53,16 +196,31 @@ def execute_steps(steps_params_to_run: dict) -> None:
             _, extension = os.path.splitext(steps_params_to_run['project']['path'])
             if extension.lower() in ['.psx', '.psz']:
                 project_folder = os.path.dirname(abs_path)  # Cartella che contiene il file
-                prj = Project(project_path=abs_path, enable_monitoring=flag_monitoring)
+                prj = Project(project_path=abs_path, enable_monitoring=flag_monitoring, progress_interval=progress_interval)
                 prj.load_project()
             else:
                 raise TypeError("Estenzione file non conforme a .psx/.psz di Metashape")
         else: 
             # define new project name_project.psx
-            prj = Project(project_path=abs_path.rstrip('/') + "/"+ os.path.basename(abs_path.rstrip('/')) +".psx", enable_monitoring=flag_monitoring)
-            prj.new_project()
+            prj = Project(project_path=abs_path.rstrip('/') + "/"+ os.path.basename(abs_path.rstrip('/')) +".psx", enable_monitoring=flag_monitoring, progress_interval=progress_interval)
+            if flag_resume and os.path.exists(prj.project_path):
+                prj.load_project()  # resume the interrupted project instead of overwriting it
+            else:
+                prj.new_project()
+                RunManifest(RunManifest.project_manifest_path(prj.project_path)).reset()
             project_folder = abs_path.rstrip('/')  # Se è una cartella, resta invariato
         
+        # checkpoint policy, e.g. project: {checkpoint: {mode: before_expensive}}
+        prj.set_checkpoint_policy(CheckpointPolicy.from_config(steps_params_to_run['project'].get('checkpoint')))
+        # progress output, e.g. project: {progress: {sinks: [tty, {type: log, path: progress.log}], interval: 5}}
+        progress = ProgressAggregator.from_config(steps_params_to_run['project'].get('progress'))
+        # memory guard, e.g. project: {memory_guard: {headroom: 0.8}}; predictions from --history runs when given
+        megapixels = image_megapixels(image_files)
+        prj.set_memory_guard(MemoryGuard.from_config(steps_params_to_run['project'].get('memory_guard'),
+                                                     workflow=steps_params_to_run, images=len(image_files), megapixels=megapixels,
+                                                     histories=[read_history(folder, steps_params_to_run, len(image_files), megapixels) for folder in history_folders],
+                                                     monitor=prj.monitoring, tracer=prj.tracer, region=prj.region_size))
+
         # path of saving reports and exports
         global output_save_folder
         if output_save_folder == ".":
@@ -72,116 +230,28 @@ def execute_steps(steps_params_to_run: dict) -> None:
     else:
         raise Exception("Non è stato specificato un save path o load project")
 
-    if 'PhotoProcessor' in steps_params_to_run:
-        photoprocess = PhotoProcessor(photos_path=image_files)
-        photoprocess.addPhotos(progress_printer=ProgressPrinter("addPhotos"))
-        photoprocess.filterImageQuality(progress_printer=ProgressPrinter("filterPhotos"))
-        if 'matchPhotos' in steps_params_to_run['PhotoProcessor']:
-            photoprocess.matchPhotos(progress_printer=ProgressPrinter("matchPhotos"), **steps_params_to_run['PhotoProcessor']['matchPhotos'])
-        #else: # do it by default NOTE
-        #    photoprocess.matchPhotos(progress_printer=ProgressPrinter("matchPhotos"))
-        if 'alignCameras' in steps_params_to_run['PhotoProcessor']:
-            photoprocess.alignCameras(progress_printer=ProgressPrinter("alignCameras"), **steps_params_to_run['PhotoProcessor']['alignCameras'])
-        #else: # do it by default NOTE
-        #    photoprocess.alignCameras(progress_printer=ProgressPrinter("alignCameras"))
-        if 'optimizeCameras' in steps_params_to_run['PhotoProcessor']:
-            photoprocess.optimizeCameras(progress_printer=ProgressPrinter("optimizeCameras"), **steps_params_to_run['PhotoProcessor']['optimizeCameras'])
-        
-        print(" == == == PhotoProcessor == == ==")
-
-    if 'PointCloudProcessor' in steps_params_to_run:
-        pointcloudprocess = PointCloudProcessor()
-        if 'buildDepthMaps' in steps_params_to_run['PointCloudProcessor']:
-            pointcloudprocess.buildDepthMaps(progress_printer=ProgressPrinter("buildDepthMaps"), **steps_params_to_run['PointCloudProcessor']['buildDepthMaps'])
-        #else: # do it by default
-        #    pointcloudprocess.buildDepthMaps(progress_printer=ProgressPrinter("buildDepthMaps"))
-
-        """
-        check chunk location in the world coordinate system: scale component, rotation component, translation component
-        """
-        if (pointcloudprocess.project.chunk.transform.scale and 
-            pointcloudprocess.project.chunk.transform.rotation and 
-            pointcloudprocess.project.chunk.transform.translation):
-            if 'buildPointCloud' in steps_params_to_run['PointCloudProcessor']:
-                pointcloudprocess.buildPointCloud(progress_printer=ProgressPrinter("buildPointCloud"), **steps_params_to_run['PointCloudProcessor']['buildPointCloud'])
-            #else:
-            #    pointcloudprocess.buildPointCloud(progress_printer=ProgressPrinter("buildPointCloud"))
-                if 'maxconf' in steps_params_to_run['PointCloudProcessor']['buildPointCloud']:
-                    pointcloudprocess.filterPointCloud(steps_params_to_run['PointCloudProcessor']['buildPointCloud']['maxconf'])
-            if 'colorizePointCloud' in steps_params_to_run['PointCloudProcessor']:
-                pointcloudprocess.colorizePointCloud(progress_printer=ProgressPrinter("colorizePointCloud"))
-            if 'exportPointCloud' in steps_params_to_run['PointCloudProcessor']:
-                pointcloudprocess.exportPointCloud(progress_printer=ProgressPrinter("exportPointCloud"), path=output_save_folder,  **steps_params_to_run['PointCloudProcessor']['exportPointCloud'])
-
-        print(" == == == PointCloudProcessor == == ==")
+    # run size, config and Metashape version next to the monitor samples, history for the next --plan and reports/compare.py
+    with open(os.path.join(os.path.dirname(prj.project_path), 'run_info.json'), 'w') as f:
+        json.dump({'images': len(image_files), 'megapixels': image_megapixels(image_files), 'workflow': steps_params_to_run,
+                   'time': time.time(), 'metashape': Metashape.app.version}, f, indent=4)
 
-    if "3DModelProcessor" in steps_params_to_run:
-        meshprocess = MeshProcessor()
-        if 'buildModel' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.buildModel(progress_printer=ProgressPrinter("buildModel"), **steps_params_to_run['3DModelProcessor']['buildModel'])
-            #else: # do it by default
-            #    meshprocess.buildModel(progress_printer=ProgressPrinter("buildModel"))
-            meshprocess.colorizeModel(progress_printer=ProgressPrinter("colorizeModel"))
-        if 'buildUV' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.buildUV(progress_printer=ProgressPrinter("buildUV"), **steps_params_to_run['3DModelProcessor']['buildUV'])
-        #else: # do it by default
-        #    meshprocess.buildUV(progress_printer=ProgressPrinter("buildUV"))
-        if 'buildTexture' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.buildTexture(progress_printer=ProgressPrinter("buildTexture"), **steps_params_to_run['3DModelProcessor']['buildTexture'])
-        #else: # do it by default
-        #    meshprocess.buildTexture(progress_printer=ProgressPrinter("buildTexture"))
-        if 'buildTiledModel' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.buildTiledModel(progress_printer=ProgressPrinter("buildTiledModel"), **steps_params_to_run['3DModelProcessor']['buildTiledModel'])
-        #else: # do it by default
-        #    meshprocess.buildTiledModel(progress_printer=ProgressPrinter("buildTiledModel"))
-        if 'exportTiledModel' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.exportTiledModel(progress_printer=ProgressPrinter('exportTiledModel'), path=output_save_folder,  **steps_params_to_run['3DModelProcessor']['exportTiledModel'])
-        if 'exportModel' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.exportModel(progress_printer=ProgressPrinter("exportModel"), path=output_save_folder,  **steps_params_to_run['3DModelProcessor']['exportModel'])
-        if 'exportTexture' in steps_params_to_run['3DModelProcessor']:
-            meshprocess.exportTexture(progress_printer=ProgressPrinter('exportTexture'), path=output_save_folder,  **steps_params_to_run['3DModelProcessor']['exportTexture'])
-
-        print(" == == == 3DModelProcessor == == ==")
+    # current step, progress and monitor readings for the cluster dashboards
+    server = None
+    if metrics_port is not None:
+        server = MetricsServer(prj.metrics, metrics_port)
+        server.start()
 
-    if "OrthoAndDEMCreation" in steps_params_to_run:
-        orthodemprocess = GeographicProjection()
-        if (orthodemprocess.project.chunk.transform.scale and 
-            orthodemprocess.project.chunk.transform.rotation and 
-            orthodemprocess.project.chunk.transform.translation):
-            if 'buildDem' in steps_params_to_run['OrthoAndDEMCreation']:
-                orthodemprocess.buildDem(progress_printer=ProgressPrinter("buildDem"))
-                if 'exportDEM' in steps_params_to_run['OrthoAndDEMCreation']:
-                    orthodemprocess.exportDEM(progress_printer=ProgressPrinter("exportDEM"), path=output_save_folder, **steps_params_to_run['OrthoAndDEMCreation']['exportDEM'])
-            if 'buildOrtho' in steps_params_to_run['OrthoAndDEMCreation']:
-                orthodemprocess.buildOrthomosaic(progress_printer=ProgressPrinter("buildOrtho"))
-                if 'exportOrthomosaic' in steps_params_to_run['OrthoAndDEMCreation']:
-                    orthodemprocess.exportOrthomosaic(progress_printer=ProgressPrinter("exportOrthomosaic"), path=output_save_folder,  **steps_params_to_run['OrthoAndDEMCreation']['exportOrthomosaic'])
-                if 'exportOrthophotos' in steps_params_to_run['OrthoAndDEMCreation']:
-                    orthodemprocess.exportOrthophotos(progress_printer=ProgressPrinter('exportOrthophotos'), path= output_save_folder, **steps_params_to_run['exportResults']['exportOrthophotos'])
-
-        print(" == == == OrthoAndDEMCreation == == ==")
-
-    if 'exportResults' in steps_params_to_run:
-        orthodemprocess = GeographicProjection()
-        meshprocess = MeshProcessor()
-        pointcloudprocess = PointCloudProcessor()
-        if 'exportDEM' in steps_params_to_run['exportResults']:
-            orthodemprocess.exportDEM(progress_printer=ProgressPrinter("exportDEM"), path=output_save_folder, **steps_params_to_run['exportResults']['exportDEM'])
-        if 'exportOrthomosaic' in steps_params_to_run['exportResults']:
-            orthodemprocess.exportOrthomosaic(progress_printer=ProgressPrinter("exportOrthomosaic"), path=output_save_folder,  **steps_params_to_run['exportResults']['exportOrthomosaic'])
-        if 'exportModel' in steps_params_to_run['exportResults']:
-            meshprocess.exportModel(progress_printer=ProgressPrinter("exportModel"), path=output_save_folder,  **steps_params_to_run['exportResults']['exportModel'])
-        if 'exportPointCloud' in steps_params_to_run['exportResults']:
-            pointcloudprocess.exportPointCloud(progress_printer=ProgressPrinter("exportPointCloud"), path=output_save_folder,  **steps_params_to_run['exportResults']['exportPointCloud'])
-        if 'exportTiledModel' in steps_params_to_run['exportResults']:
-            meshprocess.exportTiledModel(progress_printer=ProgressPrinter('exportTiledModel'), path=output_save_folder,  **steps_params_to_run['exportResults']['exportTiledModel'])
-        if 'exportTexture' in steps_params_to_run['exportResults']:
-            meshprocess.exportTexture(progress_printer=ProgressPrinter('exportTexture'), path=output_save_folder,  **steps_params_to_run['exportResults']['exportTexture'])
-        if 'exportOrthophotos' in steps_params_to_run['exportResults']:
-            orthodemprocess.exportOrthophotos(progress_printer=ProgressPrinter('exportOrthophotos'), path= output_save_folder, **steps_params_to_run['exportResults']['exportOrthophotos'])
-
-
-        print(" == == == exportResults == == ==")
+    manifest = RunManifest(RunManifest.project_manifest_path(prj.project_path))
+    graph = build_step_graph(steps_params_to_run, prj)
+    prj.add_save_listener(manifest.mark_saved)
+    try:
+        graph.run(max_workers=max_parallel_steps, manifest=manifest, resume=flag_resume, is_saved=prj.is_saved, track=prj.metrics.step)
+    finally:
+        progress.close()
+        if server is not None:
+            server.close()
+    prj.finalize()
+    print(" == == == Steps completed == == ==")
 
     # TODO: usare task https://www.agisoft.com/forum/index.php?topic=11428.msg51371#msg51371
 
@@ -239,6 +309,13 @@ if __name__ == "__main__":
     parser.add_argument('-i', '--input', help='Path project photos')
     parser.add_argument('-o', '--output', help='Saving path project files')
     parser.add_argument('-m', '--monitoring', help="Enable monitoring", action='store_true')
+    parser.add_argument('-r', '--resume', help="Skip the steps already completed with the same parameters (run manifest next to the .psx)", action='store_true')
+    parser.add_argument('--export-workers', type=int, default=1, help="Processes running the exportResults exports at the same time, each opening the project read-only (default 1, sequential)")
+    parser.add_argument('--plan', help="Print the predicted time and peak RAM/VRAM of every step, without running the workflow", action='store_true')
+    parser.add_argument('--history', nargs='*', default=[], help="Folders of previous runs (run_info.json with monitor.bin/monitor.csv and/or trace.jsonl) used by --plan and by the memory guard")
+    parser.add_argument('-p', '--parallel', type=int, default=1, help="Max number of independent steps running at the same time (default 1, sequential)")
+    parser.add_argument('--progress-interval', type=float, default=1, help="Min seconds between two progress events of a step recorded with -m (default 1)")
+    parser.add_argument('--metrics-port', type=int, help="Serve the current step, progress, step durations and the latest monitor readings in Prometheus format on http://<node>:<port>/metrics")
     
     args = parser.parse_args()
     # check input folder
@@ -279,4 +356,24 @@ if __name__ == "__main__":
         flag_monitoring = True
         print("-- DEBUG: set monitoring")
 
+    if args.plan:
+        plan = plan_run(steps_params_to_run, len(image_files), image_megapixels(image_files), args.history)
+        ram_total = psutil.virtual_memory().total / (1024 * 1024 * 1024)
+        # the VRAM of the plan is per GPU: the smallest GPU of the node is the limit
+        backend = select_backend()
+        gpus = [gpu for gpu in backend.gpus() if gpu['mem_total']]    # boards reporting their memory
+        backend.close()
+        vram_total = min(gpu['mem_total'] for gpu in gpus) / 1024 if gpus else None
+        print(f"-- {len(image_files)} images, {image_megapixels(image_files):.1f} MP, node RAM {ram_total:.1f} GB" +
+              (f", GPU memory {vram_total:.1f} GB" if gpus else ""))
+        print(format_plan(plan, ram_limit=ram_total, vram_limit=vram_total))
+        raise SystemExit(0)
+
+    max_parallel_steps = max(1, args.parallel)
+    flag_resume = args.resume
+    export_workers = max(1, args.export_workers)
+    metrics_port = args.metrics_port
+    history_folders = args.history
+    progress_interval = args.progress_interval
+
     execute_steps(steps_params_to_run)
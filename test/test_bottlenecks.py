@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile, shutil
+from reports.report import Report
+from reports.bottlenecks import classify, intervals, bottlenecks, opportunities
+from src.monitor_store import MonitorStore
+from test.test_monitor_store import GPUS, DISKS, NICS, PROCESS
+
+QUIET = ([1.0, 0.0], [1.0, 0.0], [10.0, 0.0], [10.0, 0.0], [0.5], [0.5])
+BUSY_DISK = ([180.0, 0.0], [20.0, 0.0], [900.0, 0.0], [100.0, 0.0], [0.5], [0.5])
+
+# step: (seconds, CPU %, iowait %, cores %, RAM %, GPU usage %, I/O), a sample per second
+PROFILES = [
+    ('buildUV', 10, 26.0, 0.5, [100.0, 2.0, 1.0, 1.0], 30.0, [0, 0], QUIET),
+    ('buildDepthMaps', 10, 20.0, 0.5, [40.0, 20.0, 10.0, 10.0], 30.0, [95, 0], QUIET),
+    ('buildModel', 5, 40.0, 0.5, [40.0, 40.0, 40.0, 40.0], 95.0, [0, 0], QUIET),
+    ('alignCameras', 5, 92.0, 0.5, [90.0, 95.0, 90.0, 93.0], 30.0, [0, 0], QUIET),
+    ('exportModel', 5, 5.0, 45.0, [5.0, 5.0, 5.0, 5.0], 30.0, [0, 0], QUIET),
+    # disks busy but the CPU not waiting for them (page cache, read ahead)
+    ('buildDem', 5, 3.0, 0.5, [3.0, 3.0, 3.0, 3.0], 30.0, [0, 0], BUSY_DISK)
+]
+
+def profile_rows():
+    rows = []
+    for phase, seconds, cpu, iowait, cores, ram, gpu, io in PROFILES:
+        for _ in range(seconds):
+            rows.append((1715035659.0 + len(rows), phase.encode(), cpu, iowait, cores, ram, 9.8, 62.8, 40.0, 62.8 * ram / 100,
+                         *PROCESS, *io, [34, 35], gpu, [2048, 0]))
+    return rows
+
+class TestBottlenecks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        MonitorStore(os.path.join(self.tmpdirname, 'system.bin'), 4, GPUS, DISKS, NICS).append(profile_rows())
+        self.report = Report(self.tmpdirname)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_labels(self):
+        steps = bottlenecks(self.report)
+        self.assertEqual(steps['Bottleneck'].to_dict(), {'buildUV': 'CPU single-thread', 'buildDepthMaps': 'GPU', 'buildModel': 'memory',
+                                                         'alignCameras': 'CPU', 'exportModel': 'I/O wait', 'buildDem': 'idle'})
+        self.assertAlmostEqual(steps.loc['buildUV', 'CPU single-thread'], 10.0)
+        self.assertAlmostEqual(steps.loc['buildDem', 'Duration (seconds)'], 4.0)    # the last sample has no duration
+        self.assertEqual(len(classify(self.report)), 40)
+        parts = intervals(self.report)
+        self.assertEqual(list(parts['Step']), [name for name, *_ in PROFILES])
+        self.assertAlmostEqual(parts.loc[1, 'Start'], 10.0)
+        self.assertAlmostEqual(parts.loc[1, 'End'], 20.0)
+
+    def test_no_iowait(self):
+        # log of a previous version: disk rates but no iowait, no sample is labeled I/O wait
+        self.report.csv = self.report.csv.drop(columns='CPU iowait %')
+        self.assertNotIn('I/O wait', set(classify(self.report)))
+
+    def test_opportunities(self):
+        ranked = opportunities(self.report, {'settings': {'cpu_enable': False, 'gpu_mask': '01'}, 'PointCloudProcessor': {'buildDepthMaps': {'downscale': 2}}})
+        self.assertEqual(list(zip(ranked['Step'], ranked['Setting'], ranked['Change'])),
+                         [('buildDepthMaps', 'downscale', '2 -> 4'), ('buildDepthMaps', 'gpu_mask', '01 -> 11'), ('buildDepthMaps', 'cpu_enable', 'false -> true')])
+        self.assertEqual(list(ranked['Saved (seconds)']), [7.5, 5.0, 1.0])
+        ranked = opportunities(self.report, {'settings': {'cpu_enable': True}})
+        self.assertEqual(list(ranked['Setting']), ['gpu_mask'])
+        self.assertEqual(ranked.loc[0, 'Change'], 'all enabled, 1 of 2 busy')
+
+if __name__ == '__main__':
+    unittest.main()
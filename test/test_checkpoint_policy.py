@@ -0,0 +1,38 @@
+import unittest
+from src.checkpoint_policy import CheckpointPolicy
+
+class TestCheckpointPolicy(unittest.TestCase):
+    def test_default_every_step(self):
+        policy = CheckpointPolicy.from_config(None)
+        self.assertEqual(policy.mode, 'every_step')
+        self.assertTrue(policy.save_after('colorizeModel', 0))
+        self.assertFalse(policy.save_before('buildModel'))
+
+    def test_before_expensive(self):
+        policy = CheckpointPolicy.from_config({'mode': 'before_expensive'})
+        self.assertFalse(policy.save_after('buildUV', 3600))
+        self.assertTrue(policy.save_before('buildTexture'))
+        self.assertFalse(policy.save_before('colorizeModel'))
+
+    def test_before_custom_expensive_steps(self):
+        policy = CheckpointPolicy.from_config({'mode': 'before_expensive', 'expensive_steps': ['buildUV']})
+        self.assertTrue(policy.save_before('buildUV'))
+        self.assertFalse(policy.save_before('buildTexture'))
+
+    def test_time(self):
+        policy = CheckpointPolicy.from_config({'mode': 'time', 'interval': 10})
+        self.assertFalse(policy.save_after('buildUV', 9 * 60))
+        self.assertTrue(policy.save_after('buildUV', 10 * 60))
+        self.assertFalse(policy.save_before('buildModel'))
+
+    def test_end_only(self):
+        policy = CheckpointPolicy('end_only')
+        self.assertFalse(policy.save_after('buildModel', 10**6))
+        self.assertFalse(policy.save_before('buildModel'))
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            CheckpointPolicy('sometimes')
+
+if __name__ == '__main__':
+    unittest.main()
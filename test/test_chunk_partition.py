@@ -0,0 +1,49 @@
+import unittest
+from src.chunk_partition import partition_images, split_balanced, gpu_mask_for
+
+class TestChunkPartition(unittest.TestCase):
+    def setUp(self):
+        # 10 x 10 grid of images, ~11 m apart
+        self.positions = {f'img_{i:03d}.jpg': (15.0 + (i % 10) * 0.0001, 37.5 + (i // 10) * 0.0001) for i in range(100)}
+
+    def test_split_balanced(self):
+        items = [(f'p{i}', float(i), 0.0) for i in range(10)]
+        groups = split_balanced(items, 3)
+        self.assertTrue(all(len(group) <= 3 for group in groups))
+        self.assertEqual(sorted(path for group in groups for path, _, _ in group), sorted(path for path, _, _ in items))
+
+    def test_partition_covers_every_image(self):
+        chunks = partition_images(self.positions, max_images=30, overlap=0.1)
+        self.assertGreaterEqual(len(chunks), 4)
+        self.assertEqual(set().union(*chunks), set(self.positions))
+
+    def test_partition_overlap(self):
+        without = partition_images(self.positions, max_images=50, overlap=0)
+        with_overlap = partition_images(self.positions, max_images=50, overlap=0.2)
+        self.assertEqual(sum(len(chunk) for chunk in without), 100)
+        self.assertGreater(sum(len(chunk) for chunk in with_overlap), 100)
+        self.assertTrue(set(with_overlap[0]) & set(with_overlap[1]))
+
+    def test_single_chunk(self):
+        chunks = partition_images(self.positions, max_images=1000)
+        self.assertEqual(chunks, [sorted(self.positions)])
+
+    def test_images_without_gps_follow_neighbour(self):
+        positions = dict(self.positions)
+        positions['img_000b.jpg'] = None
+        chunks = partition_images(positions, max_images=30, overlap=0)
+        owner = [chunk for chunk in chunks if 'img_000.jpg' in chunk]
+        self.assertTrue(all('img_000b.jpg' in chunk for chunk in owner))
+
+    def test_no_gps(self):
+        with self.assertRaises(ValueError):
+            partition_images({'a.jpg': None, 'b.jpg': None}, max_images=10)
+
+    def test_gpu_mask_for(self):
+        self.assertEqual(gpu_mask_for(0, 2), '01')
+        self.assertEqual(gpu_mask_for(1, 2), '10')
+        self.assertEqual(gpu_mask_for(2, 2), '01')
+        self.assertIsNone(gpu_mask_for(0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import json
+import os
+import tempfile, shutil
+from src.monitor_store import MonitorStore
+from test.test_monitor_store import PROCESS
+from reports.compare import RunStore, flatten, find_log, summarize_run
+
+GPUS = [{'id': 0, 'model': 'Tesla V100-SXM2-32GB', 'mem_total': 32768}]
+
+def write_run(folder, start, depth_maps_samples, ram=9.8, keypoint_limit=40000, metashape='2.1.1', phases=None):
+    # 10 s of matchPhotos, then buildDepthMaps for depth_maps_samples seconds, a sample per second
+    os.makedirs(folder)
+    phases = phases or [b'matchPhotos'] * 10 + [b'buildDepthMaps'] * depth_maps_samples
+    rows = [(start + i, phase, 50.0, 0.5, [50.0, 50.0], ram if b'buildDepthMaps' in phase else 20.0, 9.8, 62.8, 40.0, 20.0,
+             *PROCESS, *[[]] * 6, [40], [90 if b'buildDepthMaps' in phase else 0], [2048]) for i, phase in enumerate(phases)]
+    MonitorStore(os.path.join(folder, 'monitor.bin'), 2, GPUS).append(rows)
+    with open(os.path.join(folder, 'run_info.json'), 'w') as f:
+        json.dump({'images': 100, 'megapixels': 20.0, 'time': start, 'metashape': metashape,
+                   'workflow': {'PhotoProcessor': {'matchPhotos': {'keypoint_limit': keypoint_limit}}}}, f)
+
+class TestCompare(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def runs(self):
+        folders = [os.path.join(self.tmpdirname, name) for name in ['run1', 'run2', 'run3']]
+        write_run(folders[1], 2000.0, 100)
+        write_run(folders[0], 1000.0, 101)
+        write_run(folders[2], 3000.0, 151, ram=40.0, keypoint_limit=60000, metashape='2.2.0')
+        return folders
+
+    def test_regressions(self):
+        store = RunStore()
+        for folder in self.runs():
+            store.add(folder)
+        self.assertEqual([os.path.basename(run) for run in store.ordered()], ['run1', 'run2', 'run3'])
+        result = store.compare(threshold=0.2)
+        self.assertAlmostEqual(result.loc['buildDepthMaps', 'Duration (seconds)'], 150.0)
+        self.assertAlmostEqual(result.loc['buildDepthMaps', 'Duration (seconds) baseline'], 99.5)
+        self.assertEqual(result.loc['buildDepthMaps', 'Regression'], 'Duration (seconds), RAM peak')
+        self.assertEqual(result.loc['matchPhotos', 'Regression'], '')
+        self.assertAlmostEqual(result.loc['buildDepthMaps', 'GPU Core % delta'], 0.0)
+        runs = store.ordered()
+        self.assertEqual(store.changes(runs[2], runs[1]), {'PhotoProcessor.matchPhotos.keypoint_limit': (40000, 60000), 'metashape': ('2.1.1', '2.2.0')})
+        self.assertEqual(list(store.trend(last=2).columns), runs[1:])
+        with self.assertRaises(ValueError):
+            RunStore().compare()
+
+    def test_store_reads_changed_runs_only(self):
+        path = os.path.join(self.tmpdirname, 'runs.json')
+        store = RunStore(path)
+        folders = self.runs()
+        for folder in folders:
+            store.add(folder)
+        store.save()
+        store = RunStore(path)
+        self.assertEqual(len(store.runs), 3)
+        summary = store.add(folders[0])
+        summary['steps']['buildDepthMaps']['RAM peak'] = -1.0     # kept, the log did not change
+        self.assertEqual(store.add(folders[0])['steps']['buildDepthMaps']['RAM peak'], -1.0)
+        shutil.rmtree(folders[0])
+        write_run(folders[0], 1000.0, 120)      # run again
+        self.assertGreater(store.add(folders[0])['steps']['buildDepthMaps']['RAM peak'], 0)
+        store.export(os.path.join(self.tmpdirname, 'compare.xlsx'))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdirname, 'compare.xlsx')))
+
+    def test_trace_of_the_run_only(self):
+        folder = os.path.join(self.tmpdirname, 'run')
+        write_run(folder, 2000.0, 100)
+        spans = [
+            (1000.0, 'buildDepthMaps', 900.0, None),     # previous run of the project
+            (2010.0, 'buildDepthMaps', 5.0, "RuntimeError('out of memory')"),
+            (2020.0, 'buildDepthMaps', 80.0, None)
+        ]
+        with open(os.path.join(folder, 'trace.jsonl'), 'w') as f:
+            for i, (start, name, wall, error) in enumerate(spans):
+                f.write(json.dumps({'id': i, 'parent': None, 'name': name, 'kind': 'step', 'start': start, 'wall': wall,
+                                    'save': 0.0, 'cpu': wall, 'peak_rss': 2 ** 30, 'error': error}) + "\n")
+        steps = summarize_run(folder)['steps']
+        self.assertEqual(steps['buildDepthMaps']['Compute (seconds)'], 80.0)
+        self.assertEqual(steps['buildDepthMaps']['Duration (seconds)'], 99.0)
+        self.assertIsNone(steps['matchPhotos']['Compute (seconds)'])
+
+    def test_one_duration_per_step(self):
+        # run2 has a trace, run1 has not: buildDepthMaps is compared on the monitor durations of both runs
+        folders = self.runs()[:2]
+        with open(os.path.join(folders[1], 'trace.jsonl'), 'w') as f:
+            f.write(json.dumps({'id': 0, 'parent': None, 'name': 'buildDepthMaps', 'kind': 'step', 'start': 2010.0, 'wall': 60.0,
+                                'save': 0.0, 'cpu': 60.0, 'peak_rss': 2 ** 30, 'error': None}) + "\n")
+        store = RunStore()
+        for folder in folders:
+            store.add(folder)
+        self.assertEqual(list(store.trend().loc['buildDepthMaps']), [100.0, 99.0])
+        shutil.copy(os.path.join(folders[1], 'trace.jsonl'), folders[0])
+        del store.runs[os.path.normpath(folders[0])]    # summarized again with its trace
+        store.add(folders[0])
+        self.assertEqual(list(store.trend().loc['buildDepthMaps']), [60.0, 60.0])
+
+    def test_parallel_steps_line_up(self):
+        folders = [os.path.join(self.tmpdirname, name) for name in ['sequential', 'parallel']]
+        write_run(folders[0], 1000.0, 0, phases=[b'buildDepthMaps'] * 50 + [b'buildDem'] * 20)
+        write_run(folders[1], 2000.0, 0, phases=[b'buildDepthMaps'] * 30 + [b'buildDepthMaps+buildDem'] * 20 + [b'buildDepthMaps'] * 5)
+        store = RunStore()
+        for folder in folders:
+            store.add(folder)
+        result = store.compare()
+        self.assertEqual(list(result.index), ['buildDem', 'buildDepthMaps'])
+        self.assertAlmostEqual(result.loc['buildDepthMaps', 'Duration (seconds)'], 54.0)
+        self.assertAlmostEqual(result.loc['buildDem', 'Duration (seconds)'], 19.0)
+
+    def test_helpers(self):
+        self.assertEqual(flatten({'a': {'b': 1, 'c': {'d': 'x'}}, 'e': [1]}), {'a.b': 1, 'a.c.d': 'x', 'e': [1]})
+        with self.assertRaises(FileNotFoundError):
+            find_log(self.tmpdirname)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import json
+import os
+import tempfile, shutil
+import threading
+import time
+from unittest.mock import patch
+from src.job_queue import GpuSlots, JobQueue, job_config
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.status_path = os.path.join(self.tmpdirname, 'batch_status.json')
+        self.workflow = {'settings': {'cpu_enable': False, 'gpu_mask': '11', 'log': './log/'}, 'project': {'path': 'p'}}
+        self.jobs = [{'name': f'flight_{i}', 'input': f'/data/flight_{i}', 'output': os.path.join(self.tmpdirname, f'flight_{i}'),
+                      'workflow': self.workflow} for i in range(4)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_gpu_slots(self):
+        slots = GpuSlots(2, jobs_per_gpu=2)
+        self.assertEqual(slots.capacity, 4)
+        with slots.slot() as (gpu, mask):
+            self.assertEqual((gpu, mask), (0, '01'))
+        self.assertEqual(GpuSlots(0).capacity, 1)
+
+    def test_job_config(self):
+        config = job_config(self.workflow, '10', '/out/flight_0', '/out/flight_0')
+        self.assertEqual(config['workflow']['settings']['gpu_mask'], '10')
+        self.assertEqual(config['workflow']['settings']['log'], '/out/flight_0/')
+        self.assertEqual(config['workflow']['project']['path'], '/out/flight_0')
+        self.assertEqual(self.workflow['settings']['gpu_mask'], '11')    # input untouched
+
+    @patch('src.job_queue.run_step_workflow')
+    def test_run_limits_jobs_per_gpu(self, mock_run):
+        running, peak, lock = set(), [0], threading.Lock()
+        def run(images_folder, config, output_folder, log_path, monitoring, resume):
+            mask = config['workflow']['settings']['gpu_mask']
+            with lock:
+                self.assertNotIn(mask, running)     # one job per GPU
+                running.add(mask)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.05)
+            with lock:
+                running.discard(mask)
+            return 0
+        mock_run.side_effect = run
+        status = JobQueue(self.jobs, GpuSlots(2), self.status_path).run()
+        self.assertEqual(peak[0], 2)
+        self.assertTrue(all(job['status'] == 'done' for job in status.values()))
+        with open(self.status_path) as f:
+            self.assertEqual(json.load(f)['flight_3']['status'], 'done')
+
+    @patch('src.job_queue.run_step_workflow')
+    def test_failed_job_and_resume(self, mock_run):
+        mock_run.side_effect = lambda images_folder, *args: 1 if images_folder.endswith('flight_2') else 0
+        status = JobQueue(self.jobs, GpuSlots(1), self.status_path).run()
+        self.assertEqual(status['flight_2']['status'], 'failed')
+        self.assertEqual(status['flight_2']['returncode'], 1)
+
+        mock_run.reset_mock()
+        mock_run.side_effect = lambda *args: 0
+        status = JobQueue(self.jobs, GpuSlots(1), self.status_path, resume=True).run()
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual(mock_run.call_args[0][0], '/data/flight_2')
+        self.assertEqual(status['flight_2']['status'], 'done')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import json
+import os
+import time
+import tempfile, shutil
+from src.memory_guard import MemoryGuard
+from src.monitor_store import MonitorStore
+from src.run_planner import read_history
+from test.test_monitor_store import GPUS, DISKS, NICS, IO, PROCESS
+from src.step_tracer import StepTracer, read_trace, summarize_trace
+
+WORKFLOW = {
+    'PointCloudProcessor': {'buildDepthMaps': {'downscale': 1}},
+    '3DModelProcessor': {'buildModel': {}, 'buildTexture': {'texture_size': 8192}}
+}
+
+class FakeMonitor:
+    def __init__(self, available, rss=0.0):
+        self.latest = {'time': time.time(), 'ram_available': available, 'process': {'rss': rss}}
+
+def guard(available, **kwargs):
+    # 1000 images of 20 MP, default costs of run_planner
+    return MemoryGuard(WORKFLOW, 1000, 20.0, monitor=FakeMonitor(available), **dict({'use_defaults': True}, **kwargs))
+
+class TestMemoryGuard(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_enough_memory(self):
+        memory_guard = guard(100)
+        params = {'downscale': 1}
+        self.assertIs(memory_guard.adapt('buildDepthMaps', params), params)
+        self.assertEqual(memory_guard.changes, [])
+
+    def test_depth_maps_downscale(self):
+        memory_guard = guard(12.5)    # budget 10.6 GB, 16 GB predicted at downscale 1
+        self.assertEqual(memory_guard.adapt('buildDepthMaps', {'downscale': 1, 'filter_mode': 'Metashape.MildFiltering'}),
+                         {'downscale': 2, 'filter_mode': 'Metashape.MildFiltering'})
+        change, = memory_guard.changes
+        self.assertEqual(change['changes'], {'downscale': [1, 2]})
+        self.assertAlmostEqual(change['predicted_ram'], 16.0)
+        self.assertLessEqual(change['adapted_ram'], change['budget'])
+
+    def test_model_split_in_blocks(self):
+        memory_guard = guard(12.5, region=lambda: (1000.0, 600.0))
+        memory_guard.adapt('buildDepthMaps', {'downscale': 1})
+        params = memory_guard.adapt('buildModel', {'face_count': 'Metashape.HighFaceCount'})
+        self.assertTrue(params['split_in_blocks'])
+        self.assertEqual(params['blocks_size'], 220)
+        self.assertLessEqual(memory_guard.changes[-1]['adapted_ram'], memory_guard.changes[-1]['budget'])
+
+    def test_model_without_region(self):
+        params = guard(12.5).adapt('buildModel', {})
+        self.assertEqual(params, {'split_in_blocks': True})    # configured blocks_size of the processor
+
+    def test_texture_size(self):
+        self.assertEqual(guard(12.5).adapt('buildTexture', {'texture_size': 8192}), {'texture_size': 2048})
+
+    def test_not_guarded_or_disabled(self):
+        self.assertEqual(guard(0.5).adapt('buildUV', {'texture_size': 8192}), {'texture_size': 8192})
+        memory_guard = MemoryGuard.from_config({'enabled': False}, workflow=WORKFLOW, images=1000, megapixels=20.0, monitor=FakeMonitor(0.5))
+        self.assertEqual(memory_guard.adapt('buildDepthMaps', {'downscale': 1}), {'downscale': 1})
+
+    def test_defaults_not_used(self):
+        # without history the default costs are only a guess: nothing is adapted unless use_defaults
+        memory_guard = MemoryGuard.from_config(None, workflow=WORKFLOW, images=1000, megapixels=20.0, monitor=FakeMonitor(0.5))
+        params = {'downscale': 1}
+        self.assertIs(memory_guard.adapt('buildDepthMaps', params), params)
+        self.assertEqual((memory_guard.changes, memory_guard.uncalibrated), ([], {'buildDepthMaps'}))
+
+    def test_stale_sample_uses_psutil(self):
+        memory_guard = guard(0.5)
+        memory_guard.monitor.latest['time'] -= 3600
+        self.assertGreater(memory_guard.budget(), 0.5)
+
+    def test_changes_in_trace(self):
+        trace_file = os.path.join(self.tmpdirname, 'trace.jsonl')
+        guard(12.5, tracer=StepTracer(trace_file)).adapt('buildDepthMaps', {'downscale': 1})
+        record, = read_trace(trace_file)
+        self.assertEqual((record['kind'], record['name'], record['changes']), ('guard', 'buildDepthMaps', {'downscale': [1, 2]}))
+        self.assertEqual(summarize_trace([record]), {})
+
+    def test_history(self):
+        # previous run of the same size: 40 GB in use on the node (other tenants, the project), buildDepthMaps added 10 GB
+        rows = [(1000.0 + i, b'buildDepthMaps', 50.0, 0.5, [50.0] * 4, 50.0, 9.8, 64.0, 20.0, 40.0 + i, *PROCESS, *IO, [34, 35],
+                 [90, 90], [2048, 2048]) for i in range(11)]
+        MonitorStore(os.path.join(self.tmpdirname, 'monitor.bin'), 4, GPUS, DISKS, NICS).append(rows)
+        with open(os.path.join(self.tmpdirname, 'run_info.json'), 'w') as f:
+            json.dump({'images': 1000, 'megapixels': 20.0, 'workflow': WORKFLOW}, f)
+        histories = [read_history(self.tmpdirname)]
+        params = {'downscale': 1}
+        memory_guard = guard(14, histories=histories, use_defaults=False)     # 11.9 GB budget: fits, the node-wide 50 GB peak does not matter
+        self.assertAlmostEqual(memory_guard.predict('buildDepthMaps', params), 10.0)
+        self.assertIs(memory_guard.adapt('buildDepthMaps', params), params)
+        memory_guard = guard(10, histories=histories, use_defaults=False)     # 8.5 GB budget
+        self.assertEqual(memory_guard.adapt('buildDepthMaps', params), {'downscale': 2})
+        self.assertLessEqual(memory_guard.changes[0]['adapted_ram'], 8.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import math
+from types import SimpleNamespace
+from unittest import mock
+import psutil
+from src.metrics_backends import FakeBackend, PsutilBackend, NvmlBackend, select_backend, block_devices
+
+class TestMetricsBackends(unittest.TestCase):
+    def test_fake_backend_deterministic(self):
+        first, second = FakeBackend(num_gpus=2), FakeBackend(num_gpus=2)
+        for _ in range(3):
+            self.assertEqual(first.cpu(), second.cpu())
+            self.assertEqual(first.ram(), second.ram())
+            self.assertEqual(first.gpus(), second.gpus())
+        self.assertEqual(len(first.gpus()), 2)
+        self.assertEqual(first.gpus()[0]['mem_used'], 2048)
+
+    def test_psutil_backend(self):
+        backend = PsutilBackend()
+        cpu_usage, cores, iowait = backend.cpu()
+        self.assertGreaterEqual(cpu_usage, 0)
+        self.assertTrue(iowait >= 0 or math.isnan(iowait))
+        self.assertGreater(len(cores), 0)
+        ram_usage, ram_total, ram_available, _, ram_used = backend.ram()
+        self.assertGreater(ram_total, 0)
+        self.assertLessEqual(ram_available, ram_total)
+        self.assertEqual(backend.gpus(), [])
+
+    def test_psutil_processes(self):
+        backend = PsutilBackend()
+        with mock.patch.object(psutil.Process, 'memory_full_info', autospec=True, side_effect=psutil.Process.memory_full_info) as full:
+            totals = backend.processes()
+            calls = full.call_count     # once per process of the tree
+            self.assertGreater(calls, 0)
+            self.assertGreater(totals['uss'], 0)
+            backend.processes()
+            self.assertEqual(full.call_count, calls)    # USS read again after USS_INTERVAL only
+        # a process that cannot be read for a while keeps its counters, they are not counted as finished
+        read_bytes = backend.processes()['read_bytes']
+        with mock.patch.object(backend, '_process_stats', side_effect=psutil.AccessDenied()):
+            self.assertEqual(backend.processes()['read_bytes'], read_bytes)
+        self.assertEqual(backend.finished['read_bytes'], 0)
+        self.assertIn(backend.root.pid, backend.tree)
+
+    def test_psutil_io_rates(self):
+        backend = PsutilBackend()
+        self.assertNotIn('lo', backend.nics)
+        self.assertFalse(any(name.startswith('loop') for name in backend.disks))
+        with open(__file__, 'rb') as f:
+            f.read()
+        rates = backend.io()
+        self.assertEqual(len(rates['disk_read']), len(backend.disks))
+        self.assertEqual(len(rates['disk_write_iops']), len(backend.disks))
+        self.assertEqual(len(rates['net_sent']), len(backend.nics))
+        self.assertTrue(all(value >= 0 for values in rates.values() for value in values))
+
+    def test_nvml_not_supported(self):
+        # a board answering the memory but not the utilization nor the temperature: NaN, sampling goes on
+        class NVMLError(Exception):
+            pass
+        def not_supported(*args):
+            raise NVMLError()
+        nvml = SimpleNamespace(NVMLError=NVMLError, NVML_TEMPERATURE_GPU=0, nvmlDeviceGetTemperature=not_supported,
+                               nvmlDeviceGetUtilizationRates=not_supported,
+                               nvmlDeviceGetMemoryInfo=lambda handle: SimpleNamespace(used=2048 * 1024 ** 2, total=32768 * 1024 ** 2))
+        backend = NvmlBackend.__new__(NvmlBackend)
+        backend.nvml, backend.handles, backend.models, backend.mem_totals = nvml, ['gpu0'], ['Tesla T4'], [0]
+        gpu, = backend.gpus()
+        self.assertTrue(math.isnan(gpu['temp']) and math.isnan(gpu['utilization']))
+        self.assertEqual((gpu['mem_used'], gpu['mem_total']), (2048, 32768))
+        nvml.nvmlDeviceGetMemoryInfo = not_supported
+        gpu, = backend.gpus()
+        self.assertTrue(math.isnan(gpu['mem_used']))
+        self.assertEqual(gpu['mem_total'], 32768)    # last total read
+
+    def test_block_devices(self):
+        names = block_devices(['loop0', 'ram1', 'sr0', 'nvme0n1', 'sda'])
+        self.assertNotIn('loop0', names)
+        self.assertNotIn('sr0', names)
+
+    def test_select_backend(self):
+        self.assertIsInstance(select_backend('fake'), FakeBackend)
+        self.assertIsInstance(select_backend('auto'), (NvmlBackend, PsutilBackend))
+        with self.assertRaises(ValueError):
+            select_backend('gpustat')
+
+if __name__ == '__main__':
+    unittest.main()
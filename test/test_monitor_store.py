@@ -0,0 +1,143 @@
+import unittest
+import json
+import os
+import struct
+import tempfile, shutil
+import numpy as np
+from src.monitor_store import MAGIC, MonitorStore, CsvStore, open_store, read_monitor, read_progress, phases, export_csv
+
+GPUS = [{'id': 0, 'model': 'Tesla V100-SXM2-32GB', 'mem_total': 32768}, {'id': 1, 'model': 'Tesla V100-SXM2-32GB', 'mem_total': 32768}]
+
+PROCESS = (3, 12.5, 4.5, 4.0, 64, 120, 1000, 50, 2 ** 30, 2 ** 20, 2048)
+
+DISKS, NICS = ['nvme0n1', 'sda'], ['eth0']
+IO = ([120.5, 0.0], [8.0, 0.25], [950.0, 0.0], [64.0, 2.0], [110.0], [1.5])
+
+def rows(count, process=PROCESS, io=IO):
+    return [(1715035659.0 + i, b'buildDepthMaps' if i % 2 else b'matchPhotos', 7.9, 1.5, [0.0, 2.8, 100.0, 0.5], 3.6,
+             9.8, 62.8, 60.5, 1.4, *process, *io, [34, 35], [0, 87], [0, 1024 * i]) for i in range(count)]
+
+class TestMonitorStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdirname, 'monitor.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_round_trip(self):
+        store = MonitorStore(self.path, 4, GPUS, DISKS, NICS)
+        store.append(rows(3))
+        store.append(rows(5)[3:])
+        header, records = read_monitor(self.path)
+        self.assertEqual(header['gpus'], GPUS)
+        self.assertEqual(len(records), 5)
+        self.assertEqual(list(phases(records)[:2]), ['matchPhotos', 'buildDepthMaps'])
+        self.assertEqual(records['cores'].shape, (5, 4))
+        self.assertEqual(records['gpu_mem_used'][4, 1], 4096)
+        self.assertAlmostEqual(records['time'][2], 1715035661.0)
+        self.assertEqual(records['proc_read_bytes'][0], 2 ** 30)
+        self.assertAlmostEqual(records['proc_rss'][0], 4.5)
+        self.assertEqual((header['disks'], header['nics']), (DISKS, NICS))
+        self.assertEqual(records['disk_read'].shape, (5, 2))
+        self.assertAlmostEqual(records['disk_read_iops'][1, 0], 950.0)
+        self.assertAlmostEqual(records['net_recv'][3, 0], 110.0)
+
+    def test_unsupported_version(self):
+        with open(self.path, 'wb') as f:
+            header = json.dumps({'version': 2, 'cores': 4, 'gpus': GPUS, 'disks': [], 'nics': []}).encode('utf-8')
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        with self.assertRaises(ValueError):
+            read_monitor(self.path)
+
+    def test_truncated_record_dropped(self):
+        MonitorStore(self.path, 4, GPUS, DISKS, NICS).append(rows(2))
+        with open(self.path, 'ab') as f:
+            f.write(b'\x00' * 10)     # interrupted write
+        _, records = read_monitor(self.path)
+        self.assertEqual(len(records), 2)
+
+    def test_not_a_monitor_file(self):
+        with open(self.path, 'w') as f:
+            f.write('Modulo;Time\n')
+        with self.assertRaises(ValueError):
+            read_monitor(self.path)
+
+    def test_export_csv(self):
+        MonitorStore(self.path, 4, GPUS, DISKS, NICS).append(rows(2))
+        csv_path = os.path.join(self.tmpdirname, 'monitor.csv')
+        export_csv(self.path, csv_path)
+        with open(csv_path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines[0].endswith("GPUs: [{'id': '[0]', 'model': 'TeslaV100-SXM2-32GB', 'mem_total': '32768MB'}, "
+                                          "{'id': '[1]', 'model': 'TeslaV100-SXM2-32GB', 'mem_total': '32768MB'}]"))
+        self.assertIn(";RAM Used;Processes;Proc CPU %;", lines[0])
+        self.assertIn(";Proc GPU mem;Disk read MB/s;Disk write MB/s;Disk read IOPS;Disk write IOPS;Net recv MB/s;Net sent MB/s;GPUs", lines[0])
+        self.assertEqual(lines[2], "buildDepthMaps;1715035660.0; 7.9; 1.5; [0.0, 2.8, 100.0, 0.5]; 3.6; 9.8 GB; 62.8 GB; 60.5 GB; 1.4 GB; "
+                                   "3; 12.5; 4.5; 4; 64; 120; 1000; 50; 1073741824; 1048576; 2048; "
+                                   "[120.5, 0]; [8, 0.25]; [950, 0]; [64, 2]; [110]; [1.5]; "
+                                   "[{'temp': '34°C', 'cpu_usage': '0%', 'mem_used': '0'}, {'temp': '35°C', 'cpu_usage': '87%', 'mem_used': '1024'}]")
+
+    def test_progress_table(self):
+        store = MonitorStore(self.path, 4, GPUS, DISKS, NICS)
+        self.assertEqual(len(read_progress(self.path)), 0)
+        store.append_progress([(1715035659.5, b'buildDepthMaps', 12.5)])
+        store.append_progress([(1715035660.5, b'buildDepthMaps', 20.0)])
+        events = read_progress(self.path)
+        self.assertEqual(list(events['percent']), [12.5, 20.0])
+        self.assertEqual(events['step'][0], b'buildDepthMaps')
+        MonitorStore(self.path, 4, GPUS, DISKS, NICS)   # new run
+        self.assertEqual(len(read_progress(self.path)), 0)
+
+    def test_csv_progress_table(self):
+        csv_path = os.path.join(self.tmpdirname, 'monitor.csv')
+        store = CsvStore(csv_path, 4, GPUS)
+        store.append_progress([(1715035659.5, b'buildModel', 12.5), (1715035661.0, b'buildModel', 15.0)])
+        with open(os.path.join(self.tmpdirname, 'monitor.progress.csv')) as f:
+            self.assertEqual(f.read().splitlines(), ['Time;Step;Percent', '1715035659.5;buildModel;12.5', '1715035661.0;buildModel;15'])
+        self.assertEqual(list(read_progress(csv_path)['percent']), [12.5, 15.0])
+
+    def test_open_store(self):
+        self.assertIsInstance(open_store(self.path, 4, GPUS), MonitorStore)
+        self.assertIsInstance(open_store(os.path.join(self.tmpdirname, 'monitor.csv'), 4, GPUS), CsvStore)
+
+    def test_report_same_scores(self):
+        from reports.report import Report
+        binary_folder = os.path.join(self.tmpdirname, 'bin')
+        csv_folder = os.path.join(self.tmpdirname, 'csv')
+        os.makedirs(binary_folder)
+        os.makedirs(csv_folder)
+        MonitorStore(os.path.join(binary_folder, 'system.bin'), 4, GPUS, DISKS, NICS).append(rows(6))
+        export_csv(os.path.join(binary_folder, 'system.bin'), os.path.join(csv_folder, 'system.csv'))
+        binary, text = Report(binary_folder), Report(csv_folder)
+        self.assertTrue(np.allclose(binary.scores.values, text.scores.values))
+        self.assertEqual(binary.GPUS, text.GPUS)
+        self.assertTrue(np.allclose(binary.attribution.values, text.attribution.values))
+        self.assertAlmostEqual(binary.attribution.loc['Total', 'Proc RSS'], 4.5)
+        self.assertEqual(list(binary.IO), list(text.IO))
+        self.assertTrue(np.allclose(list(binary.IO.values()), list(text.IO.values())))
+        self.assertAlmostEqual(binary.IO['MAX_DISK_READ'], 120.5)
+        self.assertAlmostEqual(binary.IO['MEAN_DISK_IOPS'], 1016.0)
+        self.assertTrue(np.allclose(binary.csv['dwrite-sda'], text.csv['dwrite-1']))
+
+    def test_read_memory_mapped(self):
+        MonitorStore(self.path, 4, GPUS, DISKS, NICS).append(rows(5))
+        _, records = read_monitor(self.path)
+        _, mapped = read_monitor(self.path, memory_map=True)
+        self.assertIsInstance(mapped, np.memmap)
+        self.assertTrue(np.array_equal(records[2:4], mapped[2:4]))
+
+    def test_report_io_plot(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        from reports.report import Report
+        MonitorStore(os.path.join(self.tmpdirname, 'system.bin'), 4, GPUS, DISKS, NICS).append(rows(6))
+        report = Report(self.tmpdirname)
+        report.IO_PLOT([12, 8])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdirname, 'plot_io.png')))
+        report.export()
+        with open(os.path.join(self.tmpdirname, 'data.json')) as f:
+            self.assertAlmostEqual(json.load(f)['IO']['MAX_NET_RECV'], 110.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import queue
+import threading
+import time
+from unittest import mock
+from src.parallel_export import QueueProgress, forward_progress, run_parallel_exports
+from src.progress_sinks import ProgressAggregator, NullSink
+from src.singleton_meta import SingletonMeta
+
+class RecordingSink(NullSink):
+    def __init__(self):
+        self.events = []
+
+    def write(self, event, running):
+        self.events.append((event['event'], event['step'], event['percent']))
+
+def fake_export(project_path, name, output_folder, params, progress_queue):
+    # run_export of a worker without Metashape: progress, then the export fails when asked to
+    progress = QueueProgress(name, progress_queue)
+    progress(50.0)
+    if params.get('fail'):
+        raise OSError(f"disk full writing {name}")
+    progress_queue.put((name, 100.0))
+    return name
+
+class TestParallelExport(unittest.TestCase):
+    def setUp(self):
+        SingletonMeta._instances.pop(ProgressAggregator, None)
+        self.sink = RecordingSink()
+        ProgressAggregator(sinks=[self.sink], interval=0, min_delta=0)
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(ProgressAggregator, None)
+
+    def test_queue_progress_throttling(self):
+        progress_queue = queue.Queue()
+        progress = QueueProgress('exportModel', progress_queue, min_delta=0.5)
+        for percent in [0.0, 0.2, 0.6, 0.7, 1.2, 99.9, 100.0]:
+            progress(percent)
+        sent = []
+        while not progress_queue.empty():
+            sent.append(progress_queue.get()[1])
+        self.assertEqual(sent, [0.0, 0.6, 1.2, 99.9, 100.0])
+
+    def test_forward_progress(self):
+        progress_queue, stop = queue.Queue(), threading.Event()
+        thread = threading.Thread(target=forward_progress, args=(progress_queue, stop))
+        thread.start()
+        progress_queue.put(('exportDEM', 10.0))
+        progress_queue.put(('exportModel', 30.0))
+        deadline = time.time() + 5
+        while len(self.sink.events) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        stop.set()
+        thread.join()
+        self.assertEqual(self.sink.events, [('progress', 'exportDEM', 10.0), ('progress', 'exportModel', 30.0)])
+
+    def test_errors_of_the_workers(self):
+        exports = {'exportDEM': {}, 'exportModel': {'fail': True}, 'exportTexture': {'fail': True}}
+        with mock.patch('src.parallel_export.run_export', fake_export):
+            with self.assertRaises(RuntimeError) as raised:
+                run_parallel_exports('project.psx', exports, '.', workers=2)
+        message = str(raised.exception)
+        self.assertIn('exportModel (disk full writing exportModel)', message)
+        self.assertIn('exportTexture (disk full writing exportTexture)', message)
+        self.assertNotIn('exportDEM (', message)
+        self.assertEqual(ProgressAggregator().running, {})     # every export ended
+        self.assertIn(('end', 'exportDEM', 100.0), self.sink.events)
+
+    def test_unknown_export(self):
+        with self.assertRaises(ValueError):
+            run_parallel_exports('project.psx', {'exportVideo': {}}, '.', workers=2)
+
+if __name__ == '__main__':
+    unittest.main()
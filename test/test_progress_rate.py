@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile, shutil
+import numpy as np
+from src.monitor_store import MonitorStore, PROGRESS_DTYPE
+from src.progress_rate import ProgressRate, format_eta, throughput, step_throughput
+from test.test_monitor_store import GPUS, DISKS, NICS, rows
+
+class TestProgressRate(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_eta(self):
+        rate = ProgressRate(window=300)
+        self.assertIsNone(rate.eta())
+        rate.update(0, now=1000)
+        rate.update(10, now=1060)
+        self.assertAlmostEqual(rate.eta(), 540)
+        rate.update(20, now=1090)   # faster: the window still holds the start
+        self.assertAlmostEqual(rate.eta(), 80 / (20 / 90))
+        self.assertEqual(format_eta(rate.eta()), '6m00s')
+        self.assertEqual(format_eta(None), 'unknown')
+
+    def test_window_and_restart(self):
+        rate = ProgressRate(window=60)
+        for second in range(0, 601, 30):
+            rate.update(second / 600 * 50 if second <= 300 else 25 + (second - 300) / 300 * 50, now=second)
+        self.assertAlmostEqual(rate.rate(), 50 / 300)   # recent rate only
+        rate.update(5, now=700)     # progress restarted
+        self.assertIsNone(rate.eta())
+
+    def test_throughput(self):
+        starts, rates = throughput([0, 60, 120, 150], [0, 30, 40, 70], bin_size=60)
+        self.assertEqual(list(starts), [0, 60, 120])
+        self.assertTrue(np.allclose(rates, [30, 10, 60]))    # last bin of 30 s
+        self.assertEqual(len(throughput([0], [5])[0]), 0)
+
+    def test_step_throughput(self):
+        records = np.array([(0, b'buildDepthMaps', 0), (120, b'buildDepthMaps', 100), (120, b'buildModel', 0), (180, b'buildModel', 50)],
+                           dtype=PROGRESS_DTYPE)
+        curves = step_throughput(records)
+        self.assertEqual(list(curves), ['buildDepthMaps', 'buildModel'])
+        self.assertTrue(np.allclose(curves['buildDepthMaps'][1], [50, 50]))
+        self.assertTrue(np.allclose(curves['buildModel'][1], [50]))
+
+    def test_report_throughput(self):
+        from reports.report import Report
+        path = os.path.join(self.tmpdirname, 'system.bin')
+        store = MonitorStore(path, 4, GPUS, DISKS, NICS)
+        store.append(rows(6))
+        store.append_progress([(1715035659.0, b'matchPhotos', 0), (1715035665.0, b'matchPhotos', 60)])
+        throughput = Report(self.tmpdirname).throughput(bin_size=3)
+        self.assertEqual(list(throughput['Modulo']), ['matchPhotos', 'matchPhotos'])
+        self.assertTrue(np.allclose(throughput['Percent/min'], [600, 600]))
+        self.assertAlmostEqual(throughput['CPU usage %'][0], 7.9, places=5)  # samples 0 and 2 of matchPhotos
+        self.assertTrue(np.allclose(throughput['GPU Core %'], [43.5, 43.5]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import io
+import json
+import os
+import socket
+import threading
+import tempfile, shutil
+from unittest import mock
+from src.progress_printer import ProgressPrinter
+from src.progress_sinks import ProgressAggregator, TtySink, SocketSink, NullSink, create_sink
+from src.singleton_meta import SingletonMeta
+
+class RecordingSink(NullSink):
+    def __init__(self):
+        self.events = []
+
+    def write(self, event, running):
+        self.events.append((event['event'], event['step'], event['percent']))
+
+class TestProgressSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        SingletonMeta._instances.pop(ProgressAggregator, None)
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(ProgressAggregator, None)
+        shutil.rmtree(self.tmpdirname)
+
+    def test_throttling(self):
+        sink = RecordingSink()
+        aggregator = ProgressAggregator(sinks=[sink], interval=10, min_delta=5)
+        with mock.patch('src.progress_sinks.time.time', side_effect=[0, 1, 20, 21, 40, 41, 42]):
+            aggregator.update('buildModel', 1)      # first event
+            aggregator.update('buildModel', 50)     # interval not passed
+            aggregator.update('buildModel', 3)      # min_delta not passed
+            aggregator.update('buildModel', 60)
+            aggregator.update('buildModel', 100)    # always sent
+            aggregator.update('buildModel', 100)    # duplicate
+            aggregator.finish('buildModel')
+        self.assertEqual(sink.events, [('progress', 'buildModel', 1), ('progress', 'buildModel', 60),
+                                       ('progress', 'buildModel', 100), ('end', 'buildModel', 100)])
+        self.assertEqual(aggregator.running, {})
+
+    def test_tty_concurrent_steps(self):
+        stream = io.StringIO()
+        aggregator = ProgressAggregator(sinks=[TtySink(stream)], interval=0, min_delta=0)
+        aggregator.update('export_dem', 10)
+        aggregator.update('export_ortho', 20)
+        self.assertTrue(stream.getvalue().endswith("\rexport_dem 10.0% ETA unknown | export_ortho 20.0% ETA unknown"))
+        aggregator.finish('export_dem')
+        aggregator.close()
+        lines = stream.getvalue().split("\n")
+        self.assertRegex(lines[0], r"\rexport_dem 10% in 0m0\ds *$")
+        self.assertTrue(lines[1].startswith("\rexport_ortho 20.0% ETA unknown"))
+        self.assertEqual(lines[2], "")
+
+    def test_log_file(self):
+        path = os.path.join(self.tmpdirname, 'progress.log')
+        aggregator = ProgressAggregator.from_config({'sinks': [{'type': 'log', 'path': path}], 'interval': 0})
+        aggregator.update('buildDem', 25)
+        aggregator.finish('buildDem')
+        aggregator.close()
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertRegex(lines[0], r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d progress step=buildDem percent=25.0 elapsed=0$")
+        self.assertRegex(lines[1], r" end step=buildDem percent=25.0 elapsed=0$")
+
+    def test_socket(self):
+        server = socket.create_server(('127.0.0.1', 0))
+        received = []
+        def accept():
+            connection, _ = server.accept()
+            with connection, connection.makefile('r') as f:
+                received.extend(json.loads(line) for line in f)
+        thread = threading.Thread(target=accept)
+        thread.start()
+        aggregator = ProgressAggregator(sinks=[create_sink({'type': 'socket', 'address': f'127.0.0.1:{server.getsockname()[1]}'})], interval=0)
+        aggregator.update('buildTexture', 50)
+        aggregator.finish('buildTexture')
+        aggregator.close()
+        thread.join(timeout=5)
+        server.close()
+        self.assertEqual([(event['event'], event['step'], event['percent']) for event in received],
+                         [('progress', 'buildTexture', 50), ('end', 'buildTexture', 50)])
+
+    def test_socket_not_available(self):
+        sink = SocketSink('127.0.0.1:1', retry=60)
+        sink.write({'event': 'progress'}, {})
+        self.assertIsNone(sink.connection)
+        self.assertIsNotNone(sink.failed_at)
+
+    def test_create_sink(self):
+        self.assertIsInstance(create_sink('none'), NullSink)
+        self.assertIsInstance(create_sink({'type': 'tty'}), TtySink)
+        with self.assertRaises(ValueError):
+            create_sink('email')
+
+    def test_printer_uses_aggregator(self):
+        sink = RecordingSink()
+        ProgressAggregator(sinks=[sink], interval=0, min_delta=0)
+        percents = []
+        printer = ProgressPrinter('buildUV', listener=percents.append)
+        printer(10)
+        printer(20)
+        printer.close()
+        self.assertEqual(percents, [10, 20])
+        self.assertEqual(sink.events, [('progress', 'buildUV', 10), ('progress', 'buildUV', 20), ('end', 'buildUV', 20)])
+
+    def test_printer_closed_on_error(self):
+        sink = RecordingSink()
+        aggregator = ProgressAggregator(sinks=[sink], interval=0, min_delta=0)
+        with self.assertRaises(RuntimeError):
+            with ProgressPrinter('alignChunks') as printer:
+                printer(30)
+                raise RuntimeError("boom")
+        self.assertEqual(sink.events, [('progress', 'alignChunks', 30), ('end', 'alignChunks', 30)])
+        self.assertEqual(aggregator.running, {})
+
+    def test_config_of_existing_aggregator(self):
+        # a printer created before the config of the run already made the aggregator
+        ProgressPrinter('readPositions')
+        first = ProgressAggregator()
+        first.sinks = [mock.MagicMock()]
+        previous = first.sinks[0]
+        sink = RecordingSink()
+        with mock.patch('src.progress_sinks.create_sink', return_value=sink):
+            aggregator = ProgressAggregator.from_config({'sinks': ['none'], 'interval': 0, 'min_delta': 0})
+        self.assertIs(aggregator, first)
+        self.assertEqual(aggregator.sinks, [sink])
+        self.assertEqual((aggregator.interval, aggregator.min_delta), (0, 0))
+        previous.close.assert_called_once()
+        aggregator.update('buildDem', 1)
+        aggregator.update('buildDem', 1.5)
+        self.assertEqual(sink.events, [('progress', 'buildDem', 1), ('progress', 'buildDem', 1.5)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import unittest
+import os
+import tempfile, shutil
+from unittest import mock
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+from reports.report import Report, segments, decimate, parse_lists, parse_gpus
+from src.monitor_store import MonitorStore
+from test.test_monitor_store import GPUS, DISKS, NICS, rows
+
+SAMPLE_DATA = os.path.join(os.path.dirname(__file__), '..', 'reports', 'sample_data')
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_segments(self):
+        starts, ends = segments([1, 1, 2, 3, 3, 3, 4])
+        self.assertEqual(list(starts), [0, 2, 3, 6])
+        self.assertEqual(list(ends), [2, 3, 6, 6])
+        self.assertEqual(len(segments([])[0]), 0)
+
+    def test_decimate(self):
+        values = np.sin(np.linspace(0, 20, 100000))
+        values[5000] = 7.0
+        values[60000:61000] = np.nan
+        positions, decimated = decimate(values, 500)
+        self.assertLessEqual(len(positions), 1000)
+        self.assertTrue(np.all(np.diff(positions) > 0))
+        self.assertEqual(np.nanmax(decimated), 7.0)     # the peak survives
+        self.assertAlmostEqual(np.nanmin(decimated), values[~np.isnan(values)].min())
+        self.assertTrue(np.isnan(decimated).any())      # the gap too
+        positions, decimated = decimate(values[:800], 500)
+        self.assertEqual(len(positions), 800)           # short series are unchanged
+
+    def test_parse_columns(self):
+        cores = pd.Series(['[0.0, 2.8, 100.0]', ' [1.5, 0.0, 7.25]'], name='Cores usage %')
+        self.assertTrue(np.array_equal(parse_lists(cores), [[0.0, 2.8, 100.0], [1.5, 0.0, 7.25]]))
+        self.assertEqual(parse_lists(pd.Series(['[]', '[]'])).shape, (2, 0))
+        with self.assertRaises(ValueError):
+            parse_lists(pd.Series(['[1.0, 2.0]', '[1.0]'], name='Cores usage %'))
+        with self.assertRaisesRegex(ValueError, 'Cores usage %'):
+            parse_lists(pd.Series(['[1.0]', '[1.0, 2.0]'], name='Cores usage %'))
+        gpus = pd.Series(["[{'temp': '34°C', 'cpu_usage': '0%', 'mem_used': '0'}, {'temp': '35°C', 'cpu_usage': '87%', 'mem_used': '2048'}]"] * 3)
+        temps, usages, mems = parse_gpus(gpus, 2)
+        self.assertEqual(temps.shape, (3, 2))
+        self.assertEqual((temps[0, 1], usages[2, 1], mems[1, 1]), (35.0, 87.0, 2048.0))
+        with self.assertRaises(ValueError):
+            parse_gpus(gpus, 3)
+
+    def test_plot_points_bounded_by_width(self):
+        report = Report(SAMPLE_DATA)
+        report.data_path = self.tmpdirname
+        report.norm = report.norm.loc[report.norm.index.repeat(100)].reset_index(drop=True)
+        report.PLOT([10, 3], n=20000)
+        figure = report.plt.gcf()
+        width = figure.get_figwidth() * figure.dpi
+        for ax in figure.axes:
+            for line in ax.get_lines():
+                self.assertLessEqual(len(line.get_xdata()), 2 * width)
+        self.assertEqual(len(figure.axes), 3)
+        self.assertEqual(figure.axes[-1].get_xlim(), (0, 19999))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdirname, 'plot_all.png')))
+        report.plt.close('all')
+
+    def assertSameReport(self, report, fresh):
+        pd.testing.assert_frame_equal(report.csv, fresh.csv)
+        pd.testing.assert_frame_equal(report.norm, fresh.norm)
+        pd.testing.assert_frame_equal(report.scores, fresh.scores)
+        self.assertTrue(np.array_equal(report.cores, fresh.cores))
+        self.assertEqual((report.CPU, report.GPU, report.GPUS, report.IO), (fresh.CPU, fresh.GPU, fresh.GPUS, fresh.IO))
+
+    def test_streaming(self):
+        store = MonitorStore(os.path.join(self.tmpdirname, 'system.bin'), 4, GPUS, DISKS, NICS)
+        store.append(rows(20))
+        store.append_progress([(1715035659.0 + i * 3, b'buildDepthMaps', i * 5.0) for i in range(8)])
+        for folder in [self.tmpdirname, SAMPLE_DATA]:
+            whole, streamed = Report(folder), Report(folder, chunksize=7)
+            self.assertIsNone(streamed.csv)
+            pd.testing.assert_frame_equal(whole.scores, streamed.scores, check_dtype=False)
+            self.assertEqual(list(whole.CPU), list(streamed.CPU))
+            self.assertTrue(np.allclose(list(whole.CPU.values()), list(streamed.CPU.values())))
+            self.assertTrue(np.allclose(list(whole.GPU.values()), list(streamed.GPU.values())))
+            self.assertEqual(whole.GPUS, streamed.GPUS)
+        whole, streamed = Report(self.tmpdirname), Report(self.tmpdirname, chunksize=3)
+        pd.testing.assert_frame_equal(whole.attribution, streamed.attribution)
+        pd.testing.assert_frame_equal(whole.throughput(bin_size=5), streamed.throughput(bin_size=5))
+        self.assertTrue(np.allclose(list(whole.IO.values()), list(streamed.IO.values())))
+        with self.assertRaises(AssertionError):
+            streamed.PLOT([12, 4])
+
+    def test_cache_binary_log(self):
+        cache = os.path.join(self.tmpdirname, 'cache')
+        data = os.path.join(self.tmpdirname, 'run')
+        os.makedirs(data)
+        store = MonitorStore(os.path.join(data, 'system.bin'), 4, GPUS, DISKS, NICS)
+        store.append(rows(8))
+        Report(data, cache=cache)
+        self.assertEqual(len(os.listdir(cache)), 1)
+        self.assertEqual(os.listdir(data), ['system.bin'])     # nothing written next to the log
+        fresh = Report(data)
+        with mock.patch.object(Report, 'load_columnar', side_effect=AssertionError("log parsed again")):
+            self.assertSameReport(Report(data, cache=cache), fresh)
+            store.append(rows(20)[8:])
+            extended = Report(data, cache=cache)     # only the new rows
+        self.assertEqual(len(extended.csv), 20)
+        self.assertSameReport(extended, Report(data))
+        self.assertEqual(list(extended.io), list(Report(data).io))
+
+        # a log written again, or other thresholds, are parsed from the start
+        MonitorStore(os.path.join(data, 'system.bin'), 4, GPUS, DISKS, NICS).append(rows(5))
+        self.assertEqual(len(Report(data, cache=cache).csv), 5)
+        self.assertEqual(Report(data, CPU_THRESHOLD=10, cache=cache).CPU_THRESHOLD, 10)
+        # a broken cache, or one holding pickled objects, is never loaded
+        path = os.path.join(cache, os.listdir(cache)[0])
+        with open(path, 'wb') as f:
+            f.write(b'broken')
+        self.assertEqual(len(Report(data, cache=cache).csv), 5)
+        np.savez(path, state=np.array([{'version': 2}], dtype=object))
+        self.assertEqual(len(Report(data, cache=cache).csv), 5)
+
+    def test_cache_text_log(self):
+        cache = os.path.join(self.tmpdirname, 'cache')
+        data = os.path.join(self.tmpdirname, 'run')
+        os.makedirs(data)
+        with open(os.path.join(SAMPLE_DATA, 'system.csv'), 'rb') as f:
+            lines = f.readlines()
+        path = os.path.join(data, 'system.csv')
+        middle = len(lines) // 2
+        with open(path, 'wb') as f:
+            f.writelines(lines[:middle])
+            f.write(lines[middle][:10])     # row being written
+        first = Report(data, cache=cache)
+        self.assertEqual(len(first.csv), middle - 1)
+        with open(path, 'ab') as f:
+            f.write(lines[middle][10:])
+            f.writelines(lines[middle + 1:])
+        extended = Report(data, cache=cache)
+        self.assertEqual(len(extended.csv), len(lines) - 1)
+        self.assertSameReport(extended, Report(data))
+        with mock.patch('reports.report.read_text', side_effect=AssertionError("log parsed again")):
+            self.assertSameReport(Report(data, cache=cache), extended)
+
+    def test_follow_text_log(self):
+        with open(os.path.join(SAMPLE_DATA, 'system.csv'), 'rb') as f:
+            lines = f.readlines()
+        path = os.path.join(self.tmpdirname, 'system.csv')
+        with open(path, 'wb') as f:
+            f.writelines(lines[:100])
+            f.write(lines[100][:20])        # row being written
+        report = Report(self.tmpdirname, chunksize=40)
+        self.assertEqual(report.count, 99)
+        self.assertEqual(report.update(), 0)
+        with open(path, 'ab') as f:
+            f.write(lines[100][20:])
+            f.writelines(lines[101:])
+        self.assertEqual(report.update(), len(lines) - 100)
+        pd.testing.assert_frame_equal(report.scores, Report(SAMPLE_DATA, chunksize=40).scores)
+        self.assertEqual(report.GPUS, Report(SAMPLE_DATA).GPUS)
+        self.assertEqual(len(report.recent), (report.recent['Time'] >= report.end - 300).sum())
+
+    def test_follow_rewritten_log(self):
+        with open(os.path.join(SAMPLE_DATA, 'system.csv'), 'rb') as f:
+            lines = f.readlines()
+        path = os.path.join(self.tmpdirname, 'system.csv')
+        with open(path, 'wb') as f:
+            f.writelines(lines[:100])
+        report = Report(self.tmpdirname, chunksize=40)
+        # a new run writing more rows than those read: no row of the previous run is kept
+        with open(path, 'wb') as f:
+            f.writelines(lines[:1] + lines[150:300])
+        self.assertEqual(report.update(), 150)
+        pd.testing.assert_frame_equal(report.scores, Report(self.tmpdirname, chunksize=40).scores)
+
+        store = MonitorStore(os.path.join(self.tmpdirname, 'monitor.bin'), 4, GPUS, DISKS, NICS)
+        os.remove(path)
+        store.append(rows(20))
+        report = Report(self.tmpdirname, chunksize=4)
+        MonitorStore(os.path.join(self.tmpdirname, 'monitor.bin'), 4, GPUS, DISKS, NICS).append(rows(5))
+        self.assertEqual(report.update(), 5)
+        self.assertEqual(report.count, 5)
+        pd.testing.assert_frame_equal(report.steps, Report(self.tmpdirname, chunksize=4).steps)
+
+    def test_follow_dashboard(self):
+        store = MonitorStore(os.path.join(self.tmpdirname, 'system.bin'), 4, GPUS, DISKS, NICS)
+        store.append(rows(20)[:6])
+        report = Report(self.tmpdirname, chunksize=4)
+        store.append(rows(20)[6:])
+        report.follow(interval=0, updates=2)
+        self.assertEqual(report.count, 20)
+        pd.testing.assert_frame_equal(report.steps, Report(self.tmpdirname, chunksize=4).steps)
+        with open(os.path.join(self.tmpdirname, 'dashboard.html')) as f:
+            page = f.read()
+        self.assertIn('<meta http-equiv="refresh" content="0">', page)
+        self.assertIn('GPU 0 under-used: 0%', page)       # buildDepthMaps on GPU 1 only
+        self.assertNotIn('GPU 1 under-used', page)
+        with self.assertRaises(AssertionError):
+            Report(self.tmpdirname).follow(updates=1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import os
+import tempfile, shutil
+from src.run_manifest import RunManifest
+from src.step_graph import Step, StepGraph
+
+class TestRunManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.path = RunManifest.project_manifest_path(os.path.join(self.tmpdirname, 'project.psx'))
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def graph(self, texture_size=8192):
+        graph = StepGraph()
+        for name, params in [('buildModel', {}), ('buildUV', {}), ('buildTexture', {'texture_size': texture_size})]:
+            graph.add_step(Step(name, lambda name=name: self.calls.append(name), params=params))
+        return graph
+
+    def test_manifest_path(self):
+        self.assertEqual(self.path, os.path.join(self.tmpdirname, 'project.manifest.json'))
+
+    def test_record_and_reload(self):
+        manifest = RunManifest(self.path)
+        manifest.record('buildModel', 'abc', 'def', {'buildDepthMaps': '123'})
+        reloaded = RunManifest(self.path)
+        self.assertTrue(reloaded.is_completed('buildModel', 'abc'))
+        self.assertFalse(reloaded.is_completed('buildModel', 'other'))
+        self.assertEqual(reloaded.steps['buildModel']['upstream'], {'buildDepthMaps': '123'})
+
+    def test_invalidate_downstream(self):
+        manifest = RunManifest(self.path)
+        manifest.record('buildModel', 'a', 'a', {})
+        manifest.record('buildUV', 'b', 'b', {'buildModel': 'a'})
+        manifest.record('buildTexture', 'c', 'c', {'buildUV': 'b'})
+        manifest.record('buildDem', 'd', 'd', {})
+        manifest.invalidate('buildModel')
+        self.assertEqual(list(RunManifest(self.path).steps), ['buildDem'])
+
+    def test_unreadable_manifest(self):
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        self.assertEqual(RunManifest(self.path).steps, {})
+
+    def test_resume_skips_completed_steps(self):
+        self.graph().run(manifest=RunManifest(self.path))
+        self.assertEqual(self.calls, ['buildModel', 'buildUV', 'buildTexture'])
+        self.calls = []
+        self.graph().run(manifest=RunManifest(self.path), resume=True)
+        self.assertEqual(self.calls, [])
+
+    def test_resume_reruns_changed_params(self):
+        self.graph().run(manifest=RunManifest(self.path))
+        self.calls = []
+        self.graph(texture_size=4096).run(manifest=RunManifest(self.path), resume=True)
+        self.assertEqual(self.calls, ['buildTexture'])
+
+    def test_resume_reruns_adapted_params(self):
+        # the memory guard ran buildTexture with a smaller texture: it is not done with the configured params
+        graph = self.graph()
+        step = graph.steps['buildTexture']
+        def adapted():
+            step.effective_params = {'texture_size': 2048}
+            self.calls.append('buildTexture')
+        step.action = adapted
+        graph.run(manifest=RunManifest(self.path))
+        self.calls = []
+        self.graph().run(manifest=RunManifest(self.path), resume=True)
+        self.assertEqual(self.calls, ['buildTexture'])
+
+    def test_resume_after_failure(self):
+        manifest = RunManifest(self.path)
+        graph = self.graph()
+        def fail():
+            raise RuntimeError("crash")
+        graph.steps['buildTexture'].action = fail
+        with self.assertRaises(RuntimeError):
+            graph.run(manifest=manifest)
+        self.calls = []
+        self.graph().run(manifest=RunManifest(self.path), resume=True)
+        self.assertEqual(self.calls, ['buildTexture'])
+
+    def test_rerun_upstream_reruns_downstream(self):
+        self.graph().run(manifest=RunManifest(self.path))
+        manifest = RunManifest(self.path)
+        manifest.invalidate('buildUV')
+        self.calls = []
+        self.graph().run(manifest=RunManifest(self.path), resume=True)
+        self.assertEqual(self.calls, ['buildUV', 'buildTexture'])
+
+    def test_unsaved_step_is_not_completed(self):
+        unsaved = {'buildUV', 'buildTexture'}
+        manifest = RunManifest(self.path)
+        self.graph().run(manifest=manifest, is_saved=lambda name: name not in unsaved)
+        self.assertFalse(RunManifest(self.path).steps['buildTexture']['saved'])
+        self.calls = []
+        self.graph().run(manifest=RunManifest(self.path), resume=True)
+        self.assertEqual(self.calls, ['buildUV', 'buildTexture'])
+
+    def test_mark_saved(self):
+        manifest = RunManifest(self.path)
+        manifest.record('buildUV', 'b', 'b', {}, saved=False)
+        self.assertFalse(manifest.is_completed('buildUV', 'b'))
+        manifest.mark_saved(['buildUV'])
+        self.assertTrue(RunManifest(self.path).is_completed('buildUV', 'b'))
+
+if __name__ == '__main__':
+    unittest.main()
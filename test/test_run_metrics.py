@@ -0,0 +1,88 @@
+import unittest
+import os
+import tempfile, shutil
+import urllib.error
+import urllib.request
+from src.metrics_backends import FakeBackend
+from src.progress_printer import ProgressPrinter
+from src.progress_sinks import ProgressAggregator, NullSink
+from src.run_metrics import RunMetrics, MetricsServer, CONTENT_TYPE
+from src.singleton_meta import SingletonMeta
+from src.step_graph import Step, StepGraph
+from src.system_monitor import SystemMonitor
+
+class TestRunMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        SingletonMeta._instances.pop(SystemMonitor, None)
+        SingletonMeta._instances.pop(ProgressAggregator, None)
+        ProgressAggregator(sinks=[NullSink()])
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(SystemMonitor, None)
+        SingletonMeta._instances.pop(ProgressAggregator, None)
+        shutil.rmtree(self.tmpdirname)
+
+    def test_steps_and_progress(self):
+        metrics = RunMetrics()
+        with metrics.step('buildModel'):
+            ProgressPrinter('buildModel', listener=lambda percent: metrics.progress('buildModel', percent))(42.5)
+            text = metrics.render()
+            self.assertIn('hammon_step_running{step="buildModel"} 1.0\n', text)
+            self.assertIn('hammon_step_progress_percent{step="buildModel"} 42.5\n', text)
+            self.assertIn('hammon_step_duration_seconds{step="buildModel",status="running"}', text)
+        with self.assertRaises(RuntimeError):
+            with metrics.step('buildUV'):
+                raise RuntimeError('failed')
+        text = metrics.render()
+        self.assertNotIn('hammon_step_running{', text)
+        self.assertIn('hammon_step_duration_seconds{step="buildModel",status="done"}', text)
+        self.assertIn('hammon_step_duration_seconds{step="buildUV",status="failed"}', text)
+        self.assertIn('hammon_steps_completed_total 1.0\n', text)
+        self.assertNotIn('hammon_cpu_usage_percent', text)     # no monitoring
+
+    def test_step_graph_track(self):
+        metrics = RunMetrics()
+        graph = StepGraph()
+        graph.add_step(Step('addPhotos', lambda: None))
+        graph.add_step(Step('matchPhotos', lambda: None, condition=lambda: False))
+        graph.run(track=metrics.step)
+        self.assertEqual(list(metrics.durations), ['addPhotos'])
+
+    def test_monitor_readings(self):
+        monitor = SystemMonitor(os.path.join(self.tmpdirname, 'monitor.bin'), backend=FakeBackend(num_gpus=2))
+        metrics = RunMetrics(monitor)
+        self.assertNotIn('hammon_cpu_usage_percent', metrics.render())     # no sample yet
+        monitor.sample('buildDepthMaps')
+        text = metrics.render()
+        monitor.close()
+        self.assertIn('hammon_monitor_phase{phase="buildDepthMaps"} 1.0\n', text)
+        self.assertIn('hammon_cpu_usage_percent 10.0\n', text)
+        self.assertIn('hammon_gpu_utilization_percent{gpu="1"} 10.0\n', text)
+        self.assertIn('hammon_gpu_memory_used_bytes{gpu="0"} 1073741824.0\n', text)
+        self.assertIn('hammon_disk_read_bytes_per_second{device="fake0"}', text)
+        self.assertIn('hammon_net_recv_bytes_per_second{interface="eth0"}', text)
+        self.assertIn('hammon_process_count 2.0\n', text)
+
+    def test_server(self):
+        metrics = RunMetrics()
+        server = MetricsServer(metrics, 0, host='127.0.0.1')
+        server.start()
+        try:
+            with metrics.step('buildDem'):
+                with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5) as response:
+                    self.assertEqual(response.headers['Content-Type'], CONTENT_TYPE)
+                    self.assertIn('hammon_step_running{step="buildDem"} 1.0', response.read().decode('utf-8'))
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f'http://127.0.0.1:{server.port}/', timeout=5)
+        finally:
+            server.close()
+        self.assertFalse(server.thread.is_alive())
+
+    def test_label_escaping(self):
+        metrics = RunMetrics()
+        with metrics.step('export "a"\\b'):
+            self.assertIn('step="export \\"a\\"\\\\b"', metrics.render())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import json
+import os
+import struct
+import tempfile, shutil
+from src.run_planner import image_size, image_megapixels, plan_steps, step_units, read_history, plan_run, format_plan, step_cost, fit_memory
+from src.monitor_store import MonitorStore
+from test.test_monitor_store import GPUS, DISKS, NICS, IO, PROCESS
+
+class TestRunPlanner(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        with open(os.path.join(os.path.dirname(__file__), '..', 'config.json')) as f:
+            self.workflow = json.load(f)['workflow']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def write_jpeg(self, name, width, height):
+        path = os.path.join(self.tmpdirname, name)
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xd8' + b'\xff\xe0' + struct.pack('>H', 4) + b'\x00\x00')
+            f.write(b'\xff\xc0' + struct.pack('>HBHH', 11, 8, height, width) + b'\x00' * 6)
+        return path
+
+    def test_image_size(self):
+        self.assertEqual(image_size(self.write_jpeg('a.jpg', 5472, 3648)), (5472, 3648))
+        png = os.path.join(self.tmpdirname, 'a.png')
+        with open(png, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 640, 480))
+        self.assertEqual(image_size(png), (640, 480))
+        self.assertIsNone(image_size(os.path.join(self.tmpdirname, 'missing.jpg')))
+
+    def test_image_megapixels(self):
+        files = [self.write_jpeg(f'{i}.jpg', 4000, 3000) for i in range(3)]
+        self.assertAlmostEqual(image_megapixels(files), 12.0)
+        self.assertEqual(image_megapixels([]), 20.0)
+
+    def test_plan_steps(self):
+        steps = plan_steps(self.workflow)
+        self.assertEqual(list(steps)[:3], ['addPhotos', 'filterImageQuality', 'matchPhotos'])
+        self.assertIn('filterPointCloud', steps)
+        self.assertIn('colorizeModel', steps)
+        self.assertIn('buildOrthomosaic', steps)
+        self.assertEqual(steps['buildUV']['texture_size'], 8192)
+
+    def test_step_units_scale_with_downscale(self):
+        steps = plan_steps(self.workflow)
+        high = step_units('buildDepthMaps', steps, 100, 20)
+        steps['buildDepthMaps']['downscale'] = 4
+        self.assertAlmostEqual(step_units('buildDepthMaps', steps, 100, 20), high / 4)
+
+    def test_plan_from_history(self):
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'reports', 'sample_data', 'system.csv'),
+                    os.path.join(self.tmpdirname, 'monitor.csv'))
+        with open(os.path.join(self.tmpdirname, 'run_info.json'), 'w') as f:
+            json.dump({'images': 100, 'megapixels': 20, 'workflow': self.workflow}, f)
+        history = read_history(self.tmpdirname)
+        self.assertIn('buildDepthMaps', history)
+        self.assertGreater(history['buildDepthMaps']['time'], 0)
+
+        plan = {row['step']: row for row in plan_run(self.workflow, 200, 20, [self.tmpdirname])}
+        self.assertEqual(plan['buildDepthMaps']['source'], 'history (1)')
+        self.assertAlmostEqual(plan['buildDepthMaps']['time'], 2 * history['buildDepthMaps']['time'])
+        self.assertEqual(plan['addPhotos']['source'], 'history (1)')
+        table = format_plan(list(plan.values()), ram_limit=1)
+        self.assertIn('RAM!', table)
+        self.assertIn('Total', table)
+
+    def test_history_without_run_info(self):
+        # monitor log of a run older than run_info.json: scaled with the workflow and images of the planned run
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'reports', 'sample_data', 'system.csv'),
+                    os.path.join(self.tmpdirname, 'monitor.csv'))
+        self.assertEqual(read_history(self.tmpdirname), {})
+        self.assertIn('buildDepthMaps', read_history(self.tmpdirname, self.workflow, 100, 20))
+        plan = {row['step']: row for row in plan_run(self.workflow, 200, 20, [self.tmpdirname])}
+        self.assertEqual(plan['buildDepthMaps']['source'], 'history (1)')
+
+    def test_history_from_trace(self):
+        with open(os.path.join(self.tmpdirname, 'run_info.json'), 'w') as f:
+            json.dump({'images': 100, 'megapixels': 20, 'workflow': self.workflow}, f)
+        with open(os.path.join(self.tmpdirname, 'trace.jsonl'), 'w') as f:
+            for wall, save in ((700, 100), (500, 100)):
+                f.write(json.dumps({'id': 1, 'parent': None, 'name': 'buildModel', 'kind': 'step', 'wall': wall,
+                                    'save': save, 'cpu': 1000, 'peak_rss': 4 * 1024 ** 3}) + "\n")
+        history = read_history(self.tmpdirname)
+        self.assertEqual(list(history), ['buildModel'])
+        self.assertAlmostEqual(history['buildModel']['time'], 500)
+        self.assertAlmostEqual(history['buildModel']['ram'], 4)
+
+    def test_memory_from_monitor(self):
+        # 30 GB in use before buildDepthMaps, which adds 10 GB; 2 GB on GPU 0 and 6 GB on GPU 1 at its peak
+        rows = [(1000.0 + i, b'buildDepthMaps', 50.0, 0.5, [50.0] * 4, 50.0, 9.8, 64.0, 20.0, 30.0 + i, *PROCESS, *IO, [34, 35],
+                 [90, 90], [1024.0 * i / 5, 3072.0 * i / 5]) for i in range(11)]
+        MonitorStore(os.path.join(self.tmpdirname, 'monitor.bin'), 4, GPUS, DISKS, NICS).append(rows)
+        with open(os.path.join(self.tmpdirname, 'run_info.json'), 'w') as f:
+            json.dump({'images': 100, 'megapixels': 20, 'workflow': self.workflow}, f)
+        history = read_history(self.tmpdirname)['buildDepthMaps']
+        self.assertAlmostEqual(history['ram'], 10.0)
+        self.assertAlmostEqual(history['vram'], 6.0)
+
+    def test_memory_fixed_part(self):
+        self.assertEqual(fit_memory([(100, 12.0), (300, 16.0)], 8), (10.0, 0.02))
+        self.assertEqual(fit_memory([(100, 12.0)], 8), (8.0, 0.04))
+        self.assertEqual(fit_memory([(100, 5.0)], 8), (5.0, 0.0))     # fixed part capped by the run
+        # three times the work of a 12 GB run: only the part per unit grows
+        cost = step_cost('buildDepthMaps', 300, [{'buildDepthMaps': {'units': 100, 'time': 100, 'ram': 12.0, 'vram': 6.0}}])
+        self.assertAlmostEqual(cost['ram'], 8 + 0.04 * 300)
+        self.assertAlmostEqual(cost['vram'], 6.0)
+        table = format_plan([dict(cost, step='buildDepthMaps', units=300)], ram_limit=64, vram_limit=4)
+        self.assertIn('VRAM!', table)
+        self.assertNotIn('RAM!', table.replace('VRAM!', ''))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import threading
+import time
+from src.step_graph import DocumentLock, Step, StepGraph
+
+class TestStepGraph(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def action(self, name, duration=0):
+        def run():
+            time.sleep(duration)
+            with self.lock:
+                self.calls.append(name)
+        return run
+
+    def test_run_sequential_insertion_order(self):
+        graph = StepGraph()
+        for name in ['buildDepthMaps', 'buildPointCloud', 'buildModel', 'buildDem']:
+            graph.add_step(Step(name, self.action(name)))
+        order = graph.run(max_workers=1)
+        self.assertEqual(order, ['buildDepthMaps', 'buildPointCloud', 'buildModel', 'buildDem'])
+        self.assertEqual(self.calls, order)
+
+    def test_missing_dependencies_are_ignored(self):
+        graph = StepGraph()
+        graph.add_step(Step('buildUV', self.action('buildUV')))
+        graph.add_step(Step('buildTexture', self.action('buildTexture')))
+        self.assertEqual(graph.dependencies('buildUV'), [])
+        self.assertEqual(graph.dependencies('buildTexture'), ['buildUV'])
+        self.assertEqual(graph.run(), ['buildUV', 'buildTexture'])
+
+    def test_ready_steps_respect_dependencies_and_resources(self):
+        graph = StepGraph()
+        for name in ['buildDepthMaps', 'buildPointCloud', 'buildModel', 'buildDem', 'exportModel']:
+            graph.add_step(Step(name, self.action(name)))
+        self.assertEqual(graph.ready_steps(set(), set()), ['buildDepthMaps'])
+        # buildPointCloud (cpu) and buildModel (gpu) can overlap
+        self.assertEqual(graph.ready_steps({'buildDepthMaps'}, set()), ['buildPointCloud', 'buildModel'])
+        # buildDem waits for the cpu held by buildPointCloud
+        self.assertEqual(graph.ready_steps({'buildDepthMaps', 'buildPointCloud'}, {'buildModel'}), ['buildDem'])
+        self.assertEqual(graph.ready_steps({'buildDepthMaps', 'buildModel'}, {'buildPointCloud'}), ['exportModel'])
+
+    def test_run_parallel_overlaps_independent_steps(self):
+        # both steps must be running together to pass the barrier, else it breaks and the run fails
+        barrier = threading.Barrier(2, timeout=5)
+        def overlapping(name):
+            def run():
+                barrier.wait()
+                self.action(name)()
+            return run
+        graph = StepGraph()
+        graph.add_step(Step('buildDepthMaps', self.action('buildDepthMaps')))
+        graph.add_step(Step('buildPointCloud', overlapping('buildPointCloud')))
+        graph.add_step(Step('buildModel', overlapping('buildModel')))
+        graph.add_step(Step('buildDem', self.action('buildDem')))
+        order = graph.run(max_workers=2)
+        self.assertEqual(order[0], 'buildDepthMaps')
+        self.assertEqual(set(order), {'buildDepthMaps', 'buildPointCloud', 'buildModel', 'buildDem'})
+        self.assertLess(order.index('buildPointCloud'), order.index('buildDem'))
+
+    def test_condition_skips_step(self):
+        graph = StepGraph()
+        graph.add_step(Step('buildDem', self.action('buildDem'), condition=lambda: False))
+        graph.add_step(Step('exportDEM', self.action('exportDEM')))
+        self.assertEqual(graph.run(), ['buildDem', 'exportDEM'])
+        self.assertEqual(self.calls, ['exportDEM'])
+
+    def test_error_stops_scheduling(self):
+        def fail():
+            raise RuntimeError("boom")
+        graph = StepGraph()
+        graph.add_step(Step('buildModel', fail))
+        graph.add_step(Step('colorizeModel', self.action('colorizeModel')))
+        with self.assertRaises(RuntimeError):
+            graph.run(max_workers=2)
+        self.assertEqual(self.calls, [])
+
+    def test_duplicate_step(self):
+        graph = StepGraph()
+        graph.add_step(Step('buildModel', self.action('buildModel')))
+        with self.assertRaises(ValueError):
+            graph.add_step(Step('buildModel', self.action('buildModel')))
+
+    def test_cycle(self):
+        graph = StepGraph()
+        graph.add_step(Step('a', self.action('a'), depends_on=['b']))
+        graph.add_step(Step('b', self.action('b'), depends_on=['a']))
+        with self.assertRaises(ValueError):
+            graph.run()
+
+
+
+class TestDocumentLock(unittest.TestCase):
+    def test_shared_holders_overlap(self):
+        lock = DocumentLock()
+        barrier = threading.Barrier(2, timeout=5)
+        def step():
+            with lock.shared():
+                barrier.wait()
+        threads = [threading.Thread(target=step) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(barrier.broken)
+
+    def test_save_waits_for_running_step(self):
+        lock = DocumentLock()
+        running, saved, done = threading.Event(), threading.Event(), threading.Event()
+        def step():
+            with lock.shared():
+                running.set()
+                done.wait(5)
+        def save():
+            with lock.exclusive():
+                saved.set()
+        step_thread = threading.Thread(target=step)
+        step_thread.start()
+        self.assertTrue(running.wait(5))
+        save_thread = threading.Thread(target=save)
+        save_thread.start()
+        self.assertFalse(saved.wait(0.1))
+        done.set()
+        self.assertTrue(saved.wait(5))
+        step_thread.join()
+        save_thread.join()
+
+    def test_step_waits_for_save(self):
+        lock = DocumentLock()
+        started = threading.Event()
+        def step():
+            with lock.shared():
+                started.set()
+        with lock.exclusive():
+            with lock.exclusive():   # reentrant for the saving thread
+                thread = threading.Thread(target=step)
+                thread.start()
+                self.assertFalse(started.wait(0.1))
+        self.assertTrue(started.wait(5))
+        thread.join()
+
+    def test_held(self):
+        lock = DocumentLock()
+        self.assertFalse(lock.held())
+        with lock.shared():
+            self.assertTrue(lock.held())
+            with lock.shared():
+                self.assertTrue(lock.held())
+            with self.assertRaises(RuntimeError):
+                with lock.exclusive():
+                    pass
+        self.assertFalse(lock.held())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import time
+import tempfile, shutil
+from src.step_tracer import StepTracer, traced, read_trace, summarize_trace
+
+class FakeProject:
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+class FakeProcessor:
+    def __init__(self, tracer):
+        self.project = FakeProject(tracer)
+
+    @traced
+    def buildModel(self, progress_printer=None, **kwargs):
+        self.project.tracer.annotate(dict({'face_count': 'high'}, **kwargs))
+        with self.project.tracer.span('save', kind='save', params={'version': 'buildModel'}):
+            time.sleep(0.05)
+        return 'done'
+
+    @traced
+    def buildUV(self, progress_printer=None, **kwargs):
+        raise RuntimeError('failed')
+
+class TestStepTracer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.trace_file = os.path.join(self.tmpdirname, 'trace.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdirname)
+
+    def test_nested_save_span(self):
+        processor = FakeProcessor(StepTracer(self.trace_file, interval=0.01))
+        self.assertEqual(processor.buildModel(progress_printer=print, texture_size=4096), 'done')
+        save, step = read_trace(self.trace_file)
+        self.assertEqual((save['name'], save['kind'], save['parent']), ('save', 'save', step['id']))
+        self.assertEqual(step['name'], 'buildModel')
+        self.assertIsNone(step['parent'])
+        self.assertEqual(step['params'], {'texture_size': 4096})
+        self.assertEqual(step['effective_params'], {'face_count': 'high', 'texture_size': 4096})
+        self.assertAlmostEqual(step['save'], save['wall'])
+        self.assertAlmostEqual(step['self'], step['wall'] - save['wall'])
+        self.assertGreaterEqual(step['peak_rss'], step['rss_start'])
+        self.assertGreaterEqual(step['cpu'], 0)
+
+    def test_step_span_joined(self):
+        # the processor method runs in the span opened for its step, a save after it is still part of the step
+        tracer = StepTracer(self.trace_file)
+        processor = FakeProcessor(tracer)
+        with tracer.span('buildModel', join=True):
+            processor.buildModel(texture_size=4096)
+            with tracer.span('save', kind='save'):
+                time.sleep(0.05)
+        first, second, step = read_trace(self.trace_file)
+        self.assertEqual((first['parent'], second['parent']), (step['id'], step['id']))
+        self.assertEqual(step['params'], {'texture_size': 4096})
+        self.assertAlmostEqual(step['save'], first['wall'] + second['wall'])
+
+    def test_error_recorded(self):
+        processor = FakeProcessor(StepTracer(self.trace_file))
+        with self.assertRaises(RuntimeError):
+            processor.buildUV()
+        span, = read_trace(self.trace_file)
+        self.assertIn('failed', span['error'])
+
+    def test_disabled(self):
+        processor = FakeProcessor(StepTracer(None))
+        self.assertEqual(processor.buildModel(), 'done')
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_summarize_trace(self):
+        processor = FakeProcessor(StepTracer(self.trace_file))
+        processor.buildModel()
+        processor.buildModel()
+        with open(self.trace_file, 'a') as f:
+            f.write('{"id": 9, "trunc')     # interrupted run
+        summary = summarize_trace(read_trace(self.trace_file))
+        self.assertEqual(list(summary), ['buildModel'])
+        self.assertEqual(summary['buildModel']['count'], 2)
+        self.assertGreaterEqual(summary['buildModel']['save'], 0.1)
+        self.assertAlmostEqual(summary['buildModel']['compute'] + summary['buildModel']['save'], summary['buildModel']['wall'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,19 @@
 import unittest
 import json, yaml
 import os
+import time
 import tempfile, shutil
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 from step_workflow import get_config_from_file
 from step_workflow import get_config_from_cli
 from step_workflow import execute_steps
 from step_workflow import find_photo_files
+from step_workflow import build_step_graph
+from step_workflow import processor_step
+from src.project import Project
+from src.checkpoint_policy import CheckpointPolicy
+from src.singleton_meta import SingletonMeta
+from src.step_tracer import traced, read_trace
 
 class TestStepWorkflow(unittest.TestCase):
     def setUp(self):
@@ -141,6 +148,44 @@ class TestStepWorkflow(unittest.TestCase):
             execute_steps(steps_params_input)
         mock_step.run.assert_not_called()
 
+    # exportResults: a step per export with a single worker, one step running them in processes otherwise
+    @patch('step_workflow.PointCloudProcessor', autospec=True)
+    @patch('step_workflow.MeshProcessor', autospec=True)
+    @patch('step_workflow.GeographicProjection', autospec=True)
+    def test_export_workers(self, *processors):
+        steps_params_input = {'exportResults': {'exportDEM': {}, 'exportModel': {}}}
+        with patch('step_workflow.export_workers', 1):
+            graph = build_step_graph(steps_params_input, MagicMock())
+        self.assertEqual(list(graph.steps), ['exportDEM', 'exportModel'])
+        with patch('step_workflow.export_workers', 2):
+            graph = build_step_graph(steps_params_input, MagicMock())
+        self.assertEqual(list(graph.steps), ['exportResults'])
+
+    # the checkpoint of a step is saved after it releases the document, inside its span
+    def test_step_save_time(self):
+        SingletonMeta._instances.pop(Project, None)
+        try:
+            prj = Project(project_path=os.path.join(self.tmpdirname, 'project.psx'))
+            prj.doc = MagicMock()
+            prj.doc.save.side_effect = lambda **kwargs: time.sleep(0.05)
+            prj.set_checkpoint_policy(CheckpointPolicy('every_step'))
+
+            class Processor:
+                project = prj
+
+                @traced
+                def buildDem(self, progress_printer=None):
+                    self.project.checkpoint(version='buildDem')
+
+            with patch('step_workflow.ProgressPrinter'):
+                processor_step('buildDem', Processor().buildDem, 'buildDem').action()
+            save, step = read_trace(prj.tracer.trace_file)
+            self.assertEqual((step['name'], save['parent']), ('buildDem', step['id']))
+            self.assertGreaterEqual(step['save'], 0.05)
+            prj.doc.save.assert_called_once_with(version='buildDem')
+        finally:
+            SingletonMeta._instances.pop(Project, None)
+
     # find_files
     def test_find_files_only_accepted_format(self):
         image_files = find_photo_files(self.tmpdirname, ['.jpg', '.png'])
@@ -0,0 +1,131 @@
+import unittest
+import os
+import threading
+import time
+import tempfile, shutil
+from src.metrics_backends import FakeBackend
+from src.monitor_store import read_monitor, read_progress, phases
+from src.singleton_meta import SingletonMeta
+from src.system_monitor import SystemMonitor
+
+class TestSystemMonitor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirname = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.tmpdirname, 'monitor.csv')
+        SingletonMeta._instances.pop(SystemMonitor, None)
+
+    def tearDown(self):
+        SingletonMeta._instances.pop(SystemMonitor, None)
+        shutil.rmtree(self.tmpdirname)
+
+    def test_csv_format(self):
+        monitor = SystemMonitor(self.log_file, time=0.01, backend=FakeBackend(num_gpus=2))
+        with monitor.phase('buildModel'):
+            time.sleep(0.05)
+        monitor.close()
+        with open(self.log_file) as f:
+            header, row = f.readline(), f.readline()
+        self.assertIn("GPUs: [{'id': '[0]', 'model': 'FakeGPU', 'mem_total': '32768MB'}, {'id': '[1]'", header)
+        fields = row.strip().split(';')
+        self.assertEqual(fields[0], 'buildModel')
+        self.assertEqual(len(fields), 28)
+        self.assertEqual(fields[3].strip(), '5.0')   # iowait of the fake sample 1, the store took the sample 0
+        self.assertTrue(fields[6].endswith(' GB'))
+        self.assertEqual(fields[10].strip(), '2')    # processes of the (fake) tree
+        self.assertIn("{'temp': '40°C', 'cpu_usage': '", fields[-1])
+        self.assertIn('CPU usage %;CPU iowait %;Cores usage %', header)
+        self.assertIn('Disk read MB/s', header)
+        self.assertRegex(fields[21].strip(), r'^\[\d+\]$')     # disk read of fake0
+
+    def test_no_gpu(self):
+        SystemMonitor(self.log_file, backend=FakeBackend(num_gpus=0))
+        with open(self.log_file) as f:
+            self.assertTrue(f.readline().strip().endswith('GPUs: []'))
+
+    def test_binary_store(self):
+        path = os.path.join(self.tmpdirname, 'monitor.bin')
+        monitor = SystemMonitor(path, backend=FakeBackend(num_gpus=2, cores=8))
+        with monitor.phase('buildDepthMaps'):
+            time.sleep(0.05)
+        monitor.close()
+        header, records = read_monitor(path)
+        self.assertEqual([gpu['model'] for gpu in header['gpus']], ['FakeGPU', 'FakeGPU'])
+        self.assertEqual(list(phases(records)), ['buildDepthMaps'])
+        self.assertEqual(records['cores'].shape, (1, 8))
+        self.assertEqual(records['gpu_mem_used'].shape, (1, 2))
+        self.assertEqual((header['disks'], header['nics']), (['fake0'], ['eth0']))
+        self.assertEqual(records['disk_write_iops'].shape, (1, 1))
+
+    def read_rows(self):
+        with open(self.log_file) as f:
+            f.readline()
+            return [line.split(';')[:2] for line in f]
+
+    def test_phase_labels_and_instant_stop(self):
+        monitor = SystemMonitor(self.log_file, time=60, backend=FakeBackend(num_gpus=0))
+        start = time.time()
+        with monitor.phase('buildUV'):
+            time.sleep(0.05)
+        with monitor.phase('buildTexture'):
+            time.sleep(0.05)
+        monitor.close()
+        self.assertLess(time.time() - start, 5)     # not waiting for the 60 s interval
+        self.assertEqual([label for label, _ in self.read_rows()], ['buildUV', 'buildTexture'])
+        self.assertIsNone(monitor.thread)
+
+    def test_single_thread_and_concurrent_phases(self):
+        monitor = SystemMonitor(self.log_file, time=60, backend=FakeBackend(num_gpus=0))
+        with monitor.phase('buildModel'):
+            thread = monitor.thread
+            time.sleep(0.05)
+            with monitor.phase('buildDem'):
+                self.assertIs(monitor.thread, thread)
+                time.sleep(0.05)
+            time.sleep(0.05)
+        time.sleep(0.05)
+        monitor.close()
+        self.assertEqual([label for label, _ in self.read_rows()], ['buildModel', 'buildModel+buildDem', 'buildModel'])
+        self.assertEqual(len([t for t in threading.enumerate() if t.name == 'SystemMonitor']), 0)
+
+    def test_adaptive_interval(self):
+        monitor = SystemMonitor(self.log_file, time=30, backend=FakeBackend(num_gpus=0), min_time=0.5, burst=10, threshold=10)
+        now = time.time()
+        self.assertEqual(monitor.next_interval([50, 40], 8, now), 0.5)                  # step boundary
+        self.assertEqual(monitor.next_interval([52, 41], 0.5, now - 60), 1)             # steady: back off
+        self.assertEqual(monitor.next_interval([53, 42], 16, now - 60), 30)
+        self.assertEqual(monitor.next_interval([53, 70], 30, now - 60), 0.5)            # RAM jump
+
+    def test_buffer_flushed_in_batches(self):
+        monitor = SystemMonitor(self.log_file, backend=FakeBackend(num_gpus=1), buffer_size=3)
+        for _ in range(2):
+            monitor.sample('buildDepthMaps')
+        self.assertEqual(self.read_rows(), [])
+        monitor.sample('buildDepthMaps')
+        self.assertEqual(len(self.read_rows()), 3)
+        monitor.sample('buildDepthMaps')
+        monitor.close()
+        self.assertEqual(len(self.read_rows()), 4)
+
+    def test_fast_sampling_at_boundaries(self):
+        monitor = SystemMonitor(self.log_file, time=60, backend=FakeBackend(num_gpus=0), min_time=0.01, burst=0.2,
+                                threshold=101)   # FakeBackend values change at every sample
+        with monitor.phase('buildDepthMaps'):
+            time.sleep(0.5)
+        monitor.close()
+        times = [float(t) for _, t in self.read_rows()]
+        self.assertGreater(len(times), 5)
+        self.assertLess(len(times), 40)     # backs off after the burst
+
+    def test_progress_throttled(self):
+        path = os.path.join(self.tmpdirname, 'monitor.bin')
+        monitor = SystemMonitor(path, backend=FakeBackend(num_gpus=0), progress_interval=60)
+        for percent in (0, 0.5, 1, 1.5, 100, 100):
+            monitor.progress('buildDepthMaps', percent)
+        monitor.progress('buildModel', 3)
+        monitor.close()
+        events = read_progress(path)
+        self.assertEqual([(step.decode(), float(percent)) for step, percent in zip(events['step'], events['percent'])],
+                         [('buildDepthMaps', 0.0), ('buildDepthMaps', 100.0), ('buildModel', 3.0)])
+
+if __name__ == '__main__':
+    unittest.main()